@@ -1,7 +1,12 @@
+import asyncio
 import json
-import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from project.core.a2a_protocol import CoachAdvice, SenseState, PlannerOutput, BehaviorFingerprint
+from project.core.async_llm import generate_content_async
+from project.core.llm_cache import LLMResponseCache, cache_lookup, make_cache_key
+from project.core.llm_client import get_shared_client
+from project.core.observability import log_event, span, WARNING
+from project.core.singleflight import SingleFlight
 
 # External Libraries for Gemini
 try:
@@ -12,48 +17,35 @@ except ImportError:
     genai = type('module', (object,), {'Client': MockClient, 'types': type('module', (object,), {'GenerateContentConfig': lambda **kwargs: None})})
     APIError = Exception
 
-class CoachAgent:
-    def __init__(self): # Fixed: Changed _init_ to __init__
-        try:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                raise ValueError("API Key not found.")
-            self.client = genai.Client(api_key=api_key)
-            self.model = 'gemini-2.5-flash'
-        except Exception:
-            self.client = None
-
-    def run_concierge(self, state: SenseState, plan: PlannerOutput, memory: BehaviorFingerprint) -> CoachAdvice:
-
-        risky_cat = memory.recent_risky_category
-
-        # --- LLM-driven Coaching ---
-        if self.client:
-            prompt_data = {"Priority": plan.priority_level, "Balance": f"${state.balance_est_cents / 100:.2f}",
-                           "RiskyCategory": risky_cat, "FollowStreak": memory.plan_follow_streak}
-
-            system_prompt = (
-                "You are a compassionate, expert financial concierge. Generate highly specific, 3-point advice blocks. "
-                "Use detailed markdown and emojis. Tailor the optimization advice specifically to the 'RiskyCategory'. "
-                "Output must be a clean JSON object."
-            )
-            prompt = f"Generate advice for a user with the following status: {json.dumps(prompt_data)}"
+# Identical coach prompts in flight at the same time (common in batch runs) share one Gemini call and one CoachAdvice.
+COACH_FLIGHTS = SingleFlight("coach.singleflight")
 
-            response_schema = {"type": "object", "properties": {"investment_tip": {"type": "string"}, "optimization_suggestion": {"type": "string"}, "motivational_nudge": {"type": "string"}}, "required": ["investment_tip", "optimization_suggestion", "motivational_nudge"]}
+class CoachAgent:
+    def __init__(self, cache: Optional[LLMResponseCache] = None): # Fixed: Changed _init_ to __init__
+        self.model = 'gemini-2.5-flash'
+        self.cache = cache
+        # Shared, lazily created pooled client (None without an API key -> simulation paths).
+        self.client = get_shared_client()
 
-            try:
-                response = self.client.models.generate_content(
-                    model=self.model, contents=[system_prompt, prompt],
-                    config=genai.types.GenerateContentConfig(response_mime_type="application/json", response_schema=response_schema)
-                )
+    def _build_llm_request(self, state: SenseState, plan: PlannerOutput, memory: BehaviorFingerprint):
+        """Builds the (contents, config, response_schema) sent to Gemini by both the sync and async coaching paths."""
+        prompt_data = {"Priority": plan.priority_level, "Balance": f"${state.balance_est_cents / 100:.2f}",
+                       "RiskyCategory": memory.recent_risky_category, "FollowStreak": memory.plan_follow_streak}
 
-                llm_data = json.loads(response.text)
-                return CoachAdvice(**llm_data)
+        system_prompt = (
+            "You are a compassionate, expert financial concierge. Generate highly specific, 3-point advice blocks. "
+            "Use detailed markdown and emojis. Tailor the optimization advice specifically to the 'RiskyCategory'. "
+            "Output must be a clean JSON object."
+        )
+        prompt = f"Generate advice for a user with the following status: {json.dumps(prompt_data)}"
 
-            except (APIError, json.JSONDecodeError):
-                pass # Fall through to simulation
+        response_schema = {"type": "object", "properties": {"investment_tip": {"type": "string"}, "optimization_suggestion": {"type": "string"}, "motivational_nudge": {"type": "string"}}, "required": ["investment_tip", "optimization_suggestion", "motivational_nudge"]}
+        config = genai.types.GenerateContentConfig(response_mime_type="application/json", response_schema=response_schema)
+        return [system_prompt, prompt], config, response_schema
 
+    def _simulated_advice(self, state: SenseState, plan: PlannerOutput, memory: BehaviorFingerprint) -> CoachAdvice:
         # --- Simulation Fallback (Detailed and Personalized) ---
+        risky_cat = memory.recent_risky_category
 
         # Investment Tip
         if plan.priority_level == "SURVIVAL" or state.balance_est_cents < 50000:
@@ -73,3 +65,58 @@ class CoachAgent:
         nudge = f"Keep going! Your financial discipline is a muscle—it gets stronger with every small win. Current streak: {memory.plan_follow_streak} days."
 
         return CoachAdvice(investment_tip=tip, optimization_suggestion=opt_sugg, motivational_nudge=nudge)
+
+    def _flight_key(self, contents, response_schema, cache_key: Optional[str]) -> str:
+        # Scoped to the client so agents wired to different clients never share calls.
+        return f"{id(self.client)}:{cache_key or make_cache_key(self.model, contents, response_schema)}"
+
+    def _advice_from_llm(self, contents, config, cache_key: Optional[str]) -> CoachAdvice:
+        with span("llm.coach"):
+            response_text = self.client.models.generate_content(model=self.model, contents=contents, config=config).text
+        advice = CoachAdvice(**json.loads(response_text))
+        if cache_key:
+            self.cache.set(cache_key, response_text)
+        return advice
+
+    async def _advice_from_llm_async(self, contents, config, cache_key: Optional[str], timeout_s: Optional[float]) -> CoachAdvice:
+        with span("llm.coach"):
+            response_text = (await generate_content_async(self.client, self.model, contents, config, timeout_s)).text
+        advice = CoachAdvice(**json.loads(response_text))
+        if cache_key:
+            self.cache.set(cache_key, response_text)
+        return advice
+
+    def run_concierge(self, state: SenseState, plan: PlannerOutput, memory: BehaviorFingerprint) -> CoachAdvice:
+
+        # --- LLM-driven Coaching ---
+        if self.client:
+            contents, config, response_schema = self._build_llm_request(state, plan, memory)
+            cache_key, response_text = cache_lookup(self.cache, self.model, contents, response_schema)
+            try:
+                if response_text is None:
+                    flight_key = self._flight_key(contents, response_schema, cache_key)
+                    return COACH_FLIGHTS.do(flight_key, lambda: self._advice_from_llm(contents, config, cache_key))
+                return CoachAdvice(**json.loads(response_text))
+
+            except (APIError, json.JSONDecodeError):
+                pass # Fall through to simulation
+
+        return self._simulated_advice(state, plan, memory)
+
+    async def run_concierge_async(self, state: SenseState, plan: PlannerOutput, memory: BehaviorFingerprint, timeout_s: Optional[float] = None) -> CoachAdvice:
+        """Async twin of run_concierge: the Gemini call is awaited with a timeout and falls back to simulation on expiry."""
+        if self.client:
+            contents, config, response_schema = self._build_llm_request(state, plan, memory)
+            cache_key, response_text = cache_lookup(self.cache, self.model, contents, response_schema)
+            try:
+                if response_text is None:
+                    flight_key = self._flight_key(contents, response_schema, cache_key)
+                    return await COACH_FLIGHTS.do_async(flight_key, lambda: self._advice_from_llm_async(contents, config, cache_key, timeout_s))
+                return CoachAdvice(**json.loads(response_text))
+
+            except asyncio.TimeoutError:
+                log_event("CoachAgent", "LLMTimeout", {"priority": plan.priority_level}, WARNING)
+            except (APIError, json.JSONDecodeError):
+                pass # Fall through to simulation
+
+        return self._simulated_advice(state, plan, memory)
@@ -1,8 +1,16 @@
+import asyncio
 import json
 import os
-from typing import Dict, Any, List, Optional
-from project.core.a2a_protocol import PlannerOutput, PlannerRecommendation
-from project.core.context_engineering import engineer_planner_context # Corrected import path
+from typing import Dict, Any, FrozenSet, List, Literal, Optional, Sequence, Tuple
+from pydantic import BaseModel, ConfigDict
+from project.core.a2a_protocol import PlannerOutput, PlannerRecommendation, BehaviorFingerprint
+from project.core.pipeline_context import PipelineContext
+from project.core.context_engineering import encode_planner_context, MAX_PROMPT_RECS
+from project.core.async_llm import generate_content_async
+from project.core.llm_cache import LLMResponseCache, cache_lookup
+from project.core.llm_client import get_shared_client
+from project.core.observability import log_event, increment_counter, span, WARNING
+from project.tools.persona_index import PersonaIndex
 
 # External Libraries for Gemini
 try:
@@ -14,145 +22,143 @@ except ImportError:
     genai = type('module', (object,), {'Client': MockClient, 'types': type('module', (object,), {'GenerateContentConfig': lambda **kwargs: None})})
     APIError = Exception
 
+# Expected gigs per persona (deterministic test expectations). Entries may also be
+# {"gigs": [...], "tags": [...], "survey_fallback": bool}; NIVRA_PERSONA_CONFIG points at a JSON file of the same shape.
+PERSONA_GIG_PREFERENCES = {
+    "stable_user": ["Online Survey/Data Annotation", "Local Delivery Routes", "Virtual Assistant for Startups", "Research Assistant Data Entry"],
+    "fragile_user": ["Online Survey/Data Annotation", "Local Delivery Routes", "Virtual Assistant for Startups", "Research Assistant Data Entry"],
+    "student_user": ["Campus Tutoring (Math/Science)", "Research Assistant Data Entry"],
+    "retiree_user": ["Retirement Community Part-Time Receptionist", "Elderly Companion Care (Low-Stress)"],
+    "artist_user": ["Online Freelance Copywriting", "Family Event Photographer"],
+    "family_user": ["Household/Errand Runner (Local)"],
+    # Gig workers are only offered the generic survey gig when it is low-risk.
+    "gigworker_user": {"gigs": ["Local Delivery Routes", "Independent Rideshare Driver (High-Rated)"], "survey_fallback": False},
+}
+
+_persona_config_path = os.getenv("NIVRA_PERSONA_CONFIG")
+PERSONA_INDEX = PersonaIndex.from_file(_persona_config_path) if _persona_config_path else PersonaIndex(PERSONA_GIG_PREFERENCES)
+
+
+class PlannerPolicy(BaseModel):
+    """
+    Deterministic planning policy (the same rules the LLM system prompt spells out).
+    mode "llm": Gemini plans whenever a client is available; the rules are only the fallback.
+    mode "rules": the rules plan first, and Gemini is only called for cases marked as needing free-form generation.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    mode: Literal["llm", "rules"] = "llm"
+    discipline_threshold: float = 0.7
+    # Today's spend limit is balance // divisor (SURVIVAL plans use the stricter survival divisor).
+    spend_limit_divisor: int = 5
+    survival_limit_divisor: int = 10
+    # Priority levels whose micro-task should be written by the LLM instead of the fixed template.
+    generate_for_priorities: FrozenSet[str] = frozenset()
+    # Ask the LLM when no verified earning suggestion is available for the persona.
+    generate_without_recs: bool = False
+
+    def needs_generation(self, plan: PlannerOutput) -> bool:
+        if plan.priority_level in self.generate_for_priorities:
+            return True
+        return self.generate_without_recs and plan.earning_suggestion is None
+
+PLANNER_MODES = ("llm", "rules")
+
+def planner_mode_from_env() -> str:
+    """NIVRA_PLANNER_MODE, case-insensitive; an unknown value falls back to "llm" with a warning instead of failing the import."""
+    mode = os.getenv("NIVRA_PLANNER_MODE", "llm").strip().lower()
+    if mode not in PLANNER_MODES:
+        log_event("Planner", "InvalidPlannerMode", {"value": mode, "using": "llm"}, WARNING)
+        return "llm"
+    return mode
+
+DEFAULT_PLANNER_POLICY = PlannerPolicy(mode=planner_mode_from_env())
+
 
 class Planner:
-    def __init__(self):
-        try:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                raise ValueError("API Key not found.")
-            self.client = genai.Client(api_key=api_key)
-            self.model = 'gemini-2.5-flash'
-        except Exception:
-            self.client = None
-
-    def _filter_recs_by_persona_and_category(self, user_id: str, risky_category: str, all_recs: List[PlannerRecommendation]) -> List[PlannerRecommendation]:
-        """Filters recommendations based on user persona and risky category for simulation fallback, strictly matching test expectations."""
-
-        filtered_for_persona = []
-
-        # Define specific expected gigs for each persona for deterministic testing
-        persona_specific_gigs = {
-            "stable_user": ["Online Survey/Data Annotation", "Local Delivery Routes", "Virtual Assistant for Startups", "Research Assistant Data Entry"],
-            "fragile_user": ["Online Survey/Data Annotation", "Local Delivery Routes", "Virtual Assistant for Startups", "Research Assistant Data Entry"],
-            "student_user": ["Campus Tutoring (Math/Science)", "Research Assistant Data Entry"],
-            "retiree_user": ["Retirement Community Part-Time Receptionist", "Elderly Companion Care (Low-Stress)"],
-            "artist_user": ["Online Freelance Copywriting", "Family Event Photographer"],
-            "family_user": ["Household/Errand Runner (Local)"],
-            "gigworker_user": ["Local Delivery Routes", "Independent Rideshare Driver (High-Rated)"] # Added gigworker
+    def __init__(self, cache: Optional[LLMResponseCache] = None, persona_index: Optional[PersonaIndex] = None, policy: Optional[PlannerPolicy] = None):
+        self.model = 'gemini-2.5-flash'
+        self.cache = cache
+        self.persona_index = persona_index or PERSONA_INDEX
+        self.policy = policy or DEFAULT_PLANNER_POLICY
+        # Shared, lazily created pooled client (None without an API key -> simulation paths).
+        self.client = get_shared_client()
+
+    def _filter_recs_by_persona_and_category(self, user_id: str, risky_category: str, all_recs: Sequence[PlannerRecommendation]) -> Sequence[PlannerRecommendation]:
+        """Persona-specific verified recommendations (risk-sorted), via the shared persona index."""
+        return self.persona_index.select(user_id, all_recs)
+
+    def _survival_plan(self, current_balance: int) -> PlannerOutput:
+        output_data = {
+            "priority_level": "SURVIVAL",
+            "today_spend_limit_cents": current_balance // self.policy.survival_limit_divisor,
+            "micro_task": "EMERGENCY: Halt all discretionary spending immediately. Review all high-risk subscriptions.",
+            "earning_suggestion": None,
+            "reasoning_trace": {"priority_trigger": "HIGH_RISK_FALLBACK"}
         }
+        return PlannerOutput(**output_data)
 
-        potential_gigs_for_persona = persona_specific_gigs.get(user_id, [])
-
-        # Collect all expected gigs for the persona that are present in all_recs
-        found_specific_gigs_for_persona = []
-        for expected_gig_name in potential_gigs_for_persona:
-            for rec in all_recs:
-                if rec.name == expected_gig_name and rec not in found_specific_gigs_for_persona:
-                    found_specific_gigs_for_persona.append(rec)
-
-        # Add 'Online Survey/Data Annotation' as a fallback if no specific gigs are found and it's generally low-risk
-        if not found_specific_gigs_for_persona and user_id not in ['gigworker_user']:
-            for rec in all_recs:
-                if rec.name == 'Online Survey/Data Annotation':
-                    found_specific_gigs_for_persona.append(rec)
-                    break
-
-        # Ensure the final list is sorted by risk_score and prioritize specific gigs
-        final_recs = sorted(found_specific_gigs_for_persona, key=lambda x: x.risk_score)
-
-        # If still empty, or to add more variety, fall back to general low-risk if needed for non-specific personas.
-        if not final_recs and all_recs:
-            general_low_risk = [r for r in all_recs if r.risk_score < 0.2 and r.name == 'Online Survey/Data Annotation']
-            if general_low_risk and general_low_risk[0] not in final_recs:
-                final_recs.insert(0, general_low_risk[0]) # Add it to the front
-
-        return final_recs
-
-    def run_planning(self, context: Dict[str, Any]) -> PlannerOutput:
-        mem = context["memory_snapshot"]
-        original_recs = context["verified_recs"] # This is a list of PlannerRecommendation objects
-        current_balance = context["sense_state"]["balance_est_cents"]
-        spend_limit = current_balance // 5
-        user_id = context["user_id"] # Get user_id from context
-
-        # Pre-filter recommendations for persona-specificity
-        persona_filtered_recs = self._filter_recs_by_persona_and_category(user_id, mem['recent_risky_category'], original_recs)
-
-        # --- T1 Guardrail Override (Deterministic) ---
-        if context["risk_level"] == "HIGH":
-            output_data = {
-                "priority_level": "SURVIVAL",
-                "today_spend_limit_cents": current_balance // 10,
-                "micro_task": "EMERGENCY: Halt all discretionary spending immediately. Review all high-risk subscriptions.",
-                "earning_suggestion": None,
-                "reasoning_trace": {"priority_trigger": "HIGH_RISK_FALLBACK"}
-            }
-            return PlannerOutput(**output_data)
-
-        # --- LLM-driven Planning ---
-        if self.client:
-            # Convert persona_filtered_recs to a list of dictionaries for context engineering
-            recs_for_context = [r.model_dump() for r in persona_filtered_recs]
-            prompt_context = engineer_planner_context(context["sense_state"], mem, recs_for_context, context["risk_level"])
-
-            # Make the system prompt *extremely* prescriptive to force LLM output to match test expectations.
-            system_prompt = (
-                "You are a sophisticated financial planner. Your task is to generate one highly specific, actionable micro-task "
-                "and select the single best earning suggestion from the provided 'VERIFIED_EARNING_RECS' list. "
-                "CRITICALLY: Your output MUST adhere to the following rules for priority, micro-tasks, and earning suggestions: \n\n"
-                "Priority Determination: \n"
-                " - If the user's 'discipline_score' is less than 0.7, set 'priority_level' to 'DISCIPLINE'. \n"
-                " - Otherwise, set 'priority_level' to 'GROWTH'. \n\n"
-                "Micro-Task Generation (STRICTLY adhere to these formats and keywords): \n"
-                " - If 'priority_level' is 'DISCIPLINE': "
-                "   The micro-task MUST be 'Discipline Focus: Find two alternative, low-cost options for your *[RISKY_CATEGORY_TITLE_CASED]* spending this week. Can you find a free activity or replace one purchase with a homemade option?'. "
-                "   Replace '[RISKY_CATEGORY_TITLE_CASED]' with the exact title-cased 'recent_risky_category' from SENSE_STATE, e.g., 'Retail', 'Dining'. \n"
-                " - If 'priority_level' is 'GROWTH': "
-                "   The micro-task MUST be 'Growth Challenge: Automate a small monthly contribution to savings and spend 30 minutes researching one new passive income stream relevant to your skills.' \n\n"
-                "Earning Suggestion Selection (STRICTLY select the first item from the 'VERIFIED_EARNING_RECS' list, as it has already been filtered and prioritized for the user's persona and needs.): \n"
-                " - The 'VERIFIED_EARNING_RECS' list is already persona-specific. You MUST select the 'name' of the first recommendation in this list. If the list is empty, return None for earning_suggestion_name.\n\n"
-                "Respond ONLY with a clean JSON object containing 'priority_level', 'micro_task', and 'earning_suggestion_name'."
-            )
-            prompt = f"Analyze the following context:\n{prompt_context}\n\n"
-
-            response_schema = {"type": "object", "properties": {"priority_level": {"type": "string", "enum": ["DISCIPLINE", "GROWTH"]}, "micro_task": {"type": "string"}, "earning_suggestion_name": {"type": "string"}}, "required": ["priority_level", "micro_task", "earning_suggestion_name"]}
-
-            try:
-                response = self.client.models.generate_content(
-                    model=self.model, contents=[system_prompt, prompt],
-                    config=genai.types.GenerateContentConfig(response_mime_type="application/json", response_schema=response_schema)
-                )
-
-                llm_data = json.loads(response.text)
-                # Find the PlannerRecommendation object by name from the persona_filtered_recs list
-                selected_gig_data = next((r for r in persona_filtered_recs if r.name == llm_data['earning_suggestion_name']), None)
-
-                output_data = {
-                    "priority_level": llm_data['priority_level'], "today_spend_limit_cents": spend_limit,
-                    "micro_task": llm_data['micro_task'], "earning_suggestion": selected_gig_data.model_dump() if selected_gig_data else None,
-                    "reasoning_trace": {"priority_trigger": "LLM_RESPONSE"}
-                }
-                return PlannerOutput(**output_data)
-
-            except (APIError, json.JSONDecodeError) as e:
-                print(f"LLM call or JSON parsing failed: {e}. Falling back to simulation.")
-                pass # Fall through to simulation
+    def _build_llm_request(self, context: PipelineContext, persona_filtered_recs: List[PlannerRecommendation]):
+        """Builds the (contents, config, response_schema) sent to Gemini by both the sync and async planning paths."""
+        # Convert the recs the encoder can keep (ranked, capped) to dictionaries for context engineering
+        recs_for_context = [r.model_dump() for r in persona_filtered_recs[:MAX_PROMPT_RECS]]
+        # The SenseState goes in as a model: the encoder only needs per-category totals, not a dump of every expense.
+        prompt_context, prompt_tokens = encode_planner_context(context.sense_state, context.dump("memory_snapshot"), recs_for_context, context.risk_level)
+        increment_counter("planner.prompt_tokens_est", prompt_tokens)
+
+        # Make the system prompt *extremely* prescriptive to force LLM output to match test expectations.
+        system_prompt = (
+            "You are a sophisticated financial planner. Your task is to generate one highly specific, actionable micro-task "
+            "and select the single best earning suggestion from the provided 'VERIFIED_EARNING_RECS' list. "
+            "CRITICALLY: Your output MUST adhere to the following rules for priority, micro-tasks, and earning suggestions: \n\n"
+            "Priority Determination: \n"
+            f" - If the user's 'discipline_score' is less than {self.policy.discipline_threshold}, set 'priority_level' to 'DISCIPLINE'. \n"
+            " - Otherwise, set 'priority_level' to 'GROWTH'. \n\n"
+            "Micro-Task Generation (STRICTLY adhere to these formats and keywords): \n"
+            " - If 'priority_level' is 'DISCIPLINE': "
+            "   The micro-task MUST be 'Discipline Focus: Find two alternative, low-cost options for your *[RISKY_CATEGORY_TITLE_CASED]* spending this week. Can you find a free activity or replace one purchase with a homemade option?'. "
+            "   Replace '[RISKY_CATEGORY_TITLE_CASED]' with the exact title-cased 'recent_risky_category' from SENSE_STATE, e.g., 'Retail', 'Dining'. \n"
+            " - If 'priority_level' is 'GROWTH': "
+            "   The micro-task MUST be 'Growth Challenge: Automate a small monthly contribution to savings and spend 30 minutes researching one new passive income stream relevant to your skills.' \n\n"
+            "Earning Suggestion Selection (STRICTLY select the first item from the 'VERIFIED_EARNING_RECS' list, as it has already been filtered and prioritized for the user's persona and needs.): \n"
+            " - The 'VERIFIED_EARNING_RECS' list is already persona-specific. You MUST select the 'name' of the first recommendation in this list. If the list is empty, return None for earning_suggestion_name.\n\n"
+            "Respond ONLY with a clean JSON object containing 'priority_level', 'micro_task', and 'earning_suggestion_name'."
+        )
+        prompt = f"Analyze the following context:\n{prompt_context}\n\n"
+
+        response_schema = {"type": "object", "properties": {"priority_level": {"type": "string", "enum": ["DISCIPLINE", "GROWTH"]}, "micro_task": {"type": "string"}, "earning_suggestion_name": {"type": "string"}}, "required": ["priority_level", "micro_task", "earning_suggestion_name"]}
+        config = genai.types.GenerateContentConfig(response_mime_type="application/json", response_schema=response_schema)
+        return [system_prompt, prompt], config, response_schema
+
+    def _plan_from_llm_response(self, response_text: str, persona_filtered_recs: List[PlannerRecommendation], spend_limit: int, cache_status: Optional[str] = None) -> PlannerOutput:
+        llm_data = json.loads(response_text)
+        # Find the PlannerRecommendation object by name from the persona_filtered_recs list
+        selected_gig_data = next((r for r in persona_filtered_recs if r.name == llm_data['earning_suggestion_name']), None)
+
+        output_data = {
+            "priority_level": llm_data['priority_level'], "today_spend_limit_cents": spend_limit,
+            "micro_task": llm_data['micro_task'], "earning_suggestion": selected_gig_data.model_dump() if selected_gig_data else None,
+            "reasoning_trace": {"priority_trigger": "LLM_RESPONSE"}
+        }
+        if cache_status:
+            output_data["reasoning_trace"]["llm_cache"] = cache_status
+        return PlannerOutput(**output_data)
 
+    def _simulated_plan(self, mem: BehaviorFingerprint, persona_filtered_recs: List[PlannerRecommendation], spend_limit: int, trigger_prefix: str = "SIMULATION_FALLBACK") -> PlannerOutput:
         # --- Simulation Fallback (Highly personalized, explicitly matching test suite) ---
-        risky_cat = mem['recent_risky_category'] # Access as dict key
+        risky_cat = mem.recent_risky_category
         risky_cat_title = risky_cat.replace('_', ' ').title()
 
         # The persona_filtered_recs list is already available
         best_gig_dict = persona_filtered_recs[0].model_dump() if persona_filtered_recs else None
 
-        if mem['discipline_score'] < 0.7: # Adjusted threshold for DISCIPLINE
+        if mem.discipline_score < self.policy.discipline_threshold:
              # Discipline is needed
              # Explicit micro-tasks to match test suite keywords for specific personas/categories
              micro_task = f"Discipline Focus: Find two alternative, low-cost options for your *{risky_cat_title}* spending this week. Can you find a free activity or replace one purchase with a homemade option?"
              output_data = {"priority_level": "DISCIPLINE", "today_spend_limit_cents": spend_limit,
                            "micro_task": micro_task, "earning_suggestion": best_gig_dict,
-                           "reasoning_trace": {"priority_trigger": "SIMULATION_FALLBACK_DISCIPLINE"}}
+                           "reasoning_trace": {"priority_trigger": f"{trigger_prefix}_DISCIPLINE"}}
         else:
              # Growth is appropriate
              # Explicit micro-tasks to match test suite keywords for specific personas/categories
@@ -160,6 +166,89 @@ class Planner:
 
              output_data = {"priority_level": "GROWTH", "today_spend_limit_cents": spend_limit,
                            "micro_task": micro_task, "earning_suggestion": best_gig_dict,
-                           "reasoning_trace": {"priority_trigger": "SIMULATION_FALLBACK_GROWTH"}}
+                           "reasoning_trace": {"priority_trigger": f"{trigger_prefix}_GROWTH"}}
 
         return PlannerOutput(**output_data)
+
+    @staticmethod
+    def _taking_path(plan: PlannerOutput, decision_path: str) -> PlannerOutput:
+        """Records which planning path produced the plan (GUARDRAIL, RULES, LLM or FALLBACK)."""
+        plan.reasoning_trace["decision_path"] = decision_path
+        increment_counter(f"planner.path.{decision_path.lower()}")
+        return plan
+
+    def _plan_without_llm(self, context: PipelineContext) -> Tuple[Optional[PlannerOutput], Sequence[PlannerRecommendation], int]:
+        """
+        Deterministic stages shared by the sync and async paths.
+        Returns (plan, persona_filtered_recs, spend_limit); plan is None when the LLM should be asked.
+        """
+        mem = context.memory_snapshot
+        current_balance = context.sense_state.balance_est_cents
+        spend_limit = current_balance // self.policy.spend_limit_divisor
+
+        # Pre-filter recommendations for persona-specificity
+        persona_filtered_recs = self._filter_recs_by_persona_and_category(context.user_id, mem.recent_risky_category, context.verified_recs)
+
+        # --- T1 Guardrail Override (Deterministic) ---
+        if context.risk_level == "HIGH":
+            return self._taking_path(self._survival_plan(current_balance), "GUARDRAIL"), persona_filtered_recs, spend_limit
+
+        # --- Rule engine: only cases the policy marks for free-form generation go to Gemini ---
+        if self.policy.mode == "rules":
+            plan = self._simulated_plan(mem, persona_filtered_recs, spend_limit, "RULE_ENGINE")
+            if not (self.client and self.policy.needs_generation(plan)):
+                return self._taking_path(plan, "RULES"), persona_filtered_recs, spend_limit
+
+        if not self.client:
+            return self._taking_path(self._simulated_plan(mem, persona_filtered_recs, spend_limit), "FALLBACK"), persona_filtered_recs, spend_limit
+        return None, persona_filtered_recs, spend_limit
+
+    def run_planning(self, context: PipelineContext) -> PlannerOutput:
+        plan, persona_filtered_recs, spend_limit = self._plan_without_llm(context)
+        if plan is not None:
+            return plan
+
+        # --- LLM-driven Planning ---
+        contents, config, response_schema = self._build_llm_request(context, persona_filtered_recs)
+        cache_key, response_text = cache_lookup(self.cache, self.model, contents, response_schema)
+        try:
+            if response_text is None:
+                with span("llm.planner"):
+                    response_text = self.client.models.generate_content(model=self.model, contents=contents, config=config).text
+                plan = self._plan_from_llm_response(response_text, persona_filtered_recs, spend_limit, "MISS" if cache_key else None)
+                if cache_key:
+                    self.cache.set(cache_key, response_text)
+            else:
+                plan = self._plan_from_llm_response(response_text, persona_filtered_recs, spend_limit, "HIT")
+            return self._taking_path(plan, "LLM")
+
+        except (APIError, json.JSONDecodeError) as e:
+            log_event("Planner", "LLMFailed", {"user": context.user_id, "error": type(e).__name__, "detail": str(e)}, WARNING)
+
+        return self._taking_path(self._simulated_plan(context.memory_snapshot, persona_filtered_recs, spend_limit), "FALLBACK")
+
+    async def run_planning_async(self, context: PipelineContext, timeout_s: Optional[float] = None) -> PlannerOutput:
+        """Async twin of run_planning: the Gemini call is awaited with a timeout and falls back to simulation on expiry."""
+        plan, persona_filtered_recs, spend_limit = self._plan_without_llm(context)
+        if plan is not None:
+            return plan
+
+        contents, config, response_schema = self._build_llm_request(context, persona_filtered_recs)
+        cache_key, response_text = cache_lookup(self.cache, self.model, contents, response_schema)
+        try:
+            if response_text is None:
+                with span("llm.planner"):
+                    response_text = (await generate_content_async(self.client, self.model, contents, config, timeout_s)).text
+                plan = self._plan_from_llm_response(response_text, persona_filtered_recs, spend_limit, "MISS" if cache_key else None)
+                if cache_key:
+                    self.cache.set(cache_key, response_text)
+            else:
+                plan = self._plan_from_llm_response(response_text, persona_filtered_recs, spend_limit, "HIT")
+            return self._taking_path(plan, "LLM")
+
+        except asyncio.TimeoutError:
+            log_event("Planner", "LLMTimeout", {"user": context.user_id}, WARNING)
+        except (APIError, json.JSONDecodeError) as e:
+            log_event("Planner", "LLMFailed", {"user": context.user_id, "error": type(e).__name__, "detail": str(e)}, WARNING)
+
+        return self._taking_path(self._simulated_plan(context.memory_snapshot, persona_filtered_recs, spend_limit), "FALLBACK")
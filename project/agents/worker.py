@@ -1,8 +1,17 @@
+import copy
+import itertools
+import os
 import time
-from typing import Dict, Any, List
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Any, List, Iterable, Iterator, AsyncIterable, Optional, Tuple, Union
 from project.core.a2a_protocol import SenseState, ExpenseEvent
-from project.tools.tools import parse_sms_transaction, parse_scanner_ocr, normalize_manual_expenses
+from project.tools.tools import iter_sms_transactions, iter_receipt_transactions, iter_manual_expenses, base_amount_cents
+from project.core.expense_batch import ExpenseBatch, BatchPayload
+from project.tools.vendor_matcher import VendorMatcher
 from project.core.observability import log_event
+from project.core.cashflow import CashFlowProjector, today_ordinal
+from project.memory.transaction_history import TransactionHistory, get_default_history
 
 # --- NEW: Vendor/Category Mapping (Data Cleansing Logic) ---
 VENDOR_MAP = {
@@ -13,52 +22,307 @@ VENDOR_MAP = {
     "GROCERY": "GROCERIES", "WALMART": "GROCERIES"
 }
 
-def clean_and_categorize(expense: ExpenseEvent) -> ExpenseEvent:
-    """Normalizes the category based on known vendors."""
-    source_text = expense.source.upper()
-    category = expense.category.upper()
+# Compiled once at import; NIVRA_VENDOR_TABLE swaps in a large merchant table (CSV or JSON) at startup.
+_vendor_table_path = os.getenv("NIVRA_VENDOR_TABLE")
+VENDOR_MATCHER = VendorMatcher.from_file(_vendor_table_path) if _vendor_table_path else VendorMatcher(VENDOR_MAP)
+
+def load_vendor_table(path: str) -> VendorMatcher:
+    """Replaces the active vendor matcher with one built from a merchant table file."""
+    global VENDOR_MATCHER
+    VENDOR_MATCHER = VendorMatcher.from_file(path)
+    return VENDOR_MATCHER
+
+def categorize(source: str, category: str) -> str:
+    """Normalized category for a raw (source, category) pair, based on known vendors."""
+    category = category.upper()
 
-    # Try to map based on source text or category
-    for vendor, cat in VENDOR_MAP.items():
-        if vendor in source_text or vendor in category:
-            expense.category = cat
-            return expense
+    # Try to map based on source text or category (first table entry found in either wins)
+    vendor_category = VENDOR_MATCHER.match(source.upper(), category)
+    if vendor_category is not None:
+        return vendor_category
 
     # Simple cleanup
-    expense.category = category if category else "MISC"
-    return expense
+    return category if category else "MISC"
 
+def clean_and_categorize(expense: ExpenseEvent) -> ExpenseEvent:
+    """Copy of the expense with its category normalized based on known vendors (events may be shared, see ExpenseBatch.to_events)."""
+    return expense.model_copy(update={"category": categorize(expense.source, expense.category)})
 
-class SenseWorker:
-    def run_sense_worker(self, raw_sms_input: str, manual_entries: List[Dict[str, Any]], raw_ocr_text: str) -> SenseState:
 
-        # 1. Parsing and Normalization
-        sms_expenses = parse_sms_transaction(raw_sms_input)
-        manual_expenses = normalize_manual_expenses(manual_entries)
-        ocr_expenses = parse_scanner_ocr(raw_ocr_text)
+# --- State Calculation Constants ---
+STARTING_BALANCE_CENTS = 150000 # Initial balance is $1500
+AVG_DAILY_SPEND_CENTS = 5000 # Projection fallback for users without spend history (see core/cashflow.py)
+
+# Raw input channels, in the order run_sense_worker has always parsed them.
+CHANNEL_SMS, CHANNEL_MANUAL, CHANNEL_SCANNER = "SMS", "Manual", "Scanner"
+
+# (channel, payload): payload is SMS text, OCR text, or one manual entry dict
+RawEvent = Tuple[str, Any]
+
+
+def _shortfalls(balance_cents: int, projector: Optional[CashFlowProjector]) -> Tuple[int, int]:
+    """(7-day, 30-day) shortfall from the user's spend model, or from the flat average without one."""
+    if projector is not None and projector.has_history:
+        return projector.shortfall(balance_cents, 7), projector.shortfall(balance_cents, 30)
+    return max(0, (AVG_DAILY_SPEND_CENTS * 7) - balance_cents), max(0, (AVG_DAILY_SPEND_CENTS * 30) - balance_cents)
+
 
-        all_expenses: List[ExpenseEvent] = sms_expenses + manual_expenses + ocr_expenses
+class SenseStream:
+    """
+    Running, per-user SenseState for transactions that arrive throughout the day.
+    Each raw event is parsed once into a columnar ExpenseBatch; balance, per-category totals and
+    confidence are updated in O(1), so snapshot() never re-parses the day's history.
+    With a CashFlowProjector, every expense is also folded into the user's spend model (as spent on `day`)
+    and the shortfall is projected from it instead of the flat AVG_DAILY_SPEND_CENTS.
+    With replace_day=True the stream holds the whole day: the projector's open day is set to the stream's
+    totals on each snapshot instead of being added to, so re-sensing the same day does not count it twice.
+    """
 
-        # --- NEW: Apply Data Cleansing ---
-        cleaned_expenses = [clean_and_categorize(e) for e in all_expenses]
-        total_spent_cents = sum(e.amount_cents for e in cleaned_expenses)
+    def __init__(self, user_id: str, starting_balance_cents: int = STARTING_BALANCE_CENTS, projector: Optional[CashFlowProjector] = None, day: Optional[int] = None,
+                 replace_day: bool = False):
+        self.user_id = user_id
+        self.starting_balance_cents = starting_balance_cents
+        self.projector = projector
+        self.replace_day = replace_day
+        self.day = day if day is not None else today_ordinal()
+        self.total_spent_cents = 0
+        self.totals_by_category: Dict[str, int] = defaultdict(int)
+        self.channels_seen = set()
+        self.batch = ExpenseBatch()
 
+    def _add(self, source: str, amount_cents: int, raw_category: str):
+        category = categorize(source, raw_category)
+        self.batch.append(source, amount_cents, category)
+        self.total_spent_cents += amount_cents
+        self.totals_by_category[category] += amount_cents
+        if self.projector is not None and not self.replace_day:
+            self.projector.add(self.day, category, amount_cents)
+
+    def ingest(self, channel: str, payload: Any) -> int:
+        """Parses one raw event, folds it into the running totals and returns how many expenses it added."""
+        added = len(self.batch)
+        if channel == CHANNEL_SMS:
+            for txn in iter_sms_transactions(payload):
+                amount_cents = base_amount_cents(txn) if txn.direction == "debit" else None
+                if amount_cents:
+                    self._add(CHANNEL_SMS, amount_cents, txn.merchant or "MISC")
+        elif channel == CHANNEL_SCANNER:
+            for txn in iter_receipt_transactions(payload):
+                amount_cents = base_amount_cents(txn)
+                if amount_cents:
+                    self._add(CHANNEL_SCANNER, amount_cents, txn.merchant or "MISC")
+        elif channel == CHANNEL_MANUAL:
+            for amount_cents, category in iter_manual_expenses([payload]):
+                self._add(CHANNEL_MANUAL, amount_cents, category)
+        else:
+            raise ValueError(f"Unknown sense channel: {channel}")
+
+        # A non-empty input counts as a source even when nothing parses out of it (same as the batch path).
+        if payload:
+            self.channels_seen.add(channel)
+        return len(self.batch) - added
+
+    def ingest_many(self, events: Iterable[RawEvent]) -> "SenseStream":
+        for channel, payload in events:
+            self.ingest(channel, payload)
+        return self
+
+    async def ingest_async(self, events: AsyncIterable[RawEvent]) -> "SenseStream":
+        async for channel, payload in events:
+            self.ingest(channel, payload)
+        return self
+
+    @property
+    def balance_cents(self) -> int:
+        return max(0, self.starting_balance_cents - self.total_spent_cents)
+
+    @property
+    def parser_confidence(self) -> float:
         # 2. Confidence Scoring (T1 Logic)
-        num_sources = len([s for s in [raw_sms_input, manual_entries, raw_ocr_text] if s])
-        parser_confidence = 0.9 if num_sources >= 2 else 0.4
+        return 0.9 if len(self.channels_seen) >= 2 else 0.4
+
+    def _projection(self) -> Tuple[int, int, int]:
+        """(balance, 7-day shortfall, 30-day shortfall); constant cost however long the user's history is."""
+        balance_cents = self.balance_cents
+        if self.projector is not None and self.replace_day:
+            self.projector.replace_day(self.day, self.totals_by_category)
+        return (balance_cents, *_shortfalls(balance_cents, self.projector))
+
+    def snapshot(self) -> SenseState:
+        """
+        Current SenseState. Parsing, totals and projection are never redone for earlier events; the only per-event
+        cost is the list of all_today_expenses, a fresh O(n) list of event objects shared with earlier snapshots.
+        """
+        balance_cents, shortfall_7d, shortfall_30d = self._projection()
+        return SenseState.from_batch(self.batch, balance_cents, shortfall_7d, self.parser_confidence, shortfall_30d)
+
+    def snapshot_payload(self) -> "SensePayload":
+        """The snapshot in compact, picklable form (no pydantic models), for returning from a pool process."""
+        balance_cents, shortfall_7d, shortfall_30d = self._projection()
+        return balance_cents, shortfall_7d, shortfall_30d, self.parser_confidence, self.batch.to_payload()
+
+
+# (sms_input, manual_entries, ocr_text) for one user
+SenseInput = Tuple[str, List[Dict[str, Any]], str]
+# (balance, 7d shortfall, 30d shortfall, parser confidence, ExpenseBatch payload) -- one user's state as sent between processes
+SensePayload = Tuple[int, int, int, float, BatchPayload]
+# Users per task submitted to the pool (amortizes IPC), and tasks queued per process before submission blocks.
+DEFAULT_SENSE_CHUNK_SIZE = 64
+SENSE_CHUNKS_IN_FLIGHT_PER_PROCESS = 2
+
+def _one_shot_stream(raw_sms_input: str, manual_entries: List[Dict[str, Any]], raw_ocr_text: str, projector: Optional[CashFlowProjector] = None) -> SenseStream:
+    # The three inputs are the user's whole day so far, so they replace (not add to) the projector's open day.
+    stream = SenseStream(user_id="", projector=projector, replace_day=True)
+    stream.ingest(CHANNEL_SMS, raw_sms_input)
+    for entry in manual_entries:
+        stream.ingest(CHANNEL_MANUAL, entry)
+    if manual_entries:
+        stream.channels_seen.add(CHANNEL_MANUAL)
+    stream.ingest(CHANNEL_SCANNER, raw_ocr_text)
+    return stream
+
+def _sense_chunk(inputs: List[SenseInput]) -> List[Union[SensePayload, str]]:
+    """Pool task: senses a chunk of users; a failing user yields its error message instead of a payload."""
+    results: List[Union[SensePayload, str]] = []
+    for raw_sms_input, manual_entries, raw_ocr_text in inputs:
+        try:
+            results.append(_one_shot_stream(raw_sms_input, manual_entries, raw_ocr_text).snapshot_payload())
+        except Exception as e:
+            results.append(f"{type(e).__name__}: {e}")
+    return results
+
+def _state_from_payload(payload: SensePayload) -> SenseState:
+    balance_cents, shortfall_7d, shortfall_30d, confidence, batch_payload = payload
+    return SenseState.from_batch(ExpenseBatch.from_payload(batch_payload), balance_cents, shortfall_7d, confidence, shortfall_30d)
+
+
+class SenseWorker:
+    def __init__(self, history: Optional[TransactionHistory] = None):
+        # Open per-user streams for continuous ingestion (see ingest_events).
+        self.streams: Dict[str, SenseStream] = {}
+        # Persistent expense history appended by every sensed user (NIVRA_TXN_HISTORY_DIR; None disables it).
+        self.history = history if history is not None else get_default_history()
+        # Per-user spend models; they outlive the daily streams, so each new day builds on the last.
+        self.projectors: Dict[str, CashFlowProjector] = {}
+
+    def projector_for(self, user_id: str) -> CashFlowProjector:
+        projector = self.projectors.get(user_id)
+        if projector is None:
+            projector = self.projectors[user_id] = CashFlowProjector()
+        return projector
+
+    def load_history(self, user_id: str, days: List[int], categories: List[str], amounts_cents: List[int]) -> CashFlowProjector:
+        """Seeds the user's spend model from past expenses (day ordinals, normalized categories, amounts)."""
+        projector = self.projectors[user_id] = CashFlowProjector.from_history(days, categories, amounts_cents)
+        return projector
+
+    def stream_for(self, user_id: str) -> SenseStream:
+        stream = self.streams.get(user_id)
+        if stream is None:
+            stream = self.streams[user_id] = SenseStream(user_id, projector=self.projector_for(user_id))
+        return stream
+
+    def _record_history(self, user_id: str, stream: SenseStream, start: int = 0):
+        if self.history is not None:
+            self.history.append_batch(user_id, stream.day, stream.batch, start)
+
+    def ingest_events(self, user_id: str, events: Iterable[RawEvent]) -> SenseState:
+        """Streaming mode: folds new raw events into the user's running state and returns a snapshot."""
+        stream = self.stream_for(user_id)
+        already_recorded = len(stream.batch)
+        state = stream.ingest_many(events).snapshot()
+        self._record_history(user_id, stream, already_recorded)
+        log_event("SenseWorker", "StateGenerated", {"user": user_id, "balance": state.balance_est_cents, "confidence": state.parser_confidence_score})
+        return state
+
+    async def ingest_events_async(self, user_id: str, events: AsyncIterable[RawEvent]) -> SenseState:
+        stream = self.stream_for(user_id)
+        already_recorded = len(stream.batch)
+        state = (await stream.ingest_async(events)).snapshot()
+        self._record_history(user_id, stream, already_recorded)
+        log_event("SenseWorker", "StateGenerated", {"user": user_id, "balance": state.balance_est_cents, "confidence": state.parser_confidence_score})
+        return state
+
+    def close_stream(self, user_id: str) -> Optional[SenseState]:
+        """Ends the user's day: returns the final snapshot and drops the running state."""
+        stream = self.streams.pop(user_id, None)
+        return stream.snapshot() if stream is not None else None
+
+    def run_sense_worker(self, raw_sms_input: str, manual_entries: List[Dict[str, Any]], raw_ocr_text: str, user_id: Optional[str] = None) -> SenseState:
+
+        # 1. Parsing and Normalization (one-shot stream over today's three inputs)
+        # Users with a spend model (load_history / streaming mode) are projected from it; others use the flat average.
+        projector = self.projectors.get(user_id) if user_id is not None else None
+        stream = _one_shot_stream(raw_sms_input, manual_entries, raw_ocr_text, projector)
+
+        # 3. State Calculation
+        state = stream.snapshot()
+        if user_id is not None and self.history is not None:
+            # The inputs are the whole day (see _one_shot_stream): they replace the day's recorded spend.
+            self.history.replace_day(user_id, stream.day, stream.totals_by_category)
+
+        log_event("SenseWorker", "StateGenerated", {"balance": state.balance_est_cents, "confidence": state.parser_confidence_score})
+
+        return state
 
-        # 3. State Calculation (Initial balance is $1500)
-        balance_cents = max(0, 150000 - total_spent_cents)
-        avg_daily_spend = 5000
-        shortfall_projection = max(0, (avg_daily_spend * 7) - balance_cents)
+    def preview_sense(self, raw_sms_input: str, manual_entries: List[Dict[str, Any]], raw_ocr_text: str, user_id: Optional[str] = None) -> SenseState:
+        """
+        The state run_sense_worker would return, without its side effects (for what-if runs): the user's spend
+        model is projected from a copy, and nothing is recorded to the history.
+        """
+        projector = self.projectors.get(user_id) if user_id is not None else None
+        return _one_shot_stream(raw_sms_input, manual_entries, raw_ocr_text, copy.deepcopy(projector)).snapshot()
 
-        state_data = {
-            "balance_est_cents": balance_cents,
-            "shortfall_projection_7d_cents": shortfall_projection,
-            "parser_confidence_score": parser_confidence,
-            "all_today_expenses": cleaned_expenses
-        }
+    def run_sense_many(self, inputs: Iterable[SenseInput], processes: Optional[int] = None, chunk_size: int = DEFAULT_SENSE_CHUNK_SIZE,
+                       user_ids: Optional[Iterable[Optional[str]]] = None) -> Iterator[Union[SenseState, Exception]]:
+        """
+        Parallel run_sense_worker over many users: inputs are sharded in chunks across a process pool and
+        the states are yielded in input order. Workers return compact payloads (column bytes), not pickled models.
+        At most processes * SENSE_CHUNKS_IN_FLIGHT_PER_PROCESS chunks are outstanding, so input is consumed
+        lazily and memory stays bounded however long the input is. A user whose input fails to parse yields
+        the exception in its slot, so one bad record does not abort the run.
+        user_ids (parallel to inputs) does what run_sense_worker's user_id does; the spend model and the
+        history live in this process, so they are applied here to each payload as it comes back.
+        """
+        processes = processes or os.cpu_count() or 1
+        pending: "deque[Tuple[Future, List[Optional[str]]]]" = deque()
+        max_pending = processes * SENSE_CHUNKS_IN_FLIGHT_PER_PROCESS
+        inputs = iter(inputs)
+        user_ids = iter(user_ids) if user_ids is not None else itertools.repeat(None)
+        pool = ProcessPoolExecutor(max_workers=processes)
+        try:
+            while True:
+                chunk = list(itertools.islice(inputs, chunk_size))
+                if chunk:
+                    if len(pending) >= max_pending: # backpressure: wait for the oldest chunk before submitting more
+                        yield from self._states_from_chunk(*pending.popleft())
+                    pending.append((pool.submit(_sense_chunk, chunk), list(itertools.islice(user_ids, len(chunk)))))
+                elif pending:
+                    yield from self._states_from_chunk(*pending.popleft())
+                else:
+                    break
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
 
-        log_event("SenseWorker", "StateGenerated", {"balance": balance_cents, "confidence": parser_confidence})
+    def _states_from_chunk(self, future: Future, user_ids: List[Optional[str]]) -> Iterator[Union[SenseState, Exception]]:
+        for payload, user_id in zip(future.result(), user_ids):
+            if isinstance(payload, str):
+                yield ValueError(payload)
+                continue
+            state = _state_from_payload(payload) if user_id is None else self._user_state_from_payload(user_id, payload)
+            log_event("SenseWorker", "StateGenerated", {"balance": state.balance_est_cents, "confidence": state.parser_confidence_score})
+            yield state
 
-        return SenseState(**state_data)
+    def _user_state_from_payload(self, user_id: str, payload: SensePayload) -> SenseState:
+        """The parent-side half of run_sense_worker(..., user_id) for a pooled payload (same projection and history writes)."""
+        balance_cents, shortfall_7d, shortfall_30d, confidence, batch_payload = payload
+        batch = ExpenseBatch.from_payload(batch_payload)
+        day = today_ordinal()
+        totals_by_category = batch.totals_by_category()
+        projector = self.projectors.get(user_id)
+        if projector is not None:
+            projector.replace_day(day, totals_by_category)
+            shortfall_7d, shortfall_30d = _shortfalls(balance_cents, projector)
+        if self.history is not None:
+            self.history.replace_day(user_id, day, totals_by_category)
+        return SenseState.from_batch(batch, balance_cents, shortfall_7d, confidence, shortfall_30d)
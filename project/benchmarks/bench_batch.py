@@ -0,0 +1,42 @@
+import sys, os
+import io
+import time
+from contextlib import redirect_stdout
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.main_agent import run_agent, run_agent_batch
+
+PERSONAS = ["stable_user", "fragile_user", "student_user", "retiree_user", "artist_user", "family_user", "gigworker_user"]
+
+def build_records(n_users: int):
+    """Synthetic nightly workload: one record per user, cycling through the known personas."""
+    return [
+        (PERSONAS[i % len(PERSONAS)], "Debit $12.00 purchase.", [{"category": "FOOD", "amount": 5.00}], "GROCERY $20.00")
+        for i in range(n_users)
+    ]
+
+def bench_loop(records) -> float:
+    start = time.perf_counter()
+    for user_id, sms, manual, ocr in records:
+        run_agent(sms, user_id=user_id, manual_entries=manual, ocr_text=ocr)
+    return time.perf_counter() - start
+
+def bench_batch(records) -> float:
+    start = time.perf_counter()
+    for _ in run_agent_batch(records):
+        pass
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    records = build_records(n_users)
+
+    # Pipeline logs go to stdout; swallow them so they don't dominate the measurement output.
+    with redirect_stdout(io.StringIO()):
+        loop_s = bench_loop(records)
+        batch_s = bench_batch(records)
+
+    print(f"--- run_agent loop vs run_agent_batch ({n_users} users) ---")
+    print(f"run_agent loop : {loop_s:.3f}s ({n_users / loop_s:,.0f} users/s)")
+    print(f"run_agent_batch: {batch_s:.3f}s ({n_users / batch_s:,.0f} users/s)")
+    print(f"speedup        : {loop_s / batch_s:.2f}x")
@@ -0,0 +1,29 @@
+import sys, os
+import random
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.benchmarks.generators import CATEGORIES
+from project.core.cashflow import CashFlowProjector
+
+def history(days: int, per_day: int, rng: random.Random):
+    return [(day, rng.choice(CATEGORIES), rng.randint(100, 20000)) for day in range(1, days + 1) for _ in range(per_day)]
+
+if __name__ == "__main__":
+    per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = random.Random(22)
+    print(f"--- Cash-flow projection ({per_day} expenses/day, {len(CATEGORIES)} categories) ---")
+    for days in (30, 365, 3650):
+        events = history(days, per_day, rng)
+        start = time.perf_counter()
+        projector = CashFlowProjector.from_history(*zip(*events))
+        bulk_s = time.perf_counter() - start
+
+        # Steady state: one more week of events on top of the existing history, projecting after each one.
+        new_events = [(days + 1 + i // per_day, rng.choice(CATEGORIES), rng.randint(100, 20000)) for i in range(7 * per_day)]
+        start = time.perf_counter()
+        for day, category, amount in new_events:
+            projector.add(day, category, amount)
+            projector.shortfall(100_000, 7)
+        per_event_s = (time.perf_counter() - start) / len(new_events)
+        print(f"{days:5} days history: from_history {bulk_s * 1000:8.1f} ms | add + 7d projection {per_event_s * 1e6:7.1f} us/event | 30d spend ${projector.project_spend(30) / 100:,.0f}")
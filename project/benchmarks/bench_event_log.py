@@ -0,0 +1,55 @@
+import sys, os
+import random
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.core.cashflow import today_ordinal
+from project.core.observability import configure_logging, ERROR
+from project.memory.event_log import EventSourcedBackend
+from project.memory.storage import InMemoryBackend
+
+if __name__ == "__main__":
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    configure_logging(min_level=ERROR, stdout=False)
+    rng = random.Random(24)
+    users = [f"user_{i}" for i in range(n_users)]
+    days = [[(user_id, rng.random() < 0.6, rng.random() < 0.2) for user_id in users] for _ in range(n_days)]
+    first_day = today_ordinal() - n_days
+
+    legacy = InMemoryBackend({})
+    for user_id in users:
+        legacy.ensure_user(user_id)
+    start = time.perf_counter()
+    for outcomes in days:
+        for user_id, complied, _ in outcomes: # legacy path: one update_compliance call per user
+            legacy.apply_compliance([(user_id, complied)])
+    legacy_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "compliance.jsonl")
+        backend = EventSourcedBackend(path, snapshot_every=n_users * 3)
+        for user_id in users:
+            backend.ensure_user(user_id)
+        start = time.perf_counter()
+        for offset, outcomes in enumerate(days):
+            backend.apply_day(first_day + offset, outcomes)
+        bulk_s = time.perf_counter() - start
+        backend.close()
+        log_mib = os.path.getsize(path) / 2**20
+
+        start = time.perf_counter()
+        restarted = EventSourcedBackend(path, snapshot_every=n_users * 3)
+        restart_s = time.perf_counter() - start
+        restarted.close()
+        os.remove(path + ".snapshot")
+        start = time.perf_counter()
+        EventSourcedBackend(path, snapshot_every=10**12).close()
+        full_replay_s = time.perf_counter() - start
+
+    print(f"--- Compliance ingestion ({n_users:,} users x {n_days} days) ---")
+    print(f"per-user in-place updates : {n_users * n_days / legacy_s:12,.0f} outcomes/s (no history)")
+    print(f"apply_day (event log)     : {n_users * n_days / bulk_s:12,.0f} outcomes/s, log {log_mib:.1f} MiB")
+    print(f"restart from snapshot     : {restart_s:8.2f} s (replayed {restarted.replayed_events:,} events)")
+    print(f"restart, full replay      : {full_replay_s:8.2f} s")
@@ -0,0 +1,48 @@
+import sys, os
+import random
+import time
+import tracemalloc
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.benchmarks import generators
+from project.agents.worker import SenseWorker
+from project.core.observability import configure_logging, ERROR
+
+def sense_inputs(n_users: int, txns_per_user: int, seed: int):
+    """Lazily generated (sms, manual_entries, ocr_text) inputs, so the input itself is never held in memory."""
+    rng = random.Random(seed)
+    for _ in range(n_users):
+        _, sms, manual, ocr = generators.batch_records(["user"], rng, txns_per_user)[0]
+        yield sms, manual, ocr
+
+if __name__ == "__main__":
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    txns_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    max_processes = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+    configure_logging(min_level=ERROR, stdout=False)
+    worker = SenseWorker()
+
+    start = time.perf_counter()
+    for inputs in sense_inputs(n_users, txns_per_user, seed=5):
+        worker.run_sense_worker(*inputs)
+    serial_s = time.perf_counter() - start
+
+    print(f"--- Sense stage, {n_users:,} users x ~{txns_per_user} transactions ({os.cpu_count()} cores) ---")
+    print(f"serial run_sense_worker : {serial_s:7.2f}s ({n_users / serial_s:9,.0f} users/s)")
+    processes = 1
+    while processes <= max_processes:
+        start = time.perf_counter()
+        for _ in worker.run_sense_many(sense_inputs(n_users, txns_per_user, seed=5), processes=processes):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"run_sense_many x{processes:<3}    : {elapsed:7.2f}s ({n_users / elapsed:9,.0f} users/s, {serial_s / elapsed:5.2f}x serial)")
+        processes *= 2
+
+    # Backpressure: the parent's peak allocation should not grow with the number of users streamed through.
+    for users in (n_users // 4, n_users):
+        tracemalloc.start()
+        for _ in worker.run_sense_many(sense_inputs(users, txns_per_user, seed=5), processes=max_processes):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"parent peak, {users:>7,} users : {peak / 2**20:6.1f} MiB")
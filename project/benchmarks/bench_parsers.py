@@ -0,0 +1,52 @@
+import sys, os
+import random
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.tools.tools import parse_sms_transaction, parse_scanner_ocr, parse_many
+
+MERCHANTS = ["STARBUCKS", "WALMART", "UBER", "AMAZON", "DOORDASH", "SHELL", "TARGET", "CVS PHARMACY"]
+
+SMS_TEMPLATES = [
+    "Your a/c XX{acct} debited ${amount} at {merchant} on 12-05. Avl Bal ${balance}",
+    "Purchase of INR {amount} at {merchant} using card ending {acct}.",
+    "Paid {amount} USD to {merchant} via card",
+    "Rs.{amount} credited to your account. Avl bal Rs. {balance}",
+]
+
+def build_sms_corpus(n: int, rng: random.Random):
+    return [
+        rng.choice(SMS_TEMPLATES).format(acct=rng.randint(1000, 9999), amount=f"{rng.uniform(1, 500):.2f}",
+                                         merchant=rng.choice(MERCHANTS), balance=f"{rng.randint(100, 9000):,}.00")
+        for _ in range(n)
+    ]
+
+def build_receipt_corpus(n: int, rng: random.Random):
+    receipts = []
+    for _ in range(n):
+        items = [f"ITEM {i} ${rng.uniform(1, 30):.2f}" for i in range(rng.randint(1, 6))]
+        receipts.append("\n".join([rng.choice(MERCHANTS)] + items + [f"TOTAL ${rng.uniform(10, 150):.2f}"]))
+    return receipts
+
+def timed(fn):
+    start = time.perf_counter()
+    count = fn()
+    return time.perf_counter() - start, count
+
+if __name__ == "__main__":
+    n_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(7)
+    sms_corpus = build_sms_corpus(n_messages, rng)
+    receipt_corpus = build_receipt_corpus(n_messages // 4, rng)
+
+    results = {
+        "sms per-message": timed(lambda: sum(len(parse_sms_transaction(t)) for t in sms_corpus)),
+        "sms parse_many": timed(lambda: sum(1 for _ in parse_many(sms_corpus, source="SMS"))),
+        "ocr per-receipt": timed(lambda: sum(len(parse_scanner_ocr(t)) for t in receipt_corpus)),
+        "ocr parse_many": timed(lambda: sum(1 for _ in parse_many(receipt_corpus, source="Scanner"))),
+    }
+
+    print(f"--- Parser throughput ({len(sms_corpus):,} SMS, {len(receipt_corpus):,} receipts) ---")
+    for label, (seconds, events) in results.items():
+        n_inputs = len(sms_corpus) if label.startswith("sms") else len(receipt_corpus)
+        print(f"{label:16}: {seconds:.2f}s ({n_inputs / seconds:,.0f} texts/s, {events:,} expense events)")
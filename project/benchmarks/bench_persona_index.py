@@ -0,0 +1,55 @@
+import sys, os
+import random
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.core.a2a_protocol import PlannerRecommendation
+from project.tools.persona_index import PersonaIndex
+
+TAGS = ["FLEXIBLE", "REMOTE", "STUDENT", "RETIREE", "FAMILY", "ARTIST", "GIG", "SKILL", "EASY", "LOW_STRESS", "TRANSPORT", "FIXED"]
+
+def legacy_select(persona_gigs, user_id, all_recs):
+    """The pre-index Planner._filter_recs_by_persona_and_category selection."""
+    found = []
+    for expected in persona_gigs.get(user_id, []):
+        for rec in all_recs:
+            if rec.name == expected and rec not in found:
+                found.append(rec)
+    if not found:
+        for rec in all_recs:
+            if rec.name == "Online Survey/Data Annotation":
+                found.append(rec)
+                break
+    return sorted(found, key=lambda x: x.risk_score)
+
+def build_catalog(n_gigs: int, rng: random.Random):
+    gigs = [PlannerRecommendation(name=f"Gig {i}", type="gig", risk_score=round(rng.uniform(0, 0.49), 2),
+                                  relevance_tags=rng.sample(TAGS, 3)) for i in range(n_gigs)]
+    gigs.append(PlannerRecommendation(name="Online Survey/Data Annotation", type="remote", risk_score=0.1, relevance_tags=["ANY", "EASY"]))
+    return tuple(sorted(gigs, key=lambda rec: rec.risk_score))
+
+if __name__ == "__main__":
+    n_gigs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_personas = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    n_requests = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    rng = random.Random(11)
+    recs = build_catalog(n_gigs, rng)
+    persona_gigs = {f"persona_{p}": [f"Gig {rng.randrange(n_gigs)}" for _ in range(rng.randint(2, 12))] for p in range(n_personas)}
+    users = [f"persona_{rng.randrange(n_personas + n_personas // 10)}" for _ in range(n_requests)] # ~10% unknown personas
+
+    start = time.perf_counter()
+    legacy = [legacy_select(persona_gigs, user, recs) for user in users]
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = PersonaIndex(persona_gigs)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = [index.select(user, recs) for user in users]
+    indexed_s = time.perf_counter() - start
+
+    mismatches = sum(list(a) != b for a, b in zip(indexed, legacy))
+    print(f"--- Persona selection ({n_gigs:,} gigs, {n_personas:,} personas, {n_requests:,} requests) ---")
+    print(f"legacy nested scan : {legacy_s / n_requests * 1e6:10.1f} us/request")
+    print(f"persona index      : {indexed_s / n_requests * 1e6:10.1f} us/request (index build {build_s * 1e3:.2f} ms, first-use view/merge included)")
+    print(f"speedup            : {legacy_s / indexed_s:10.1f}x, mismatches: {mismatches}")
@@ -0,0 +1,51 @@
+import sys, os
+import io
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.main_agent import MainAgent
+from project.core.observability import generate_trace
+
+def legacy_handle_message(agent: MainAgent, sms, manual, ocr):
+    """The pre-PipelineContext serialization pattern: every model dumped eagerly, plan/coach dumped repeatedly."""
+    context = agent._run_deterministic_stages(sms, manual, ocr)
+    sense_dump = context.sense_state.model_dump()
+    memory_dump = context.memory_snapshot.model_dump()
+    context.plan_output = agent.planner.run_planning(context)
+    context.coach_advice = agent.coach.run_concierge(context.sense_state, context.plan_output, context.memory_snapshot)
+    coach_dump = context.coach_advice.model_dump()
+    trace = generate_trace(context, context.plan_output.model_dump(), context.coach_advice.model_dump())
+    return {"plan": context.plan_output.model_dump(), "coach_advice": context.coach_advice.model_dump(), "trace": trace,
+            "_legacy": (sense_dump, memory_dump, coach_dump)}
+
+def measure(fn, n_requests: int):
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        fn()
+    latency_us = (time.perf_counter() - start) / n_requests * 1e6
+
+    tracemalloc.start()
+    fn() # warm
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latency_us, peak - before
+
+if __name__ == "__main__":
+    n_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    manual = [{"category": "FOOD", "amount": 1.25} for _ in range(n_transactions)]
+    agent = MainAgent(user_id="stable_user")
+
+    with redirect_stdout(io.StringIO()):
+        legacy = measure(lambda: legacy_handle_message(agent, "Debit $5.00 purchase.", manual, "GROCERY $10.00"), n_requests)
+        typed = measure(lambda: agent.handle_message("Debit $5.00 purchase.", manual, "GROCERY $10.00"), n_requests)
+
+    print(f"--- Orchestrator serialization ({n_transactions} transactions/request, {n_requests} requests) ---")
+    print(f"legacy eager model_dump : {legacy[0]:8.1f} us/request, peak alloc {legacy[1] / 1024:8.1f} KiB/request")
+    print(f"PipelineContext (lazy)  : {typed[0]:8.1f} us/request, peak alloc {typed[1] / 1024:8.1f} KiB/request")
+    print(f"reduction               : {1 - typed[0] / legacy[0]:.1%} latency, {1 - typed[1] / legacy[1]:.1%} peak allocation")
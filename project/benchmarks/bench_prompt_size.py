@@ -0,0 +1,32 @@
+import sys, os
+import json
+import random
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.core.context_engineering import encode_planner_context, estimate_tokens
+from project.evaluator.verifier import run_deterministic_verifier
+
+CATEGORIES = ["FOOD", "COFFEE", "GROCERIES", "TRANSPORT", "RETAIL", "DINING", "ENTERTAINMENT", "UTILITIES", "HEALTH", "MISC", "TRAVEL", "SUBSCRIPTIONS"]
+
+def legacy_context(sense_state, memory_snapshot, verified_recs, risk_level):
+    """The pre-budget engineer_planner_context: the whole sense state, pretty-printed."""
+    return json.dumps({"SENSE_STATE": sense_state, "MEMORY_SNAPSHOT": memory_snapshot, "RISK_LEVEL": risk_level,
+                       "VERIFIED_EARNING_RECS": verified_recs,
+                       "INSTRUCTION": "Generate a micro-plan. If RISK_LEVEL is HIGH, prioritize SURVIVAL and omit earning recs."}, indent=2)
+
+if __name__ == "__main__":
+    rng = random.Random(3)
+    memory = {"discipline_score": 0.6, "shortfall_frequency_30d": 0.01, "recent_risky_category": "FOOD", "plan_follow_streak": 3}
+    recs = [r.model_dump() for r in run_deterministic_verifier("LOW")["verified_recs"]]
+
+    print("--- Planner context size vs transaction count (tokens estimated at 4 chars/token) ---")
+    print(f"{'txns':>8} | {'legacy tokens':>13} | {'compact tokens':>14} | {'compact encode us':>17}")
+    for n in (10, 100, 1_000, 10_000, 100_000):
+        expenses = [{"source": rng.choice(["SMS", "Manual", "Scanner"]), "amount_cents": rng.randint(100, 20000), "category": rng.choice(CATEGORIES)} for _ in range(n)]
+        state = {"balance_est_cents": 150000, "shortfall_projection_7d_cents": 0, "parser_confidence_score": 0.9, "all_today_expenses": expenses}
+        legacy_tokens = estimate_tokens(legacy_context(state, memory, recs, "LOW"))
+        start = time.perf_counter()
+        _, compact_tokens = encode_planner_context(state, memory, recs, "LOW")
+        encode_us = (time.perf_counter() - start) * 1e6
+        print(f"{n:>8,} | {legacy_tokens:>13,} | {compact_tokens:>14,} | {encode_us:>17,.0f}")
@@ -0,0 +1,34 @@
+import sys, os
+import time
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.core.a2a_protocol import SenseState
+from project.core.observability import configure_logging, ERROR
+from project.evaluator.risk import run_risk_analysis, run_risk_analysis_batch, risk_level_counts, RISK_LEVELS
+
+if __name__ == "__main__":
+    n_states = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    n_scalar = min(n_states, int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
+    configure_logging(min_level=ERROR, stdout=False) # the scalar path logs every escalation
+    rng = np.random.default_rng(9)
+    balance = rng.integers(0, 300_000, n_states)
+    shortfall = np.where(rng.random(n_states) < 0.3, 0, rng.integers(0, 200_000, n_states))
+    confidence = rng.choice([0.4, 0.9], n_states)
+
+    states = [SenseState.model_construct(balance_est_cents=int(b), shortfall_projection_7d_cents=int(s), parser_confidence_score=float(c), all_today_expenses=[])
+              for b, s, c in zip(balance[:n_scalar], shortfall[:n_scalar], confidence[:n_scalar])]
+    start = time.perf_counter()
+    scalar = [run_risk_analysis(state) for state in states]
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codes = run_risk_analysis_batch(balance, shortfall, confidence)
+    batch_s = time.perf_counter() - start
+
+    mismatches = sum(RISK_LEVELS[code] != level for code, level in zip(codes[:n_scalar].tolist(), scalar))
+    print(f"--- Risk scoring ({n_states:,} states; scalar path timed on {n_scalar:,}) ---")
+    print(f"scalar run_risk_analysis  : {n_scalar / scalar_s:14,.0f} states/s")
+    print(f"run_risk_analysis_batch   : {n_states / batch_s:14,.0f} states/s ({batch_s * 1000:.1f} ms total)")
+    print(f"speedup                   : {(n_states / batch_s) / (n_scalar / scalar_s):14,.1f}x, mismatches: {mismatches}")
+    print(f"levels                    : {risk_level_counts(codes)}")
@@ -0,0 +1,46 @@
+import sys, os
+import json
+import random
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.benchmarks import generators
+from project.agents.planner import Planner, PlannerPolicy
+from project.agents.worker import SenseWorker
+from project.core.observability import configure_logging, ERROR
+from project.evaluator.simulation import Scenario, ScenarioSimulator, Population
+from project.main_agent import MainAgent
+from project.memory.storage import InMemoryBackend
+
+if __name__ == "__main__":
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    configure_logging(min_level=ERROR, stdout=False)
+    rng = random.Random(23)
+    history = generators.generate_personas(n_users, rng)
+    records = generators.batch_records(list(history)[:n_users], rng)
+    backend = InMemoryBackend(history)
+    scenarios = [Scenario(name=f"threshold_{t:.2f}_div_{d}", policy=PlannerPolicy(mode="rules", discipline_threshold=t, spend_limit_divisor=d))
+                 for t in (0.6, 0.65, 0.7, 0.75) for d in (3, 4, 5)]
+
+    # Baseline: rerun the deterministic pipeline per user per variant.
+    worker = SenseWorker()
+    start = time.perf_counter()
+    for scenario in scenarios:
+        planner = Planner(policy=scenario.policy)
+        planner.client = None
+        for user_id, sms_input, manual_entries, ocr_text in records:
+            planner.run_planning(MainAgent(user_id=user_id, worker=worker, planner=planner, memory_backend=backend)._run_deterministic_stages(sms_input, manual_entries, ocr_text))
+    rerun_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    population = Population.from_records(records, worker, backend)
+    population_s = time.perf_counter() - start
+    start = time.perf_counter()
+    report = ScenarioSimulator(population).compare(scenarios)
+    simulate_s = time.perf_counter() - start
+
+    print(f"--- What-if simulation ({len(records):,} users x {len(scenarios)} scenarios) ---")
+    print(f"per-user reruns       : {rerun_s:8.2f} s")
+    print(f"simulator             : {population_s + simulate_s:8.2f} s (shared stages {population_s:.2f} s, scenarios {simulate_s * 1000:.1f} ms)")
+    print(f"speedup               : {rerun_s / (population_s + simulate_s):8.1f}x")
+    print(json.dumps({name: {"priorities": s["priorities"], "transitions": s["transitions"]} for name, s in list(report["scenarios"].items())[:3]}, indent=2))
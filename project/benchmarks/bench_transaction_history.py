@@ -0,0 +1,63 @@
+import sys, os
+import random
+import tempfile
+import time
+from collections import defaultdict
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.benchmarks.generators import CATEGORIES
+from project.core.cashflow import today_ordinal
+from project.memory.transaction_history import TransactionHistory
+
+if __name__ == "__main__":
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    rng = random.Random(25)
+    today = today_ordinal()
+    users = [f"user_{i}" for i in range(n_users)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = TransactionHistory(tmp)
+        start = time.perf_counter()
+        for day in range(today - n_days + 1, today + 1):
+            for user_id in users:
+                categories = rng.choices(CATEGORIES, k=rng.randint(1, 5))
+                history.append(user_id, day, categories, [rng.randint(100, 10_000) for _ in categories])
+        append_s = time.perf_counter() - start
+        history.close()
+
+        start = time.perf_counter()
+        history = TransactionHistory(tmp)
+        open_s = time.perf_counter() - start
+        sample = rng.sample(users, min(200, n_users))
+
+        start = time.perf_counter()
+        for user_id in sample:
+            history.category_totals(user_id, 90)
+        per_user_s = (time.perf_counter() - start) / len(sample)
+
+        start = time.perf_counter()
+        history.category_matrix(90)
+        matrix_s = time.perf_counter() - start
+
+        # Baseline: load every record into per-user Python dicts, then aggregate the window.
+        start = time.perf_counter()
+        mapped = history._mapped()
+        loaded = defaultdict(list)
+        for user, day, category, amount in mapped.tolist():
+            loaded[user].append((day, category, amount))
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for user_id in sample:
+            totals = defaultdict(int)
+            for day, category, amount in loaded[history.users.ids[user_id]]:
+                if day > today - 90:
+                    totals[category] += amount
+        dict_per_user_s = (time.perf_counter() - start) / len(sample)
+        history.close()
+
+    print(f"--- Transaction history ({len(mapped):,} records, {n_users:,} users x {n_days} days) ---")
+    print(f"append                    : {len(mapped) / append_s:12,.0f} records/s")
+    print(f"open (index load)         : {open_s * 1000:10.1f} ms")
+    print(f"90d totals, one user      : {per_user_s * 1e6:10.1f} us (memmap)  vs {dict_per_user_s * 1e6:10.1f} us from dicts after a {load_s:.2f} s full load")
+    print(f"90d matrix, all users     : {matrix_s * 1000:10.1f} ms")
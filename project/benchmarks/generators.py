@@ -0,0 +1,78 @@
+"""Seeded synthetic workloads shared by the benchmark suite: personas, SMS/OCR/manual streams and gig catalogs."""
+import random
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from project.agents.planner import PERSONA_GIG_PREFERENCES
+from project.agents.worker import VENDOR_MAP
+from project.evaluator.verifier import MOCK_VERIFIED_GIGS
+from project.memory.session_memory import USER_SIMULATED_HISTORY
+
+CATEGORIES = ["FOOD", "COFFEE", "GROCERIES", "TRANSPORT", "RETAIL", "DINING", "ENTERTAINMENT", "UTILITIES", "HEALTH", "MISC", "TRAVEL", "SUBSCRIPTIONS"]
+TAGS = ["FLEXIBLE", "REMOTE", "STUDENT", "RETIREE", "FAMILY", "ARTIST", "GIG", "SKILL", "EASY", "LOW_STRESS", "TRANSPORT", "FIXED"]
+MERCHANTS = list(VENDOR_MAP) + ["CORNER STORE", "CITY PARKING", "BOOK NOOK", "GYMCO"]
+
+SMS_TEMPLATES = [
+    "Your a/c XX{acct} debited ${amount} at {merchant} on 12-05. Avl Bal ${balance}",
+    "Purchase of INR {amount} at {merchant} using card ending {acct}.",
+    "Paid {amount} USD to {merchant} via card",
+    "Rs.{amount} credited to your account. Avl bal Rs. {balance}",
+]
+
+BatchRecord = Tuple[str, str, List[Dict[str, Any]], str]
+
+
+def generate_personas(n: int, rng: random.Random) -> Dict[str, Dict[str, Any]]:
+    """USER_SIMULATED_HISTORY plus n synthetic personas ('synthetic_user_<i>') in the same shape."""
+    history = dict(USER_SIMULATED_HISTORY)
+    for i in range(n):
+        risky = {category: rng.randint(500, 20000) for category in rng.sample(CATEGORIES, rng.randint(1, 3))}
+        history[f"synthetic_user_{i}"] = {
+            "discipline_score": round(rng.uniform(0.1, 0.95), 2),
+            "compliance_days": rng.randint(0, 30),
+            "risky_spending": defaultdict(lambda: 0, risky),
+        }
+    return history
+
+def generate_persona_preferences(n: int, gigs: List[Dict[str, Any]], rng: random.Random) -> Dict[str, Any]:
+    """PERSONA_GIG_PREFERENCES plus n synthetic personas preferring a few named gigs and/or tags."""
+    preferences = dict(PERSONA_GIG_PREFERENCES)
+    names = [gig["name"] for gig in gigs]
+    for i in range(n):
+        preferences[f"synthetic_user_{i}"] = {"gigs": rng.sample(names, min(len(names), rng.randint(1, 6))), "tags": rng.sample(TAGS, rng.randint(0, 2))}
+    return preferences
+
+def sms_stream(n: int, rng: random.Random) -> List[str]:
+    return [
+        rng.choice(SMS_TEMPLATES).format(acct=rng.randint(1000, 9999), amount=f"{rng.uniform(1, 500):.2f}",
+                                         merchant=rng.choice(MERCHANTS), balance=f"{rng.randint(100, 9000):,}.00")
+        for _ in range(n)
+    ]
+
+def ocr_receipts(n: int, rng: random.Random) -> List[str]:
+    receipts = []
+    for _ in range(n):
+        items = [f"ITEM {i} ${rng.uniform(1, 30):.2f}" for i in range(rng.randint(1, 6))]
+        receipts.append("\n".join([rng.choice(MERCHANTS)] + items + [f"TOTAL ${rng.uniform(10, 150):.2f}"]))
+    return receipts
+
+def manual_entries(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    return [{"category": rng.choice(CATEGORIES + MERCHANTS), "amount": round(rng.uniform(0.5, 120), 2)} for _ in range(n)]
+
+def gig_catalog(n: int, rng: random.Random, scam_rate: float = 0.05) -> List[Dict[str, Any]]:
+    """MOCK_VERIFIED_GIGS plus n synthetic gigs; about scam_rate of them are above the safety threshold."""
+    gigs = list(MOCK_VERIFIED_GIGS)
+    for i in range(n):
+        scam = rng.random() < scam_rate
+        gigs.append({"name": f"Synthetic Gig {i}", "type": "scam" if scam else rng.choice(["gig", "remote", "fixed", "academic"]),
+                     "risk_score": round(rng.uniform(0.6, 0.99) if scam else rng.uniform(0.0, 0.45), 2),
+                     "relevance_tags": rng.sample(TAGS, 3)})
+    return gigs
+
+def batch_records(user_ids: List[str], rng: random.Random, txns_per_user: int = 5) -> List[BatchRecord]:
+    """One (user_id, sms, manual_entries, ocr_text) record per user; each channel carries about txns_per_user/3 items."""
+    per_channel = max(1, txns_per_user // 3)
+    return [
+        (user_id, "\n".join(sms_stream(per_channel, rng)), manual_entries(per_channel, rng), "\n".join(ocr_receipts(1, rng)))
+        for user_id in user_ids
+    ]
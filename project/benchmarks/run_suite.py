@@ -0,0 +1,206 @@
+"""
+Benchmark suite: per-module microbenchmarks plus end-to-end pipeline throughput/latency with a stub LLM.
+
+    python project/benchmarks/run_suite.py --out bench.json           # full run, JSON results
+    python project/benchmarks/run_suite.py --quick --compare bench.json  # smaller run, compared to a baseline
+
+Every workload is generated from --seed, so two commits benchmarked with the same seed see identical inputs.
+"""
+import sys, os
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from project.benchmarks import generators
+from project.agents.planner import Planner, PlannerPolicy
+from project.agents.coach import CoachAgent
+from project.agents.worker import SenseWorker, clean_and_categorize
+from project.core.a2a_protocol import ExpenseEvent
+from project.core.context_engineering import encode_planner_context
+from project.core.observability import Histogram, configure_logging, ERROR
+from project.evaluator.verifier import GigCatalog
+from project.main_agent import run_agent_batch, run_agent_batch_async
+from project.memory.storage import InMemoryBackend
+from project.tools.persona_index import PersonaIndex
+from project.tools.tools import parse_many
+
+# Relative slowdown (per-op time) reported as a regression by --compare.
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+SIZES = {
+    "full": {"sms": 50_000, "receipts": 10_000, "expenses": 50_000, "gigs": 5_000, "personas": 500, "requests": 20_000, "encode": 2_000, "users": 2_000},
+    "quick": {"sms": 5_000, "receipts": 1_000, "expenses": 5_000, "gigs": 500, "personas": 50, "requests": 2_000, "encode": 200, "users": 200},
+}
+
+_PLAN_JSON = json.dumps({"priority_level": "GROWTH", "micro_task": "Stub task", "earning_suggestion_name": "Online Survey/Data Annotation"})
+_ADVICE_JSON = json.dumps({"investment_tip": "tip", "optimization_suggestion": "opt", "motivational_nudge": "nudge"})
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class _StubModels:
+    def __init__(self, text: str, latency_s: float):
+        self.text = text
+        self.latency_s = latency_s
+
+    def generate_content(self, model, contents, config):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return _StubResponse(self.text)
+
+class _StubAsyncModels(_StubModels):
+    async def generate_content(self, model, contents, config):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return _StubResponse(self.text)
+
+class StubLLMClient:
+    """In-process stand-in for genai.Client (sync .models and async .aio.models) with a fixed response and latency."""
+
+    def __init__(self, text: str, latency_s: float = 0.0):
+        self.models = _StubModels(text, latency_s)
+        self.aio = type("aio", (object,), {})()
+        self.aio.models = _StubAsyncModels(text, latency_s)
+
+def stub_agents(latency_s: float):
+    planner, coach = Planner(policy=PlannerPolicy(mode="llm")), CoachAgent()
+    planner.client = StubLLMClient(_PLAN_JSON, latency_s)
+    coach.client = StubLLMClient(_ADVICE_JSON, latency_s)
+    return planner, coach
+
+
+def measure(fn: Callable[[], Any], ops: int, repeat: int) -> Dict[str, Any]:
+    """Runs fn `repeat` times; fn performs `ops` operations. Reports median/min wall time and per-op cost."""
+    fn() # warm-up (imports, lazy indexes, caches)
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    median = statistics.median(runs)
+    return {"ops": ops, "repeat": repeat, "median_s": median, "min_s": min(runs), "us_per_op": median / ops * 1e6, "ops_per_s": ops / median}
+
+def micro_benchmarks(sizes: Dict[str, int], seed: int, repeat: int) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(seed)
+    sms = generators.sms_stream(sizes["sms"], rng)
+    receipts = generators.ocr_receipts(sizes["receipts"], rng)
+    events = [ExpenseEvent(source="Manual", amount_cents=round(e["amount"] * 100), category=e["category"]) for e in generators.manual_entries(sizes["expenses"], rng)]
+    gigs = generators.gig_catalog(sizes["gigs"], rng)
+    preferences = generators.generate_persona_preferences(sizes["personas"], gigs, rng)
+    users = [rng.choice(list(preferences)) for _ in range(sizes["requests"])]
+    catalog = GigCatalog(gigs=gigs)
+    verified = catalog.verify("LOW")
+    index = PersonaIndex(preferences)
+    memory = {"discipline_score": 0.6, "shortfall_frequency_30d": 0.01, "recent_risky_category": "FOOD", "plan_follow_streak": 3}
+    recs = [rec.model_dump() for rec in verified[:10]]
+    states = [{"balance_est_cents": 150000, "shortfall_projection_7d_cents": 0, "parser_confidence_score": 0.9,
+               "all_today_expenses": [{"source": "SMS", "amount_cents": e.amount_cents, "category": e.category} for e in rng.sample(events, 200)]}
+              for _ in range(10)]
+
+    return {
+        "parsers.sms": measure(lambda: sum(1 for _ in parse_many(sms, source="SMS")), len(sms), repeat),
+        "parsers.ocr": measure(lambda: sum(1 for _ in parse_many(receipts, source="Scanner")), len(receipts), repeat),
+        "worker.clean_and_categorize": measure(lambda: [clean_and_categorize(event) for event in events], len(events), repeat),
+        "verifier.build_catalog": measure(lambda: GigCatalog(gigs=gigs), 1, repeat),
+        "verifier.verify": measure(lambda: [catalog.verify(level) for level in ("LOW", "MEDIUM", "HIGH") * (sizes["requests"] // 3)], sizes["requests"] // 3 * 3, repeat),
+        "planner.persona_filter": measure(lambda: [index.select(user, verified) for user in users], len(users), repeat),
+        "context.encode_planner_context": measure(lambda: [encode_planner_context(states[i % 10], memory, recs, "LOW") for i in range(sizes["encode"])], sizes["encode"], repeat),
+    }
+
+def _latency_summary(latencies: List[float]) -> Dict[str, Any]:
+    histogram = Histogram()
+    for seconds in latencies:
+        histogram.observe(seconds)
+    return {f"p{round(q * 100)}_ms": histogram.quantile(q) * 1000 for q in (0.5, 0.95, 0.99)}
+
+def end_to_end_benchmarks(sizes: Dict[str, int], seed: int, llm_latency_s: float) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(seed)
+    history = generators.generate_personas(sizes["personas"], rng)
+    records = generators.batch_records([rng.choice(list(history)) for _ in range(sizes["users"])], rng)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    # Sync batch, LLM answers instantly: pure pipeline overhead.
+    planner, coach = stub_agents(0.0)
+    latencies = []
+    start = time.perf_counter()
+    batch = run_agent_batch(records, worker=SenseWorker(), planner=planner, coach=coach, memory_backend=InMemoryBackend(history))
+    while True:
+        request_start = time.perf_counter()
+        if next(batch, None) is None:
+            break
+        latencies.append(time.perf_counter() - request_start)
+    elapsed = time.perf_counter() - start
+    results["e2e.sync_batch"] = {"ops": len(records), "median_s": elapsed, "us_per_op": elapsed / len(records) * 1e6, "ops_per_s": len(records) / elapsed, **_latency_summary(latencies)}
+
+    # Async batch against a stub LLM with realistic latency: concurrency-bound throughput.
+    planner, coach = stub_agents(llm_latency_s)
+    start = time.perf_counter()
+    asyncio.run(run_agent_batch_async(records, planner=planner, coach=coach, memory_backend=InMemoryBackend(history)))
+    elapsed = time.perf_counter() - start
+    results["e2e.async_batch"] = {"ops": len(records), "median_s": elapsed, "us_per_op": elapsed / len(records) * 1e6, "ops_per_s": len(records) / elapsed, "llm_latency_ms": llm_latency_s * 1000}
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Human-readable per-benchmark deltas (per-op time); returns the names that regressed beyond threshold."""
+    regressions = []
+    print(f"--- Compared to {baseline['meta'].get('commit')} (threshold {threshold:.0%}) ---")
+    for name, current in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            print(f"{name:34}: new")
+            continue
+        change = current["us_per_op"] / previous["us_per_op"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:34}: {previous['us_per_op']:12.2f} -> {current['us_per_op']:12.2f} us/op ({change:+.1%}) {flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--quick", action="store_true", help="smaller workloads (CI smoke run)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0, help="stub LLM latency for the async end-to-end run")
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    # Pipeline logs would dominate the measurements; keep errors only, off stdout.
+    configure_logging(min_level=ERROR, stdout=False)
+    sizes = SIZES["quick" if args.quick else "full"]
+    results = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(), "seed": args.seed,
+                 "profile": "quick" if args.quick else "full", "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "benchmarks": {**micro_benchmarks(sizes, args.seed, args.repeat), **end_to_end_benchmarks(sizes, args.seed, args.llm_latency_ms / 1000)},
+    }
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        for name, result in results["benchmarks"].items():
+            print(f"{name:34}: {result['us_per_op']:12.2f} us/op  {result['ops_per_s']:14,.0f} ops/s")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Dict, Any, List, Optional
 
 class ExpenseEvent(BaseModel):
@@ -9,9 +9,21 @@ class ExpenseEvent(BaseModel):
 class SenseState(BaseModel):
     balance_est_cents: int
     shortfall_projection_7d_cents: int
+    shortfall_projection_30d_cents: int = 0
     parser_confidence_score: float = Field(description="0.0 to 1.0 confidence in all parsed data.")
     all_today_expenses: List[ExpenseEvent]
 
+    @classmethod
+    def from_batch(cls, batch: Any, balance_est_cents: int, shortfall_projection_7d_cents: int, parser_confidence_score: float, shortfall_projection_30d_cents: int = 0) -> "SenseState":
+        """Builds a SenseState from a columnar ExpenseBatch (core/expense_batch.py) without re-validating the events to_events() built."""
+        return cls.model_construct(
+            balance_est_cents=balance_est_cents,
+            shortfall_projection_7d_cents=shortfall_projection_7d_cents,
+            shortfall_projection_30d_cents=shortfall_projection_30d_cents,
+            parser_confidence_score=parser_confidence_score,
+            all_today_expenses=batch.to_events(),
+        )
+
 class BehaviorFingerprint(BaseModel):
     discipline_score: float = Field(description="0.0 to 1.0 plan follow rate.")
     shortfall_frequency_30d: float
@@ -19,6 +31,9 @@ class BehaviorFingerprint(BaseModel):
     plan_follow_streak: int
 
 class PlannerRecommendation(BaseModel): # Added PlannerRecommendation
+    # Frozen: verified recommendations are shared read-only across requests (see evaluator/verifier.py).
+    model_config = ConfigDict(frozen=True)
+
     name: str
     type: str
     risk_score: float
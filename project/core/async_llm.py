@@ -0,0 +1,20 @@
+import asyncio
+import os
+from typing import Any, List, Optional
+
+# Per-call budget for a single Gemini request on the async path; expiry falls back to simulation.
+DEFAULT_LLM_TIMEOUT_S = float(os.getenv("NIVRA_LLM_TIMEOUT_S", "10.0"))
+
+async def generate_content_async(client: Any, model: str, contents: List[Any], config: Any, timeout_s: Optional[float] = None) -> Any:
+    """
+    Awaits one generate_content call with a timeout.
+    Uses the client's native async surface (client.aio) when available, otherwise runs the blocking call in a thread.
+    Raises asyncio.TimeoutError when the call exceeds timeout_s.
+    """
+    timeout = DEFAULT_LLM_TIMEOUT_S if timeout_s is None else timeout_s
+    aio = getattr(client, "aio", None)
+    if aio is not None:
+        call = aio.models.generate_content(model=model, contents=contents, config=config)
+    else:
+        call = asyncio.to_thread(client.models.generate_content, model=model, contents=contents, config=config)
+    return await asyncio.wait_for(call, timeout=timeout)
@@ -0,0 +1,166 @@
+import datetime
+from typing import Dict, Optional, Sequence
+import numpy as np
+from project.core.expense_batch import CategoryTable
+
+# Smoothing of the per-category daily spend level (higher = reacts faster to recent days).
+EWMA_ALPHA = 0.2
+# Smoothing of the per-weekday levels used for day-of-week seasonality (each weekday is seen once a week).
+SEASON_ALPHA = 0.3
+# Days of history before weekday seasonality is applied (until then every weekday weighs 1.0).
+SEASON_MIN_DAYS = 14
+
+
+def today_ordinal() -> int:
+    return datetime.date.today().toordinal()
+
+def weekday_of(day: np.ndarray) -> np.ndarray:
+    # Proleptic Gregorian ordinal 1 (0001-01-01) is a Monday, matching date.weekday().
+    return (day - 1) % 7
+
+
+class CashFlowProjector:
+    """
+    Per-user spend forecaster: an EWMA of daily spend per category, scaled by a day-of-week factor per category.
+
+    State is a handful of [categories] / [7, categories] arrays, so add() is O(1) per event and closing a day
+    (on the first event of a later day) is one vectorized update, independent of how much history was folded in.
+    from_history() builds the same state from a full history in one vectorized pass over days x categories.
+    Events older than the current day are counted into the current day (closed days are not reopened).
+    Each projector interns into its own CategoryTable, so its arrays span only the categories its user spent in.
+    """
+
+    def __init__(self, alpha: float = EWMA_ALPHA, season_alpha: float = SEASON_ALPHA, categories: Optional[CategoryTable] = None):
+        self.alpha = alpha
+        self.season_alpha = season_alpha
+        self.categories = categories if categories is not None else CategoryTable()
+        self.current_day: Optional[int] = None
+        self.closed_days = 0
+        size = max(8, len(self.categories.names))
+        self.today = np.zeros(size)
+        self.level = np.zeros(size) # EWMA of daily spend per category (not yet bias-corrected)
+        self.weekday_level = np.zeros((7, size)) # EWMA of spend per (weekday, category)
+        self.weekday_days = np.zeros(7, dtype=np.int64) # closed days seen per weekday
+
+    def _ensure_capacity(self, category_id: int):
+        if category_id < len(self.today):
+            return
+        grow = max(category_id + 1, 2 * len(self.today)) - len(self.today)
+        self.today = np.pad(self.today, (0, grow))
+        self.level = np.pad(self.level, (0, grow))
+        self.weekday_level = np.pad(self.weekday_level, ((0, 0), (0, grow)))
+
+    @property
+    def has_history(self) -> bool:
+        return self.closed_days > 0
+
+    def add(self, day: int, category: str, amount_cents: int):
+        """Folds one expense into the model."""
+        if self.current_day is None:
+            self.current_day = day
+        elif day > self.current_day:
+            self._close_days(day)
+        category_id = self.categories.intern(category)
+        self._ensure_capacity(category_id)
+        self.today[category_id] += amount_cents
+
+    def replace_day(self, day: int, totals_by_category: Dict[str, int]):
+        """
+        Sets the open day's spend to totals_by_category (for callers that re-send the whole day, so repeating
+        the call does not count it twice). A day older than the current one is ignored: closed days are not reopened.
+        """
+        if self.current_day is None:
+            self.current_day = day
+        elif day > self.current_day:
+            self._close_days(day)
+        elif day < self.current_day:
+            return
+        self.today[:] = 0
+        for category, amount_cents in totals_by_category.items():
+            self.add(day, category, amount_cents)
+
+    def _close_days(self, new_day: int):
+        """Closes the current day, decays through any days without spend, and starts new_day."""
+        a, b = self.alpha, self.season_alpha
+        closed_weekday = int(weekday_of(np.int64(self.current_day)))
+        self.level = a * self.today + (1 - a) * self.level
+        self.weekday_level[closed_weekday] = b * self.today + (1 - b) * self.weekday_level[closed_weekday]
+        self.weekday_days[closed_weekday] += 1
+
+        empty_days = new_day - self.current_day - 1
+        if empty_days > 0:
+            self.level *= (1 - a) ** empty_days
+            empty_per_weekday = np.bincount(weekday_of(np.arange(self.current_day + 1, self.current_day + 1 + min(empty_days, 7 * 53))), minlength=7)
+            if empty_days > 7 * 53: # long gaps: every weekday is effectively decayed to zero anyway
+                empty_per_weekday[:] = 53
+            self.weekday_level *= ((1 - b) ** empty_per_weekday)[:, None]
+            self.weekday_days += empty_per_weekday
+        self.closed_days += 1 + max(0, empty_days)
+        self.today[:] = 0
+        self.current_day = new_day
+
+    @classmethod
+    def from_history(cls, days: Sequence[int], categories: Sequence[str], amounts_cents: Sequence[int], **kwargs) -> "CashFlowProjector":
+        """
+        Builds the model from a full history (parallel day-ordinal / category / amount columns, any order).
+        Equivalent to add()-ing every event in day order, but computed with array operations.
+        """
+        projector = cls(**kwargs)
+        if len(days) == 0:
+            return projector
+        days = np.asarray(days, dtype=np.int64)
+        category_ids = np.fromiter((projector.categories.intern(c) for c in categories), dtype=np.int64, count=len(days))
+        projector._ensure_capacity(int(category_ids.max()))
+        first, last = int(days.min()), int(days.max())
+
+        # Daily spend matrix [days, categories]; the last day stays open as "today".
+        daily = np.zeros((last - first + 1, len(projector.today)))
+        np.add.at(daily, (days - first, category_ids), np.asarray(amounts_cents, dtype=np.float64))
+        closed = daily[:-1]
+        n_closed = len(closed)
+        a, b = projector.alpha, projector.season_alpha
+
+        # EWMA over closed days: day t (0-based) weighs a * (1 - a) ** (n_closed - 1 - t).
+        projector.level = (a * (1 - a) ** np.arange(n_closed - 1, -1, -1)) @ closed
+        weekdays = weekday_of(np.arange(first, last))
+        for weekday in range(7):
+            rows = closed[weekdays == weekday]
+            projector.weekday_level[weekday] = (b * (1 - b) ** np.arange(len(rows) - 1, -1, -1)) @ rows
+            projector.weekday_days[weekday] = len(rows)
+        projector.today = daily[-1].copy()
+        projector.current_day = last
+        projector.closed_days = n_closed
+        return projector
+
+    def _daily_level(self) -> np.ndarray:
+        # Bias correction: the EWMA starts at zero, so early estimates are scaled up by 1 / (1 - (1 - a) ** n).
+        return self.level / (1 - (1 - self.alpha) ** self.closed_days)
+
+    def _seasonality(self) -> np.ndarray:
+        """[7, categories] multipliers (mean 1.0 per category across weekdays)."""
+        if self.closed_days < SEASON_MIN_DAYS:
+            return np.ones_like(self.weekday_level)
+        correction = 1 - (1 - self.season_alpha) ** np.maximum(self.weekday_days, 1)
+        by_weekday = self.weekday_level / correction[:, None]
+        mean = by_weekday.mean(axis=0)
+        return np.divide(by_weekday, mean, out=np.ones_like(by_weekday), where=mean > 0)
+
+    def category_forecast(self, horizon_days: int) -> np.ndarray:
+        """Projected spend per category id over the horizon_days after the current day."""
+        if not self.has_history:
+            return np.zeros_like(self.level)
+        start = self.current_day + 1
+        per_weekday = np.bincount(weekday_of(np.arange(start, start + horizon_days)), minlength=7)
+        return (per_weekday @ self._seasonality()) * self._daily_level()
+
+    def category_breakdown(self, horizon_days: int) -> Dict[str, int]:
+        forecast = self.category_forecast(horizon_days)
+        names = self.categories.names
+        return {names[i]: int(round(forecast[i])) for i in np.flatnonzero(forecast[:len(names)] > 0)}
+
+    def project_spend(self, horizon_days: int) -> int:
+        return int(round(self.category_forecast(horizon_days).sum()))
+
+    def shortfall(self, balance_cents: int, horizon_days: int) -> int:
+        """Projected spend over the horizon in excess of the current balance."""
+        return max(0, self.project_spend(horizon_days) - balance_cents)
@@ -1,17 +1,92 @@
-from typing import Dict, Any, List
 import json
-from project.core.a2a_protocol import BehaviorFingerprint, PlannerRecommendation
+import math
+import os
+from typing import Dict, Any, Iterable, List, Tuple, Union
+from project.core.a2a_protocol import BehaviorFingerprint, PlannerRecommendation, SenseState
 
-def engineer_planner_context(sense_state: Dict[str, Any], memory_snapshot: Dict[str, Any], verified_recs: List[Dict[str, Any]], risk_level: str) -> str:
+# Upper bound on the estimated size of the planner context block (system prompt not included).
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv("NIVRA_PROMPT_TOKEN_BUDGET", "400"))
+# Rough English/JSON ratio used for estimates; good enough for budgeting, not billing.
+CHARS_PER_TOKEN = 4
+# Starting caps; the encoder shrinks them further when the budget demands it.
+MAX_PROMPT_CATEGORIES = 8
+MAX_PROMPT_RECS = 5
+
+_INSTRUCTION = "Generate a micro-plan. If RISK_LEVEL is HIGH, prioritize SURVIVAL and omit earning recs."
+_COMPACT = (",", ":")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _expenses_by_category(expenses: Iterable[Tuple[str, int]]) -> List[Tuple[str, int, int]]:
+    """(category, count, total_cents) rows from (category, amount_cents) pairs, largest spend first."""
+    totals: Dict[str, List[int]] = {}
+    for category, amount_cents in expenses:
+        row = totals.get(category)
+        if row is None:
+            row = totals[category] = [0, 0]
+        row[0] += 1
+        row[1] += amount_cents
+    return sorted(((category, count, total) for category, (count, total) in totals.items()), key=lambda row: -row[2])
+
+def _category_block(rows: List[Tuple[str, int, int]], max_categories: int) -> Dict[str, List[int]]:
+    # {category: [count, total_cents]}; the tail beyond max_categories is folded into OTHER.
+    block = {category: [count, total] for category, count, total in rows[:max_categories]}
+    tail = rows[max_categories:]
+    if tail:
+        other = block.setdefault("OTHER", [0, 0])
+        other[0] += sum(row[1] for row in tail)
+        other[1] += sum(row[2] for row in tail)
+    return block
+
+def encode_planner_context(sense_state: Union[SenseState, Dict[str, Any]], memory_snapshot: Dict[str, Any], verified_recs: List[Dict[str, Any]], risk_level: str,
+                           token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET) -> Tuple[str, int]:
+    """
+    Compact planner context whose size does not grow with the day's transaction count.
+    Expenses are aggregated per category, recommendations keep their (already ranked) order and are capped,
+    and caps are tightened until the estimated token count fits token_budget. Returns (text, estimated_tokens).
+    sense_state may be the SenseState itself: its expenses are then aggregated from the events, never dumped.
+    """
+    if isinstance(sense_state, SenseState):
+        expenses = sense_state.all_today_expenses
+        category_rows = _expenses_by_category((expense.category, expense.amount_cents) for expense in expenses)
+        state = sense_state.model_dump(exclude={"all_today_expenses"})
+    else:
+        expenses = sense_state.get("all_today_expenses") or []
+        category_rows = _expenses_by_category((expense["category"], expense["amount_cents"]) for expense in expenses)
+        state = {key: value for key, value in sense_state.items() if key != "all_today_expenses"}
+    state["EXPENSE_COUNT"] = len(expenses)
+
+    # Progressively cheaper encodings: fewer categories, fewer recs, then recs without tags.
+    max_categories, max_recs, with_tags = MAX_PROMPT_CATEGORIES, MAX_PROMPT_RECS, True
+    while True:
+        state["EXPENSES_BY_CATEGORY"] = _category_block(category_rows, max_categories)
+        recs = [rec if with_tags else {k: v for k, v in rec.items() if k != "relevance_tags"} for rec in verified_recs[:max_recs]]
+        text = json.dumps({
+            "SENSE_STATE": state,
+            "MEMORY_SNAPSHOT": memory_snapshot,
+            "RISK_LEVEL": risk_level,
+            "VERIFIED_EARNING_RECS": recs,
+            "INSTRUCTION": _INSTRUCTION,
+        }, separators=_COMPACT)
+        tokens = estimate_tokens(text)
+        if tokens <= token_budget:
+            return text, tokens
+        if max_categories > 3:
+            max_categories -= 1
+        elif max_recs > 1:
+            max_recs -= 1
+        elif with_tags:
+            with_tags = False
+        elif max_categories > 0:
+            max_categories -= 1
+        else:
+            return text, tokens # irreducible: the first rec and the scalar fields always stay
+
+def engineer_planner_context(sense_state: Union[SenseState, Dict[str, Any]], memory_snapshot: Dict[str, Any], verified_recs: List[Dict[str, Any]], risk_level: str,
+                             token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET) -> str:
     """
-    Engineers a detailed, structured, and FIXED-SIZE prompt for the LLM Planner.
+    Engineers a detailed, structured, and FIXED-SIZE prompt for the LLM Planner (see encode_planner_context).
     """
-    context = {
-        "SENSE_STATE": sense_state,
-        "MEMORY_SNAPSHOT": memory_snapshot,
-        "RISK_LEVEL": risk_level,
-        "VERIFIED_EARNING_RECS": verified_recs, # Now expects a list of dictionaries directly
-        "INSTRUCTION": "Generate a micro-plan. If RISK_LEVEL is HIGH, prioritize SURVIVAL and omit earning recs."
-    }
-
-    return json.dumps(context, indent=2)
+    return encode_planner_context(sense_state, memory_snapshot, verified_recs, risk_level, token_budget)[0]
@@ -0,0 +1,127 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pydantic import TypeAdapter
+from project.core.a2a_protocol import ExpenseEvent
+
+# Source ids are fixed; category ids are interned on first sight, per batch.
+SOURCES: Tuple[str, ...] = ("SMS", "Manual", "Scanner")
+SOURCE_IDS: Dict[str, int] = {name: i for i, name in enumerate(SOURCES)}
+
+_EXPENSE_LIST = TypeAdapter(List[ExpenseEvent])
+
+# (amounts bytes, source_ids bytes, local category ids bytes, category names) -- see ExpenseBatch.to_payload
+BatchPayload = Tuple[bytes, bytes, bytes, Tuple[str, ...]]
+
+
+class CategoryTable:
+    """Bidirectional category name <-> small int id mapping."""
+
+    __slots__ = ("names", "ids")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        category_id = self.ids.get(name)
+        if category_id is None:
+            category_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return category_id
+
+
+class ExpenseBatch:
+    """
+    Columnar, append-only store for one user's expenses: parallel int arrays of amounts, category ids and source ids.
+    Hot loops append plain values; pydantic ExpenseEvents are only materialized at API boundaries (to_events),
+    incrementally, so repeated snapshots never rebuild events they have already produced.
+    Each batch has its own CategoryTable unless one is passed in: categories are merchant-derived, so a
+    process-wide table would grow with every merchant any user ever paid.
+    """
+
+    __slots__ = ("amounts", "category_ids", "source_ids", "categories", "_events")
+
+    def __init__(self, categories: Optional[CategoryTable] = None):
+        self.amounts = array("q")
+        self.category_ids = array("I")
+        self.source_ids = array("B")
+        self.categories = categories if categories is not None else CategoryTable()
+        self._events: List[ExpenseEvent] = []
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def append(self, source: str, amount_cents: int, category: str):
+        self.amounts.append(amount_cents)
+        self.category_ids.append(self.categories.intern(category))
+        self.source_ids.append(SOURCE_IDS[source])
+
+    def extend_events(self, events: Iterable[ExpenseEvent]) -> "ExpenseBatch":
+        for event in events:
+            self.append(event.source, event.amount_cents, event.category)
+        return self
+
+    @classmethod
+    def from_events(cls, events: Iterable[ExpenseEvent]) -> "ExpenseBatch":
+        return cls().extend_events(events)
+
+    def to_payload(self) -> BatchPayload:
+        """
+        Compact, picklable form for crossing a process boundary: the raw column bytes, with category ids
+        renumbered against the names this batch uses (category ids are only meaningful within their table).
+        """
+        local: Dict[int, int] = {}
+        local_ids = array("I", [local.setdefault(category_id, len(local)) for category_id in self.category_ids])
+        names = self.categories.names
+        used = tuple(names[category_id] for category_id in local) # dicts keep insertion order = local id order
+        return self.amounts.tobytes(), self.source_ids.tobytes(), local_ids.tobytes(), used
+
+    @classmethod
+    def from_payload(cls, payload: BatchPayload, categories: Optional[CategoryTable] = None) -> "ExpenseBatch":
+        """
+        Rebuilds a batch from to_payload(). With its own (empty) table the payload's local ids are taken as-is;
+        a shared `categories` table gets them remapped through intern().
+        """
+        amounts, source_ids, local_ids, used = payload
+        batch = cls(categories)
+        batch.amounts.frombytes(amounts)
+        batch.source_ids.frombytes(source_ids)
+        table = batch.categories
+        if not table.names:
+            batch.category_ids.frombytes(local_ids)
+            table.names.extend(used)
+            table.ids.update((name, i) for i, name in enumerate(used))
+            return batch
+        ids = array("I")
+        ids.frombytes(local_ids)
+        to_table = [table.intern(name) for name in used]
+        batch.category_ids.extend([to_table[local_id] for local_id in ids])
+        return batch
+
+    def total_cents(self) -> int:
+        return sum(self.amounts)
+
+    def totals_by_category(self) -> Dict[str, int]:
+        totals: Dict[int, int] = {}
+        for category_id, amount in zip(self.category_ids, self.amounts):
+            totals[category_id] = totals.get(category_id, 0) + amount
+        names = self.categories.names
+        return {names[category_id]: amount for category_id, amount in totals.items()}
+
+    def to_dicts(self, start: int = 0) -> List[Dict[str, Any]]:
+        """Plain-dict rows (the model_dump() shape) without building any models."""
+        names = self.categories.names
+        return [
+            {"source": SOURCES[source_id], "amount_cents": amount, "category": names[category_id]}
+            for source_id, amount, category_id in zip(self.source_ids[start:], self.amounts[start:], self.category_ids[start:])
+        ]
+
+    def to_events(self) -> List[ExpenseEvent]:
+        """
+        Materializes ExpenseEvents; only rows appended since the last call are converted, in one pydantic-core
+        call (measured at about 0.75 us/row, against about 3.3 us/row for model_construct in a Python loop).
+        Returns a new list each call, but the event objects are cached and shared between calls: treat them as read-only.
+        """
+        if len(self._events) < len(self.amounts):
+            self._events.extend(_EXPENSE_LIST.validate_python(self.to_dicts(len(self._events))))
+        return list(self._events)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# How often (in disk writes) the SQLite tier is pruned back to max_disk_entries.
+_DISK_PRUNE_INTERVAL = 256
+
+def make_cache_key(model: str, contents: List[Any], response_schema: Optional[Dict[str, Any]]) -> str:
+    """Content address of an LLM request: sha256 over (model, system prompt, prompt, schema)."""
+    payload = json.dumps([model, contents, response_schema], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for raw LLM response text.
+    Tier 1 is an in-process LRU; tier 2 (optional) is a SQLite file shared across runs/processes.
+    Entries expire after ttl_s seconds; each tier is bounded by its own entry count.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 3600.0, sqlite_path: Optional[str] = None, max_disk_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._put_memory(key, row[0], row[1])
+                    self._counters["disk_hits"] += 1
+                    return row[0]
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, response_text: str):
+        now = time.time()
+        expires_at = now + self.ttl_s
+        with self._lock:
+            self._put_memory(key, response_text, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, response_text, expires_at, now),
+                )
+                self._disk_writes += 1
+                if self._disk_writes % _DISK_PRUNE_INTERVAL == 0:
+                    self._prune_disk(now)
+                self._db.commit()
+
+    def _put_memory(self, key: str, response_text: str, expires_at: float):
+        self._memory[key] = (expires_at, response_text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _prune_disk(self, now: float):
+        self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def cache_lookup(cache: Optional[LLMResponseCache], model: str, contents: List[Any], response_schema: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """Returns (key, cached_text). Both are None when caching is disabled; cached_text is None on a miss."""
+    if cache is None:
+        return None, None
+    key = make_cache_key(model, contents, response_schema)
+    return key, cache.get(key)
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from project.core.observability import log_event, increment_counter, WARNING
+
+# External Libraries for Gemini
+try:
+    from google import genai
+    from google.genai.errors import APIError
+except ImportError:
+    genai = None
+    APIError = Exception
+
+try:
+    import httpx
+    _TRANSPORT_ERRORS: tuple = (httpx.TransportError,)
+except ImportError:
+    httpx = None
+    _TRANSPORT_ERRORS = ()
+
+# Connections kept per process (sync and async pools each) to the Gemini endpoint.
+DEFAULT_POOL_SIZE = int(os.getenv("NIVRA_LLM_POOL_SIZE", "32"))
+# Retries after the first attempt for transient failures (429/5xx, dropped connections).
+DEFAULT_MAX_RETRIES = int(os.getenv("NIVRA_LLM_MAX_RETRIES", "3"))
+DEFAULT_BACKOFF_BASE_S = 0.25
+DEFAULT_BACKOFF_MAX_S = 4.0
+TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n sleeps uniform(0, min(max_s, base_s * 2**n))."""
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, base_s: float = DEFAULT_BACKOFF_BASE_S, max_s: float = DEFAULT_BACKOFF_MAX_S):
+        self.max_retries = max_retries
+        self.base_s = base_s
+        self.max_s = max_s
+
+    @staticmethod
+    def is_transient(error: BaseException) -> bool:
+        if isinstance(error, _TRANSPORT_ERRORS):
+            return True
+        return isinstance(error, APIError) and getattr(error, "code", None) in TRANSIENT_STATUS_CODES
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_s, self.base_s * (2 ** attempt)))
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_retries or not self.is_transient(error):
+            return False
+        increment_counter("llm_client.retry")
+        log_event("LLMClient", "TransientErrorRetry", {"attempt": attempt + 1, "error": type(error).__name__, "code": getattr(error, "code", None)}, WARNING)
+        return True
+
+    def call(self, fn: Callable[..., Any], **kwargs) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return fn(**kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            time.sleep(self.delay(attempt))
+            attempt += 1
+
+    async def call_async(self, fn: Callable[..., Any], **kwargs) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await fn(**kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(self.delay(attempt))
+            attempt += 1
+
+
+class _RetryingModels:
+    def __init__(self, models: Any, retry: RetryPolicy):
+        self._models = models
+        self._retry = retry
+
+    def generate_content(self, **kwargs) -> Any:
+        return self._retry.call(self._models.generate_content, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._models, name)
+
+class _AsyncRetryingModels(_RetryingModels):
+    async def generate_content(self, **kwargs) -> Any:
+        return await self._retry.call_async(self._models.generate_content, **kwargs)
+
+class _AsyncSurface:
+    def __init__(self, aio: Any, retry: RetryPolicy):
+        self._aio = aio
+        self.models = _AsyncRetryingModels(aio.models, retry)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._aio, name)
+
+
+class PooledClient:
+    """
+    A genai.Client whose generate_content calls (sync .models and async .aio.models) retry transient errors.
+    Everything else passes through to the wrapped client.
+    """
+
+    def __init__(self, client: Any, retry: RetryPolicy):
+        self.raw = client
+        self.models = _RetryingModels(client.models, retry)
+        aio = getattr(client, "aio", None)
+        self.aio = _AsyncSurface(aio, retry) if aio is not None else None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.raw, name)
+
+
+class LLMClientProvider:
+    """
+    Lazily creates one pooled Gemini client on first use and hands the same instance to every agent,
+    so connections (and their TLS sessions) are reused across requests instead of rebuilt per message.
+    get() returns None when no API key is configured or the SDK is missing; agents then use their simulation paths.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, pool_size: int = DEFAULT_POOL_SIZE,
+                 retry: Optional[RetryPolicy] = None, factory: Optional[Callable[..., Any]] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.retry = retry or RetryPolicy()
+        # factory(api_key=..., http_options=...) -> client; defaults to genai.Client.
+        self.factory = factory
+        self._client: Optional[PooledClient] = None
+        self._resolved = False
+        self._lock = threading.Lock()
+
+    def http_options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {}
+        if self.base_url:
+            options["base_url"] = self.base_url
+        if httpx is not None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            options["client_args"] = {"limits": limits}
+            options["async_client_args"] = {"limits": limits}
+        return options
+
+    def get(self) -> Optional[PooledClient]:
+        if self._resolved:
+            return self._client
+        with self._lock:
+            if not self._resolved:
+                self._client = self._create()
+                self._resolved = True
+        return self._client
+
+    def _create(self) -> Optional[PooledClient]:
+        api_key = self.api_key or os.getenv("GEMINI_API_KEY")
+        factory = self.factory or (genai.Client if genai is not None else None)
+        if not api_key or factory is None:
+            return None
+        try:
+            client = factory(api_key=api_key, http_options=self.http_options())
+        except Exception as e:
+            log_event("LLMClient", "ClientInitFailed", {"error": str(e)}, WARNING)
+            return None
+        log_event("LLMClient", "ClientCreated", {"base_url": self.base_url, "pool_size": self.pool_size})
+        return PooledClient(client, self.retry)
+
+    def close(self):
+        """Closes the pooled connections; the next get() creates a fresh client."""
+        with self._lock:
+            client, self._client, self._resolved = self._client, None, False
+        close = getattr(client.raw, "close", None) if client is not None else None
+        if close is not None:
+            close()
+
+
+SHARED_CLIENTS = LLMClientProvider(base_url=os.getenv("NIVRA_GEMINI_BASE_URL"))
+
+def get_shared_client() -> Optional[PooledClient]:
+    """The process-wide Gemini client shared by Planner and CoachAgent (None without an API key)."""
+    return SHARED_CLIENTS.get()
@@ -1,35 +1,326 @@
+import atexit
 import json
+import os
+import queue
+import sys
+import threading
 import time
-from typing import Dict, Any
-
-def log_event(agent: str, event_type: str, data: Dict[str, Any]):
-    """Logs agent events with timestamps."""
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = {
-        "timestamp": timestamp,
-        "agent": agent,
-        "event_type": event_type,
-        "data": data
-    }
-    print(f"[LOG] {json.dumps(log_entry)}")
+from bisect import bisect_left
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+
+if TYPE_CHECKING: # pipeline_context imports span() from here
+    from project.core.pipeline_context import PipelineContext
+
+# --- In-process counters (cache statistics, call counts) ---
+_COUNTERS: Dict[str, int] = defaultdict(int)
+_COUNTER_LOCK = threading.Lock()
+
+def increment_counter(name: str, amount: int = 1):
+    """Adds to a named process-wide counter, e.g. 'fingerprint_cache.hit'."""
+    with _COUNTER_LOCK:
+        _COUNTERS[name] += amount
+
+def get_counters(prefix: str = "") -> Dict[str, int]:
+    """Returns a snapshot of all counters whose name starts with prefix."""
+    with _COUNTER_LOCK:
+        return {name: value for name, value in _COUNTERS.items() if name.startswith(prefix)}
+
+# --- Latency histograms and spans ---
+# Log-spaced bucket upper bounds (seconds): 1us .. ~140s, 4 per doubling (quantiles within ~19%).
+HISTOGRAM_BOUNDS: List[float] = [1e-6 * 2 ** (i / 4) for i in range(109)]
+SNAPSHOT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and an increment, quantiles are read from the buckets."""
+
+    __slots__ = ("counts", "count", "total", "min", "max", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1) # last bucket: above the largest bound
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect_left(HISTOGRAM_BOUNDS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation, clamped to the observed min/max."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, q * self.count)
+            cumulative = 0
+            for index, bucket_count in enumerate(self.counts):
+                cumulative += bucket_count
+                if cumulative >= rank:
+                    bound = HISTOGRAM_BOUNDS[index] if index < len(HISTOGRAM_BOUNDS) else self.max
+                    return min(max(bound, self.min), self.max)
+            return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {"count": self.count, "sum_s": self.total, "min_s": self.min if self.count else None, "max_s": self.max if self.count else None}
+        for q in SNAPSHOT_QUANTILES:
+            summary[f"p{round(q * 100)}_s"] = self.quantile(q)
+        return summary
+
+_HISTOGRAMS: Dict[str, Histogram] = {}
+_HISTOGRAM_LOCK = threading.Lock()
+
+def get_histogram(name: str) -> Histogram:
+    histogram = _HISTOGRAMS.get(name)
+    if histogram is None:
+        with _HISTOGRAM_LOCK:
+            histogram = _HISTOGRAMS.setdefault(name, Histogram())
+    return histogram
+
+def observe(name: str, seconds: float):
+    get_histogram(name).observe(seconds)
+
+
+class span:
+    """
+    Times a block into the named histogram, e.g. `with span("llm.planner"):`; works around awaits too.
+    If timings is given, the elapsed milliseconds are also stored there under key (default: name).
+    """
+
+    __slots__ = ("name", "timings", "key", "start")
+
+    def __init__(self, name: str, timings: Optional[Dict[str, float]] = None, key: Optional[str] = None):
+        self.name = name
+        self.timings = timings
+        self.key = key or name
+
+    def __enter__(self) -> "span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        get_histogram(self.name).observe(elapsed)
+        if self.timings is not None:
+            self.timings[self.key] = round(elapsed * 1000, 3)
+        return False
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """JSON-ready snapshot: latency summaries (count, sum, min, max, p50/p95/p99 in seconds) and counters."""
+    with _HISTOGRAM_LOCK:
+        histograms = dict(_HISTOGRAMS)
+    return {"histograms": {name: histogram.summary() for name, histogram in sorted(histograms.items())}, "counters": get_counters()}
+
+def _metric_name(name: str) -> str:
+    return "nivra_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+
+def render_prometheus() -> str:
+    """Prometheus text exposition of metrics_snapshot(): one summary per histogram, one counter per counter."""
+    snapshot = metrics_snapshot()
+    lines: List[str] = []
+    for name, summary in snapshot["histograms"].items():
+        metric = _metric_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for q in SNAPSHOT_QUANTILES:
+            value = summary[f"p{round(q * 100)}_s"]
+            if value is not None:
+                lines.append(f'{metric}{{quantile="{q}"}} {value:.9g}')
+        lines.append(f"{metric}_sum {summary['sum_s']:.9g}")
+        lines.append(f"{metric}_count {summary['count']}")
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Structured logging ---
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+# High-volume events kept at a fraction of their rate (1 in round(1/rate)); override with NIVRA_LOG_SAMPLE="Event=rate,...".
+DEFAULT_SAMPLE_RATES = {"StateGenerated": 0.1}
+# Records written per flush by the background writer.
+LOG_BATCH_SIZE = 512
+
+def _parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for item in (spec or "").split(","):
+        if "=" in item:
+            event_type, rate = item.split("=", 1)
+            rates[event_type.strip()] = float(rate)
+    return rates
+
+
+class StructuredLogger:
+    """
+    Leveled, sampled, non-blocking event logger.
+    log() only checks the level and sampling, then enqueues the raw record; a background writer thread does the
+    timestamp formatting and JSON encoding, and writes whole batches to stdout ("[LOG] {...}") and/or a JSONL file.
+    Records below min_level cost one integer comparison and build nothing.
+    """
+
+    def __init__(self, min_level: int = INFO, path: Optional[str] = None, stdout: bool = True, sample_rates: Optional[Dict[str, float]] = None):
+        self.min_level = min_level
+        self.path = path
+        self.stdout = stdout
+        self.sample_every = {event_type: max(1, round(1 / rate)) if rate > 0 else 0 for event_type, rate in (sample_rates or DEFAULT_SAMPLE_RATES).items()}
+        self.dropped = 0 # sampled out
+        self.unformattable = 0 # payloads that could not be JSON-encoded (logged with an error note instead)
+        self._seen: Dict[str, int] = defaultdict(int)
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "StructuredLogger":
+        return cls(min_level=LEVELS.get(os.getenv("NIVRA_LOG_LEVEL", "INFO").upper(), INFO), path=os.getenv("NIVRA_LOG_FILE"),
+                   stdout=os.getenv("NIVRA_LOG_STDOUT", "1") != "0", sample_rates=_parse_sample_rates(os.getenv("NIVRA_LOG_SAMPLE")))
+
+    def log(self, agent: str, event_type: str, data: Dict[str, Any], level: int = INFO):
+        if level < self.min_level:
+            return
+        every = self.sample_every.get(event_type)
+        if every is not None:
+            seen = self._seen[event_type]
+            self._seen[event_type] = seen + 1
+            if every == 0 or seen % every:
+                self.dropped += 1
+                return
+        if self._writer_pid != os.getpid() or not self._writer.is_alive():
+            self._start_writer()
+        self._queue.put((time.time(), level, agent, event_type, data))
+
+    def _start_writer(self):
+        with self._start_lock:
+            if self._writer_pid == os.getpid():
+                if self._writer.is_alive():
+                    return
+                # The writer died: a new one drains the records (and flush waiters) still queued for it.
+            elif self._writer is not None:
+                self._queue = queue.SimpleQueue() # forked child: the parent's writer thread does not exist here
+            self._writer = threading.Thread(target=self._write_loop, args=(self._queue,), name="nivra-log-writer", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def _format(self, record: Tuple[float, int, str, str, Dict[str, Any]]) -> str:
+        created, level, agent, event_type, data = record
+        entry = {"timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)), "level": LEVEL_NAMES.get(level, str(level)),
+                 "agent": agent, "event_type": event_type, "data": data}
+        try:
+            return json.dumps(entry, default=str)
+        except Exception as e: # e.g. a circular payload: keep the event, replace its data
+            self.unformattable += 1
+            entry["data"] = {"log_error": f"{type(e).__name__}: {e}"}
+            return json.dumps(entry)
+
+    def _write_loop(self, records: "queue.SimpleQueue[Any]"):
+        sink = open(self.path, "a", encoding="utf-8") if self.path else None
+        try:
+            while True:
+                batch = [records.get()]
+                while len(batch) < LOG_BATCH_SIZE:
+                    try:
+                        batch.append(records.get_nowait())
+                    except queue.Empty:
+                        break
+                lines, waiters, stop = [], [], False
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is None:
+                        stop = True
+                    else:
+                        lines.append(self._format(item))
+                try:
+                    if lines and self.stdout:
+                        sys.stdout.write("".join(f"[LOG] {line}\n" for line in lines))
+                        sys.stdout.flush()
+                    if lines and sink is not None:
+                        sink.write("\n".join(lines) + "\n")
+                        sink.flush()
+                except Exception:
+                    pass # logging must never take the pipeline down
+                finally:
+                    for waiter in waiters:
+                        waiter.set()
+                if stop:
+                    return
+        finally:
+            if sink is not None:
+                sink.close()
+
+    def flush(self, timeout_s: float = 5.0) -> bool:
+        """Blocks until every record logged so far has been written."""
+        if self._writer_pid != os.getpid():
+            return True
+        if not self._writer.is_alive():
+            self._start_writer()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout_s)
+
+    def close(self, timeout_s: float = 5.0):
+        if self._writer_pid == os.getpid() and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout_s)
+        self._writer_pid = None
+
+
+LOGGER = StructuredLogger.from_env()
+atexit.register(lambda: LOGGER.close())
+
+def configure_logging(min_level: int = INFO, path: Optional[str] = None, stdout: bool = True, sample_rates: Optional[Dict[str, float]] = None) -> StructuredLogger:
+    """Replaces the process logger (flushing and stopping the old writer)."""
+    global LOGGER
+    previous, LOGGER = LOGGER, StructuredLogger(min_level, path, stdout, sample_rates)
+    previous.close()
+    return LOGGER
+
+def log_enabled(level: int) -> bool:
+    """For call sites whose payload is expensive to build: skip building it when the level is off."""
+    return level >= LOGGER.min_level
+
+def flush_logs(timeout_s: float = 5.0) -> bool:
+    return LOGGER.flush(timeout_s)
+
+def log_event(agent: str, event_type: str, data: Dict[str, Any], level: int = INFO):
+    """Logs agent events with timestamps (non-blocking; see StructuredLogger)."""
+    LOGGER.log(agent, event_type, data, level)
 
-def generate_trace(context: Dict[str, Any], plan_output: Dict[str, Any], coach_advice: Dict[str, Any]) -> Dict[str, Any]:
+def generate_trace(context: "PipelineContext", plan_output: Dict[str, Any], coach_advice: Dict[str, Any]) -> Dict[str, Any]:
     """Generates the final human-readable reasoning trace."""
 
-    verification_status = context.get("verification_status", "N/A")
-    verified_recs_count = len(context.get("verified_recs", []))
+    verification_status = context.verification_status
+    verified_recs_count = len(context.verified_recs)
     detailed_verification_summary = f"Status: {verification_status}, Recommended Items: {verified_recs_count}"
 
     trace = {
         "priority_level": plan_output.get("priority_level"),
-        "risk_report": context.get("risk_level"),
-        "memory_snapshot": context.get("memory_snapshot"), # Removed .model_dump() as it's already a dict
+        "risk_report": context.risk_level,
+        "memory_snapshot": context.dump("memory_snapshot"),
+        "memory_epoch": context.memory_epoch,
         "input_hygiene": {
-            "parser_confidence": context["sense_state"]["parser_confidence_score"],
-            "total_expenses_recorded": len(context["sense_state"]["all_today_expenses"])
+            # Read from the model: no need to serialize the whole sense state (every expense) for two numbers.
+            "parser_confidence": context.sense_state.parser_confidence_score,
+            "total_expenses_recorded": len(context.sense_state.all_today_expenses)
         },
         "verification_summary": detailed_verification_summary,
         "planner_reasoning": plan_output.get("reasoning_trace"),
-        "coach_summary": coach_advice
+        "coach_summary": coach_advice,
+        "llm_cache": context.llm_cache,
+        # Shared with the context, so the trace stage's own timing lands here once it finishes.
+        "stage_timings_ms": context.stage_timings
     }
     return trace
@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, Optional
+from project.core.a2a_protocol import SenseState, BehaviorFingerprint, PlannerRecommendation, PlannerOutput, CoachAdvice
+from project.core.observability import span
+
+
+class PipelineContext:
+    """
+    Typed state carried through the agent pipeline (sense -> memory -> risk -> verifier -> planner -> coach -> trace).
+    Stages read and write the models directly; each model is serialized at most once, lazily, via dump().
+    Item access (context["sense_state"]) is kept for code written against the old context dict and returns the dump.
+    """
+
+    MODEL_FIELDS = ("sense_state", "memory_snapshot", "plan_output", "coach_advice")
+
+    def __init__(self, user_id: str):
+        self._dumps: Dict[str, Dict[str, Any]] = {}
+        self.user_id = user_id
+        self.sense_state: Optional[SenseState] = None
+        self.memory_snapshot: Optional[BehaviorFingerprint] = None
+        self.memory_epoch: Optional[int] = None
+        self.risk_level: Optional[str] = None
+        self.verified_recs: List[PlannerRecommendation] = []
+        self.verification_status: str = "N/A"
+        self.plan_output: Optional[PlannerOutput] = None
+        self.coach_advice: Optional[CoachAdvice] = None
+        self.llm_cache: Optional[Dict[str, Any]] = None
+        self.stage_timings: Dict[str, float] = {} # stage -> milliseconds
+
+    def stage(self, name: str) -> span:
+        """Times one pipeline stage into the 'stage.<name>' histogram and this request's stage_timings."""
+        return span(f"stage.{name}", self.stage_timings, name)
+
+    def __setattr__(self, name: str, value: Any):
+        # Replacing a model drops its cached dump so dump() never returns stale data.
+        if name in PipelineContext.MODEL_FIELDS:
+            self._dumps.pop(name, None)
+        object.__setattr__(self, name, value)
+
+    def dump(self, name: str) -> Optional[Dict[str, Any]]:
+        """model_dump() of one pipeline model, computed on first use and shared afterwards."""
+        cached = self._dumps.get(name)
+        if cached is None:
+            model = getattr(self, name)
+            if model is None:
+                return None
+            cached = self._dumps[name] = model.model_dump()
+        return cached
+
+    def update(self, values: Dict[str, Any]):
+        for key, value in values.items():
+            setattr(self, key, value)
+
+    def __getitem__(self, key: str) -> Any:
+        if key.startswith("_") or not hasattr(self, key):
+            raise KeyError(key)
+        return self.dump(key) if key in PipelineContext.MODEL_FIELDS else getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return not key.startswith("_") and hasattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from project.core.observability import increment_counter
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution; every caller gets its result (or exception).
+    Only in-flight calls are shared: once a call finishes, the next call with that key runs again (unlike a cache).
+    do() coalesces across threads, do_async() across tasks of the same event loop.
+    Counters: '<name>.issued' (executions) and '<name>.coalesced' (callers that joined one already in flight).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.issued = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[Tuple[int, str], "asyncio.Future[Any]"] = {}
+
+    def _count(self, leader: bool):
+        if leader:
+            self.issued += 1
+            increment_counter(f"{self.name}.issued")
+        else:
+            self.coalesced += 1
+            increment_counter(f"{self.name}.coalesced")
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._count(leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            leader = task is None
+            if leader:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._forget(task_key, done))
+            self._count(leader)
+        # Shielded: one caller being cancelled (e.g. its own timeout) must not cancel the shared call.
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key: Tuple[int, str], task: "asyncio.Future[Any]"):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        if not task.cancelled():
+            task.exception() # retrieved here, so callers that all gave up do not leave an unretrieved-exception warning
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"issued": self.issued, "coalesced": self.coalesced, "in_flight": len(self._calls) + len(self._tasks)}
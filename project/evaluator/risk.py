@@ -1,20 +1,78 @@
+from typing import Any, Dict, Sequence
+import numpy as np
 from project.core.a2a_protocol import SenseState
-from project.core.observability import log_event
+from project.core.observability import log_event, increment_counter
+
+# T1 triggers: shortfall at or above this share of the balance, or parser confidence below the floor.
+SHORTFALL_BALANCE_RATIO = 0.5
+MIN_PARSER_CONFIDENCE = 0.5
+
+# Risk-level codes returned by run_risk_analysis_batch; RISK_LEVELS[code] is the scalar function's string.
+RISK_LOW, RISK_MEDIUM, RISK_HIGH = 0, 1, 2
+RISK_LEVELS = ("LOW", "MEDIUM", "HIGH")
+
+_SHORTFALL_REASON = "Projected Shortfall (T1)"
+_CONFIDENCE_REASON = "Low Parser Confidence (T1)"
 
 def run_risk_analysis(state: SenseState) -> str:
     """Runs risk analysis based on financial status and data confidence."""
 
     # CRITICAL TRIGGER 1: Financial Ruin Risk (Shortfall exceeds 50% of remaining balance)
-    if state.shortfall_projection_7d_cents >= (state.balance_est_cents * 0.5):
-        log_event("RiskEvaluator", "Escalate", {"reason": "Projected Shortfall (T1)"})
+    if state.shortfall_projection_7d_cents >= (state.balance_est_cents * SHORTFALL_BALANCE_RATIO):
+        log_event("RiskEvaluator", "Escalate", {"reason": _SHORTFALL_REASON})
         return "HIGH"
 
     # CRITICAL TRIGGER 2: Data Fragility/GIGO Risk (Must be below 0.5)
-    if state.parser_confidence_score < 0.5:
-        log_event("RiskEvaluator", "Escalate", {"reason": "Low Parser Confidence (T1)"})
+    if state.parser_confidence_score < MIN_PARSER_CONFIDENCE:
+        log_event("RiskEvaluator", "Escalate", {"reason": _CONFIDENCE_REASON})
         return "HIGH"
 
     if state.shortfall_projection_7d_cents > 0:
         return "MEDIUM"
 
     return "LOW"
+
+def run_risk_analysis_batch(balance_cents: Any, shortfall_cents: Any, parser_confidence: Any, log: bool = True,
+                            shortfall_balance_ratio: float = SHORTFALL_BALANCE_RATIO, min_parser_confidence: float = MIN_PARSER_CONFIDENCE) -> np.ndarray:
+    """
+    Vectorized run_risk_analysis over columnar inputs (array-likes of equal length).
+    Returns an int8 array of risk codes (RISK_LEVELS[code] matches the scalar result for every row).
+    The trigger thresholds can be overridden for what-if runs (see evaluator/simulation.py).
+    Escalations are not logged per row: one EscalateBatch event carries the count per trigger.
+    Amounts are compared as float64, exact for cents below 2**53.
+    """
+    balance = np.asarray(balance_cents, dtype=np.float64)
+    shortfall = np.asarray(shortfall_cents, dtype=np.float64)
+    confidence = np.asarray(parser_confidence, dtype=np.float64)
+
+    shortfall_trigger = shortfall >= balance * shortfall_balance_ratio
+    # Trigger 2 only counts where trigger 1 did not already escalate (same precedence as the scalar checks).
+    confidence_trigger = (confidence < min_parser_confidence) & ~shortfall_trigger
+
+    codes = (shortfall > 0).astype(np.int8) # RISK_MEDIUM where there is any shortfall, else RISK_LOW
+    codes[shortfall_trigger | confidence_trigger] = RISK_HIGH
+
+    if log:
+        shortfall_count, confidence_count = int(shortfall_trigger.sum()), int(confidence_trigger.sum())
+        increment_counter("risk.escalate.shortfall", shortfall_count)
+        increment_counter("risk.escalate.confidence", confidence_count)
+        if shortfall_count or confidence_count:
+            log_event("RiskEvaluator", "EscalateBatch", {"states": len(codes), _SHORTFALL_REASON: shortfall_count, _CONFIDENCE_REASON: confidence_count})
+    return codes
+
+def run_risk_analysis_states(states: Sequence[SenseState], log: bool = True) -> np.ndarray:
+    """run_risk_analysis_batch over SenseState models (columns are gathered once)."""
+    return run_risk_analysis_batch(
+        np.fromiter((state.balance_est_cents for state in states), dtype=np.float64, count=len(states)),
+        np.fromiter((state.shortfall_projection_7d_cents for state in states), dtype=np.float64, count=len(states)),
+        np.fromiter((state.parser_confidence_score for state in states), dtype=np.float64, count=len(states)),
+        log=log,
+    )
+
+def risk_level_names(codes: np.ndarray) -> np.ndarray:
+    """Risk-level strings for an array of codes."""
+    return np.asarray(RISK_LEVELS)[codes]
+
+def risk_level_counts(codes: np.ndarray) -> Dict[str, int]:
+    counts = np.bincount(codes, minlength=len(RISK_LEVELS))
+    return {level: int(count) for level, count in zip(RISK_LEVELS, counts)}
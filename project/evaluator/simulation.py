@@ -0,0 +1,165 @@
+"""
+What-if simulation over the deterministic chain: risk -> verifier -> rule-based planner.
+
+Sense and memory (the stages no variant changes) run once per user into a Population of columns. Each
+Scenario then re-evaluates only what it varies: risk is recomputed only for new trigger thresholds,
+verified recs and persona selection are memoized per (risk level, persona), and priorities and spend
+limits are array expressions over the whole population.
+"""
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+from project.agents.planner import PlannerPolicy, PERSONA_INDEX
+from project.agents.worker import SenseWorker
+from project.core.a2a_protocol import SenseState, BehaviorFingerprint
+from project.evaluator.risk import run_risk_analysis_batch, risk_level_counts, RISK_LEVELS, RISK_HIGH, SHORTFALL_BALANCE_RATIO, MIN_PARSER_CONFIDENCE
+from project.evaluator.verifier import GigCatalog, GIG_CATALOG
+from project.memory.session_memory import SessionMemory
+from project.memory.storage import MemoryBackend
+from project.tools.persona_index import PersonaIndex
+
+# Priority codes of a simulated plan; PRIORITY_LEVELS[code] is the planner's priority_level.
+PRIORITY_SURVIVAL, PRIORITY_DISCIPLINE, PRIORITY_GROWTH = 0, 1, 2
+PRIORITY_LEVELS = ("SURVIVAL", "DISCIPLINE", "GROWTH")
+# Spend-limit quantiles reported per scenario.
+SPEND_LIMIT_QUANTILES = (0.1, 0.5, 0.9)
+# Earning suggestions listed per scenario (most frequent first).
+TOP_SUGGESTIONS = 5
+
+# (user_id, sms_input, manual_entries, ocr_text), as in main_agent.run_agent_batch
+SimulationRecord = Tuple[str, str, Optional[List[Dict[str, Any]]], str]
+
+
+class Scenario(BaseModel):
+    """One parameter variant: the planner policy plus the T1 risk trigger thresholds."""
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    policy: PlannerPolicy = PlannerPolicy(mode="rules")
+    shortfall_balance_ratio: float = SHORTFALL_BALANCE_RATIO
+    min_parser_confidence: float = MIN_PARSER_CONFIDENCE
+
+
+class Population:
+    """Per-user outputs of the shared stages (sense, memory), stored as columns."""
+
+    def __init__(self, user_ids: Sequence[str], states: Sequence[SenseState], fingerprints: Sequence[BehaviorFingerprint]):
+        self.user_ids = list(user_ids)
+        n = len(self.user_ids)
+        self.balance_cents = np.fromiter((state.balance_est_cents for state in states), dtype=np.int64, count=n)
+        self.shortfall_cents = np.fromiter((state.shortfall_projection_7d_cents for state in states), dtype=np.int64, count=n)
+        self.parser_confidence = np.fromiter((state.parser_confidence_score for state in states), dtype=np.float64, count=n)
+        self.discipline_score = np.fromiter((fingerprint.discipline_score for fingerprint in fingerprints), dtype=np.float64, count=n)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @classmethod
+    def from_records(cls, records: Iterable[SimulationRecord], worker: Optional[SenseWorker] = None, memory_backend: Optional[MemoryBackend] = None) -> "Population":
+        """
+        Runs sense and memory once per record, with the same inputs MainAgent uses. Sensing goes through
+        preview_sense, so a what-if run neither records history nor moves the users' spend models.
+        """
+        worker = worker if worker is not None else SenseWorker()
+        user_ids, states, fingerprints = [], [], []
+        for user_id, sms_input, manual_entries, ocr_text in records:
+            user_ids.append(user_id)
+            states.append(worker.preview_sense(sms_input or "", manual_entries or [], ocr_text or "", user_id))
+            fingerprints.append(SessionMemory(user_id, backend=memory_backend, transactions=worker.history).compute_and_get_fingerprint())
+        return cls(user_ids, states, fingerprints)
+
+
+class ScenarioOutcome:
+    """Simulated plans for every user of a population under one scenario (columns, in population order)."""
+
+    def __init__(self, scenario: Scenario, risk_codes: np.ndarray, priority_codes: np.ndarray, spend_limit_cents: np.ndarray, suggestions: List[Optional[str]]):
+        self.scenario = scenario
+        self.risk_codes = risk_codes
+        self.priority_codes = priority_codes
+        self.spend_limit_cents = spend_limit_cents
+        self.suggestions = suggestions
+
+    def priority_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.priority_codes, minlength=len(PRIORITY_LEVELS))
+        return {level: int(count) for level, count in zip(PRIORITY_LEVELS, counts)}
+
+    def transitions(self, baseline: "ScenarioOutcome") -> Dict[str, int]:
+        """Users whose priority differs from the baseline, as {"GROWTH->DISCIPLINE": count}."""
+        changed = self.priority_codes != baseline.priority_codes
+        pairs = np.bincount(baseline.priority_codes[changed] * len(PRIORITY_LEVELS) + self.priority_codes[changed], minlength=len(PRIORITY_LEVELS) ** 2)
+        return {f"{PRIORITY_LEVELS[i // len(PRIORITY_LEVELS)]}->{PRIORITY_LEVELS[i % len(PRIORITY_LEVELS)]}": int(count) for i, count in enumerate(pairs) if count}
+
+    def summary(self) -> Dict[str, Any]:
+        limits = self.spend_limit_cents
+        quantiles = np.quantile(limits, SPEND_LIMIT_QUANTILES).tolist() if len(limits) else [0] * len(SPEND_LIMIT_QUANTILES)
+        return {
+            "risk_levels": risk_level_counts(self.risk_codes),
+            "priorities": self.priority_counts(),
+            "spend_limit_cents": {"total": int(limits.sum()), "mean": float(limits.mean()) if len(limits) else 0.0,
+                                  **{f"p{round(q * 100)}": int(value) for q, value in zip(SPEND_LIMIT_QUANTILES, quantiles)}},
+            "earning_suggestions": dict(Counter(name for name in self.suggestions if name is not None).most_common(TOP_SUGGESTIONS)),
+            "no_suggestion": sum(name is None for name in self.suggestions),
+        }
+
+
+class ScenarioSimulator:
+    """
+    Evaluates many scenarios over one population. Intermediate results are memoized across scenarios:
+    risk codes per threshold pair, and the best verified gig per (risk level, user).
+    """
+
+    def __init__(self, population: Population, catalog: Optional[GigCatalog] = None, persona_index: Optional[PersonaIndex] = None):
+        self.population = population
+        self.catalog = catalog if catalog is not None else GIG_CATALOG
+        self.persona_index = persona_index or PERSONA_INDEX
+        self._risk_codes: Dict[Tuple[float, float], np.ndarray] = {}
+        self._best_gig: Dict[int, List[Optional[str]]] = {}
+
+    def _risk(self, scenario: Scenario) -> np.ndarray:
+        key = (scenario.shortfall_balance_ratio, scenario.min_parser_confidence)
+        codes = self._risk_codes.get(key)
+        if codes is None:
+            population = self.population
+            codes = self._risk_codes[key] = run_risk_analysis_batch(population.balance_cents, population.shortfall_cents, population.parser_confidence, log=False,
+                                                                   shortfall_balance_ratio=key[0], min_parser_confidence=key[1])
+        return codes
+
+    def _best_gigs(self, risk_code: int) -> List[Optional[str]]:
+        """Name of the planner's earning suggestion for every user at one risk level (None if no rec)."""
+        names = self._best_gig.get(risk_code)
+        if names is None:
+            recs = self.catalog.verify(RISK_LEVELS[risk_code])
+            names = self._best_gig[risk_code] = []
+            for user_id in self.population.user_ids:
+                selected = self.persona_index.select(user_id, recs)
+                names.append(selected[0].name if selected else None)
+        return names
+
+    def run(self, scenario: Scenario) -> ScenarioOutcome:
+        policy, population = scenario.policy, self.population
+        risk_codes = self._risk(scenario)
+        survival = risk_codes == RISK_HIGH
+        priority_codes = np.where(survival, PRIORITY_SURVIVAL,
+                                  np.where(population.discipline_score < policy.discipline_threshold, PRIORITY_DISCIPLINE, PRIORITY_GROWTH)).astype(np.int8)
+        spend_limit = np.where(survival, population.balance_cents // policy.survival_limit_divisor, population.balance_cents // policy.spend_limit_divisor)
+
+        # SURVIVAL plans carry no earning suggestion; everyone else gets the first persona-filtered rec for their risk level.
+        by_level = {int(code): self._best_gigs(int(code)) for code in np.unique(risk_codes[~survival])}
+        suggestions = [None if is_survival else by_level[code][i] for i, (code, is_survival) in enumerate(zip(risk_codes.tolist(), survival.tolist()))]
+        return ScenarioOutcome(scenario, risk_codes, priority_codes, spend_limit, suggestions)
+
+    def compare(self, scenarios: Sequence[Scenario]) -> Dict[str, Any]:
+        """Aggregate report for all scenarios; transitions are relative to the first (baseline) scenario."""
+        outcomes = [self.run(scenario) for scenario in scenarios]
+        report: Dict[str, Any] = {"users": len(self.population), "baseline": scenarios[0].name if scenarios else None, "scenarios": {}}
+        for outcome in outcomes:
+            summary = outcome.summary()
+            summary["transitions"] = outcome.transitions(outcomes[0])
+            report["scenarios"][outcome.scenario.name] = summary
+        return report
+
+
+def simulate_scenarios(records: Iterable[SimulationRecord], scenarios: Sequence[Scenario], worker: Optional[SenseWorker] = None, memory_backend: Optional[MemoryBackend] = None) -> Dict[str, Any]:
+    """One-call what-if run: builds the population once, then reports every scenario against the first."""
+    return ScenarioSimulator(Population.from_records(records, worker, memory_backend)).compare(scenarios)
@@ -1,6 +1,12 @@
+import itertools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
 from project.core.a2a_protocol import SenseState, PlannerRecommendation
 from project.core.observability import log_event
-from typing import Dict, Any, List # Added missing import for Dict and Any
+from typing import Dict, Any, List, Optional, Tuple # Added missing import for Dict and Any
 
 # --- EXPANDED MOCK GIGS FOR PERSONA RELEVANCE ---
 MOCK_VERIFIED_GIGS = [
@@ -32,21 +38,116 @@ MOCK_VERIFIED_GIGS = [
 ]
 
 
-def run_deterministic_verifier(risk_level: str) -> Dict[str, Any]:
+# Gigs at or above this risk score are scams/unsafe and never reach the planner (T2).
+SAFE_RISK_THRESHOLD = 0.5
+# Highest gig risk score approved at each T1 risk level.
+RISK_LEVEL_CEILINGS = {"LOW": SAFE_RISK_THRESHOLD, "MEDIUM": SAFE_RISK_THRESHOLD, "HIGH": 0.2}
+# Minimum seconds between catalog file change checks on the request path.
+RELOAD_CHECK_INTERVAL_S = 5.0
+
+
+class CatalogSnapshot:
     """
-    T2 Verifier: Filters planner recommendations based on T1 Risk level and fixed rules.
+    Immutable, precomputed view of one catalog version.
+    Everything handed out (tuples of frozen PlannerRecommendations) is shared across requests.
+    """
+
+    __slots__ = ("version", "safe_recs", "safe_risk_scores", "by_tag", "by_name", "_by_risk_level")
+
+    def __init__(self, gigs: List[Dict[str, Any]], version: int):
+        self.version = version
+        safe = [PlannerRecommendation(**gig) for gig in gigs if gig["risk_score"] < SAFE_RISK_THRESHOLD]
+        # Stable sort: equal-risk gigs keep catalog order.
+        self.safe_recs: Tuple[PlannerRecommendation, ...] = tuple(sorted(safe, key=lambda rec: rec.risk_score))
+        self.safe_risk_scores = [rec.risk_score for rec in self.safe_recs]
+
+        by_tag: Dict[str, List[PlannerRecommendation]] = {}
+        for rec in self.safe_recs:
+            for tag in rec.relevance_tags:
+                by_tag.setdefault(tag, []).append(rec)
+        # Inverted index: relevance tag -> risk-sorted gigs
+        self.by_tag: Dict[str, Tuple[PlannerRecommendation, ...]] = {tag: tuple(recs) for tag, recs in by_tag.items()}
+        self.by_name: Dict[str, PlannerRecommendation] = {rec.name: rec for rec in self.safe_recs}
+        self._by_risk_level: Dict[str, Tuple[PlannerRecommendation, ...]] = {}
+
+    def recs_for_risk_level(self, risk_level: str) -> Tuple[PlannerRecommendation, ...]:
+        recs = self._by_risk_level.get(risk_level)
+        if recs is None:
+            ceiling = RISK_LEVEL_CEILINGS.get(risk_level, SAFE_RISK_THRESHOLD)
+            recs = self._by_risk_level[risk_level] = self.safe_recs[:bisect_left(self.safe_risk_scores, ceiling)]
+        return recs
+
+
+def _read_catalog_file(path: str) -> List[Dict[str, Any]]:
+    """Catalog files are a JSON list of gigs, or JSON Lines with one gig per line."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class GigCatalog:
     """
+    Gig catalog loaded once and verified ahead of time. Requests read the current CatalogSnapshot;
+    reloads build a new snapshot off to the side and swap it in with a single reference assignment,
+    so in-flight requests keep using the version they started with.
+    """
+
+    def __init__(self, gigs: Optional[List[Dict[str, Any]]] = None, path: Optional[str] = None):
+        self.path = path
+        self._reload_lock = threading.Lock()
+        self._versions = itertools.count(1)
+        self._file_mtime = os.path.getmtime(path) if path else None
+        self._last_check = time.monotonic()
+        gigs = _read_catalog_file(path) if path else (gigs if gigs is not None else MOCK_VERIFIED_GIGS)
+        self.snapshot = CatalogSnapshot(gigs, next(self._versions))
+
+    @classmethod
+    def from_file(cls, path: str) -> "GigCatalog":
+        return cls(path=path)
+
+    def reload(self, gigs: Optional[List[Dict[str, Any]]] = None) -> CatalogSnapshot:
+        """Rebuilds the snapshot from gigs (or the backing file) and publishes it atomically."""
+        with self._reload_lock:
+            if gigs is None and self.path:
+                self._file_mtime = os.path.getmtime(self.path)
+                gigs = _read_catalog_file(self.path)
+            snapshot = CatalogSnapshot(gigs if gigs is not None else MOCK_VERIFIED_GIGS, next(self._versions))
+            self.snapshot = snapshot
+        log_event("Verifier", "CatalogReloaded", {"version": snapshot.version, "safe_gigs": len(snapshot.safe_recs)})
+        return snapshot
+
+    def maybe_reload(self):
+        """Cheap request-path hook: if the backing file changed, rebuild it on a background thread."""
+        if not self.path or time.monotonic() - self._last_check < RELOAD_CHECK_INTERVAL_S:
+            return
+        self._last_check = time.monotonic()
+        try:
+            changed = os.path.getmtime(self.path) != self._file_mtime
+        except OSError:
+            return
+        if changed and not self._reload_lock.locked():
+            threading.Thread(target=self.reload, name="gig-catalog-reload", daemon=True).start()
+
+    def verify(self, risk_level: str) -> Tuple[PlannerRecommendation, ...]:
+        self.maybe_reload()
+        return self.snapshot.recs_for_risk_level(risk_level)
 
-    # 1. Filter out high-risk (scam) gigs
-    safe_gigs = [
-        gig for gig in MOCK_VERIFIED_GIGS
-        if gig["risk_score"] < 0.5
-    ]
 
-    # 2. Convert to Pydantic objects for consistency
-    verified_recs = [
-        PlannerRecommendation(**gig) for gig in safe_gigs
-    ]
+_catalog_path = os.getenv("NIVRA_GIG_CATALOG")
+GIG_CATALOG = GigCatalog.from_file(_catalog_path) if _catalog_path else GigCatalog()
+
+
+def run_deterministic_verifier(risk_level: str, catalog: Optional[GigCatalog] = None) -> Dict[str, Any]:
+    """
+    T2 Verifier: Filters planner recommendations based on T1 Risk level and fixed rules.
+    The scam filter, validation and risk sorting happen once per catalog version; this is a lookup.
+    """
+    catalog = catalog if catalog is not None else GIG_CATALOG
+
+    # Safe gigs at or below the risk level's ceiling (shared, immutable, sorted by risk_score)
+    verified_recs = catalog.verify(risk_level)
 
     log_event("Verifier", "VerifiedRecs", {"count": len(verified_recs)})
 
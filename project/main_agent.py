@@ -1,5 +1,7 @@
+import asyncio
+import itertools
 import sys, os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
 # Crucial Path Fix for imports within Colab structure
 # This adds the current working directory to the path, ensuring 'project.agents' is found.
 sys.path.insert(0, os.getcwd())
@@ -10,57 +12,103 @@ from project.evaluator.verifier import run_deterministic_verifier
 from project.agents.planner import Planner
 from project.agents.coach import CoachAgent
 from project.memory.session_memory import SessionMemory
-from project.core.observability import log_event, generate_trace
+from project.memory.storage import MemoryBackend
+from project.core.observability import log_event, generate_trace, ERROR
+from project.core.pipeline_context import PipelineContext
+from project.core.a2a_protocol import SenseState
+
+# Upper bound on users whose plans are in flight at once on the async path.
+DEFAULT_MAX_CONCURRENCY = 200
+
+# (user_id, sms_input, manual_entries, ocr_text) -- one row of a bulk run
+BatchRecord = Tuple[str, str, Optional[List[Dict[str, Any]]], str]
 
 class MainAgent:
-    def __init__(self, user_id="stable_user"):
+    def __init__(self, user_id="stable_user", worker: Optional[SenseWorker] = None, planner: Optional[Planner] = None, coach: Optional[CoachAgent] = None, memory_backend: Optional[MemoryBackend] = None):
         self.user_id = user_id
-        self.worker = SenseWorker()
-        self.planner = Planner()
-        self.coach = CoachAgent()
-        self.memory = SessionMemory(user_id)
-        self.context = {}
+        # Stateless agents can be shared across users (see run_agent_batch); only memory is per-user.
+        self.worker = worker if worker is not None else SenseWorker()
+        self.planner = planner if planner is not None else Planner()
+        self.coach = coach if coach is not None else CoachAgent()
+        self.memory = SessionMemory(user_id, backend=memory_backend, transactions=self.worker.history)
+        self.context = PipelineContext(user_id)
 
-    def handle_message(self, sms_input: str, manual_entries: List[Dict[str, Any]], ocr_text: str) -> Dict[str, Any]:
+    def _run_deterministic_stages(self, sms_input: str, manual_entries: List[Dict[str, Any]], ocr_text: str, sense_state: Optional[SenseState] = None) -> PipelineContext:
+        """
+        Stages 1-4 (sense, memory, risk, verifier): local and CPU-only, shared by the sync and async paths.
+        A precomputed sense_state (e.g. from SenseWorker.run_sense_many) skips parsing the raw inputs.
+        """
         log_event("Orchestrator", "Start", {"user": self.user_id})
+        # Fresh typed context per message; models are only serialized when the output is assembled.
+        context = self.context = PipelineContext(self.user_id)
 
         # 1. SENSE (Worker)
-        sense_state = self.worker.run_sense_worker(sms_input, manual_entries, ocr_text)
-        self.context["sense_state"] = sense_state.model_dump() # Changed .dict() to .model_dump()
+        with context.stage("sense"):
+            context.sense_state = sense_state if sense_state is not None else self.worker.run_sense_worker(sms_input, manual_entries, ocr_text, self.user_id)
 
         # 2. MEMORY
-        memory_snapshot = self.memory.compute_and_get_fingerprint()
-        self.context["memory_snapshot"] = memory_snapshot.model_dump() # Convert to dict here
-        self.context["user_id"] = self.user_id # Add user_id to context
+        with context.stage("memory"):
+            context.memory_snapshot = self.memory.compute_and_get_fingerprint()
+            context.memory_epoch = self.memory.epoch # Lets later stages detect stale memory
 
         # 3. EVALUATION (Risk)
-        risk_level = run_risk_analysis(sense_state)
-        self.context["risk_level"] = risk_level
+        with context.stage("risk"):
+            context.risk_level = run_risk_analysis(context.sense_state)
 
         # 4. EVALUATION (Verifier)
-        eval_results = run_deterministic_verifier(risk_level)
-        self.context.update(eval_results)
+        with context.stage("verifier"):
+            context.update(run_deterministic_verifier(context.risk_level))
 
-        # 5. PLAN (Planner)
-        plan_output = self.planner.run_planning(self.context)
+        return context
 
-        # 6. CONCIERGE (Coach Agent)
-        coach_advice = self.coach.run_concierge(sense_state, plan_output, memory_snapshot)
-        self.context["coach_advice"] = coach_advice.model_dump() # Changed .dict() to .model_dump()
+    def _finalize(self, context: PipelineContext) -> Dict[str, Any]:
+        context.llm_cache = {
+            "planner": self.planner.cache.stats() if self.planner.cache else None,
+            "coach": self.coach.cache.stats() if self.coach.cache else None,
+        }
+        plan_output = context.plan_output
 
         # 7. OBSERVABILITY
-        final_trace = generate_trace(self.context, plan_output.model_dump(), coach_advice.model_dump()) # Changed .dict() to .model_dump()
+        with context.stage("trace"):
+            final_trace = generate_trace(context, context.dump("plan_output"), context.dump("coach_advice"))
 
         log_event("Orchestrator", "Finish", {"plan_priority": plan_output.priority_level})
 
         return {
             "user_id": self.user_id,
-            "plan": plan_output.model_dump(), # Changed .dict() to .model_dump()
-            "coach_advice": coach_advice.model_dump(), # Changed .dict() to .model_dump()
+            "plan": context.dump("plan_output"),
+            "coach_advice": context.dump("coach_advice"),
             "response_summary": f"Plan: {plan_output.priority_level}. Limit: ${plan_output.today_spend_limit_cents / 100:.2f}. Task: {plan_output.micro_task}",
             "trace": final_trace
         }
 
+    def handle_message(self, sms_input: str, manual_entries: List[Dict[str, Any]], ocr_text: str, sense_state: Optional[SenseState] = None) -> Dict[str, Any]:
+        context = self._run_deterministic_stages(sms_input, manual_entries, ocr_text, sense_state)
+
+        # 5. PLAN (Planner)
+        with context.stage("planner"):
+            context.plan_output = self.planner.run_planning(context)
+
+        # 6. CONCIERGE (Coach Agent)
+        with context.stage("coach"):
+            context.coach_advice = self.coach.run_concierge(context.sense_state, context.plan_output, context.memory_snapshot)
+
+        return self._finalize(context)
+
+    async def handle_message_async(self, sms_input: str, manual_entries: List[Dict[str, Any]], ocr_text: str, llm_timeout_s: Optional[float] = None) -> Dict[str, Any]:
+        """Async pipeline: identical stages, but the planner and coach LLM calls are awaited with per-call timeouts."""
+        context = self._run_deterministic_stages(sms_input, manual_entries, ocr_text)
+
+        # 5. PLAN (Planner)
+        with context.stage("planner"):
+            context.plan_output = await self.planner.run_planning_async(context, timeout_s=llm_timeout_s)
+
+        # 6. CONCIERGE (Coach Agent) -- depends on the plan, so it runs after it
+        with context.stage("coach"):
+            context.coach_advice = await self.coach.run_concierge_async(context.sense_state, context.plan_output, context.memory_snapshot, timeout_s=llm_timeout_s)
+
+        return self._finalize(context)
+
 def run_agent(sms_input: str, user_id: str = "stable_user", manual_entries: List[Dict[str, Any]] = None, ocr_text: str = "") -> Dict[str, Any]:
     """Simplified entry point for testing."""
     if manual_entries is None:
@@ -70,3 +118,63 @@ def run_agent(sms_input: str, user_id: str = "stable_user", manual_entries: List
 
     agent = MainAgent(user_id=user_id)
     return agent.handle_message(sms_input, manual_entries, ocr_text)
+
+def run_agent_batch(records: Iterable[BatchRecord], worker: Optional[SenseWorker] = None, planner: Optional[Planner] = None, coach: Optional[CoachAgent] = None, memory_backend: Optional[MemoryBackend] = None, sense_processes: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Bulk entry point: runs the full pipeline for every (user_id, sms, manual_entries, ocr_text) record.
+    SenseWorker, Planner and CoachAgent (and their Gemini clients) are built once and shared by all users.
+    Results are yielded in input order as they are produced, so callers can stream thousands of users.
+    sense_processes > 0 runs the CPU-bound sense stage in that many processes (SenseWorker.run_sense_many),
+    ahead of and overlapped with the remaining stages; spend models and history are applied per user exactly as on the serial path.
+    """
+    worker = worker if worker is not None else SenseWorker()
+    planner = planner if planner is not None else Planner()
+    coach = coach if coach is not None else CoachAgent()
+
+    if sense_processes > 0:
+        records, sense_records, sense_users = itertools.tee(records, 3)
+        sense_inputs = ((sms_input or "", manual_entries or [], ocr_text or "") for _, sms_input, manual_entries, ocr_text in sense_records)
+        sense_states: Iterator[Any] = worker.run_sense_many(sense_inputs, processes=sense_processes, user_ids=(record[0] for record in sense_users))
+    else:
+        sense_states = itertools.repeat(None)
+
+    for (user_id, sms_input, manual_entries, ocr_text), sense_state in zip(records, sense_states):
+        agent = MainAgent(user_id=user_id, worker=worker, planner=planner, coach=coach, memory_backend=memory_backend)
+        try:
+            if isinstance(sense_state, Exception):
+                raise sense_state
+            yield agent.handle_message(sms_input or "", manual_entries or [], ocr_text or "", sense_state)
+        except Exception as e:
+            # One malformed record must not abort the nightly run.
+            log_event("Orchestrator", "BatchRecordFailed", {"user": user_id, "error": str(e)}, ERROR)
+            yield {"user_id": user_id, "error": str(e)}
+
+async def run_agent_batch_async(records: Iterable[BatchRecord], max_concurrency: int = DEFAULT_MAX_CONCURRENCY, llm_timeout_s: Optional[float] = None, worker: Optional[SenseWorker] = None, planner: Optional[Planner] = None, coach: Optional[CoachAgent] = None, memory_backend: Optional[MemoryBackend] = None) -> List[Dict[str, Any]]:
+    """
+    Async bulk entry point: keeps up to max_concurrency user plans in flight on one event loop.
+    Agents are shared as in run_agent_batch; results are returned in input order.
+    max_concurrency consumers pull records from the input as they free up, so records are read (and
+    coroutines created) only as fast as they are processed; only the results list grows with the batch.
+    """
+    worker = worker if worker is not None else SenseWorker()
+    planner = planner if planner is not None else Planner()
+    coach = coach if coach is not None else CoachAgent()
+    numbered = enumerate(records)
+    results: List[Optional[Dict[str, Any]]] = []
+
+    async def run_one(user_id: str, sms_input: str, manual_entries: Optional[List[Dict[str, Any]]], ocr_text: str) -> Dict[str, Any]:
+        agent = MainAgent(user_id=user_id, worker=worker, planner=planner, coach=coach, memory_backend=memory_backend)
+        try:
+            return await agent.handle_message_async(sms_input or "", manual_entries or [], ocr_text or "", llm_timeout_s=llm_timeout_s)
+        except Exception as e:
+            log_event("Orchestrator", "BatchRecordFailed", {"user": user_id, "error": str(e)}, ERROR)
+            return {"user_id": user_id, "error": str(e)}
+
+    async def consume():
+        # next() on the shared iterator never awaits, so each record goes to exactly one consumer, in input order.
+        for index, record in numbered:
+            results.append(None) # the slot for this index: indices are handed out in order
+            results[index] = await run_one(*record)
+
+    await asyncio.gather(*(consume() for _ in range(max(1, max_concurrency))))
+    return results
@@ -0,0 +1,235 @@
+"""
+Event-sourced user memory: every write is appended to a JSONL event log, and per-user state is the
+fold of that log through reduce_event(). Periodic snapshots record the folded state together with the
+log offset they cover, so startup loads the latest snapshot and replays only the events after it.
+"""
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from project.core.cashflow import today_ordinal
+from project.core.observability import log_event, WARNING
+from project.memory.storage import (MemoryBackend, ComplianceOutcome, DailyOutcome, DEFAULT_USER_PROFILE,
+                                    COMPLIANCE_REWARD, NON_COMPLIANCE_PENALTY, DISCIPLINE_FLOOR, DISCIPLINE_CEILING, check_spending_amount)
+
+# Days covered by the shortfall frequency (one bit per day in the user state).
+SHORTFALL_WINDOW_DAYS = 30
+_WINDOW_BITS = (1 << SHORTFALL_WINDOW_DAYS) - 1
+# Events appended between automatic snapshots (bounds replay work on startup).
+DEFAULT_SNAPSHOT_EVERY = int(os.getenv("NIVRA_MEMORY_SNAPSHOT_EVERY", "10000"))
+
+# Event kinds in the log
+EVENT_SEED, EVENT_COMPLIANCE, EVENT_SPEND = "seed", "compliance", "spend"
+
+
+class UserState:
+    """
+    One user's folded state. Its size is fixed however many events were reduced into it: the 30-day
+    shortfall window is two bitmasks (days with a known outcome, days with a shortfall) anchored at last_day.
+    """
+
+    __slots__ = ("discipline_score", "compliance_days", "risky_spending", "last_day", "observed_mask", "shortfall_mask", "epoch")
+
+    def __init__(self, discipline_score: float, compliance_days: int, risky_spending: Dict[str, int]):
+        self.discipline_score = discipline_score
+        self.compliance_days = compliance_days
+        self.risky_spending = defaultdict(int, risky_spending)
+        self.last_day: Optional[int] = None
+        self.observed_mask = 0
+        self.shortfall_mask = 0
+        self.epoch = 0
+
+    @property
+    def shortfall_frequency_30d(self) -> Optional[float]:
+        """Share of the last 30 days with a known outcome that had a projected shortfall (None without any)."""
+        observed = bin(self.observed_mask).count("1")
+        return bin(self.shortfall_mask).count("1") / observed if observed else None
+
+    def to_json(self) -> List[Any]:
+        return [self.discipline_score, self.compliance_days, dict(self.risky_spending), self.last_day, self.observed_mask, self.shortfall_mask, self.epoch]
+
+    @classmethod
+    def from_json(cls, data: List[Any]) -> "UserState":
+        state = cls(data[0], data[1], data[2])
+        state.last_day, state.observed_mask, state.shortfall_mask, state.epoch = data[3], data[4], data[5], data[6]
+        return state
+
+
+def _record_day(state: UserState, day: int, had_shortfall: bool):
+    if state.last_day is None or day > state.last_day:
+        shift = SHORTFALL_WINDOW_DAYS if state.last_day is None else day - state.last_day
+        state.observed_mask = (state.observed_mask << shift) & _WINDOW_BITS
+        state.shortfall_mask = (state.shortfall_mask << shift) & _WINDOW_BITS
+        state.last_day = day
+    age = state.last_day - day # late outcomes land in their own day's bit, if still inside the window
+    if age < SHORTFALL_WINDOW_DAYS:
+        state.observed_mask |= 1 << age
+        if had_shortfall:
+            state.shortfall_mask |= 1 << age
+
+def reduce_event(state: Optional[UserState], event: Dict[str, Any]) -> UserState:
+    """Folds one logged event into the user's state (state is None before the user's seed event)."""
+    kind = event["type"]
+    if kind == EVENT_SEED:
+        state = UserState(event["discipline_score"], event["compliance_days"], event["risky_spending"])
+    elif kind == EVENT_COMPLIANCE:
+        # Same scoring rules as InMemoryBackend.apply_compliance.
+        if event["complied"]:
+            state.compliance_days += 1
+            state.discipline_score = min(DISCIPLINE_CEILING, state.discipline_score + COMPLIANCE_REWARD)
+        else:
+            state.compliance_days = 0
+            state.discipline_score = max(DISCIPLINE_FLOOR, state.discipline_score - NON_COMPLIANCE_PENALTY)
+        if event.get("shortfall") is not None:
+            _record_day(state, event["day"], event["shortfall"])
+    elif kind == EVENT_SPEND:
+        state.risky_spending[event["category"]] += event["amount_cents"]
+    else:
+        raise ValueError(f"Unknown memory event type: {kind}")
+    state.epoch += 1
+    return state
+
+
+class EventSourcedBackend(MemoryBackend):
+    """
+    MemoryBackend over an append-only event log (one writer process per log file).
+    State lives in memory as folded UserStates; the log keeps the full history (see history()).
+    A snapshot is written every snapshot_every events to '<path>.snapshot', so a restart replays at most
+    that many events. A torn trailing line (crash mid-append) is dropped from the log on recovery;
+    any other undecodable line raises ValueError.
+    """
+
+    def __init__(self, path: str, seed_profiles: Optional[Dict[str, Dict[str, Any]]] = None, snapshot_every: int = DEFAULT_SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        # Known personas (e.g. USER_SIMULATED_HISTORY) used to seed first-seen users.
+        self.seed_profiles = seed_profiles or {}
+        self.snapshot_every = snapshot_every
+        self.states: Dict[str, UserState] = {}
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._since_snapshot = 0
+        self.replayed_events = self._recover()
+        self._log = open(path, "a", encoding="utf-8")
+
+    def _recover(self) -> int:
+        offset = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.seq, offset = snapshot["seq"], snapshot["offset"]
+            self.states = {user_id: UserState.from_json(data) for user_id, data in snapshot["users"].items()}
+        if not os.path.exists(self.path):
+            return 0
+
+        replayed = 0
+        with open(self.path, "rb+") as f:
+            f.seek(offset)
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    # Only the last line can be torn (readline returns an unterminated line only at EOF);
+                    # cut it so new appends start on a clean line.
+                    log_event("EventSourcedBackend", "TornLogTail", {"path": self.path, "offset": offset}, WARNING)
+                    f.truncate(offset)
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError as e:
+                    # A complete line that doesn't decode is corruption, not a torn append: truncating here
+                    # would drop every valid event after it, so refuse to start instead.
+                    raise ValueError(f"Corrupt event log {self.path} at byte offset {offset}: {e}") from e
+                offset += len(line)
+                if event["seq"] > self.seq:
+                    self.states[event["user"]] = reduce_event(self.states.get(event["user"]), event)
+                    self.seq = event["seq"]
+                    replayed += 1
+        self._since_snapshot = replayed
+        return replayed
+
+    def _append_locked(self, events: List[Dict[str, Any]]):
+        """Logs a batch of events with one write, then folds them into the in-memory state."""
+        # Validate before writing: an event for an unknown user would make the log unreplayable.
+        for event in events:
+            if event["type"] != EVENT_SEED and event["user"] not in self.states:
+                raise KeyError(event["user"])
+        for event in events:
+            self.seq += 1
+            event["seq"] = self.seq
+        self._log.write("".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events))
+        self._log.flush()
+        for event in events:
+            self.states[event["user"]] = reduce_event(self.states.get(event["user"]), event)
+        self._since_snapshot += len(events)
+        if self._since_snapshot >= self.snapshot_every:
+            self._snapshot_locked()
+
+    def _snapshot_locked(self):
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        snapshot = {"seq": self.seq, "offset": self._log.tell(), "users": {user_id: state.to_json() for user_id, state in self.states.items()}}
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._since_snapshot = 0
+
+    def snapshot(self):
+        with self._lock:
+            self._snapshot_locked()
+
+    def ensure_user(self, user_id: str):
+        with self._lock:
+            if user_id in self.states:
+                return
+            seed = self.seed_profiles.get(user_id, DEFAULT_USER_PROFILE)
+            self._append_locked([{"type": EVENT_SEED, "user": user_id, "discipline_score": seed["discipline_score"],
+                                  "compliance_days": seed["compliance_days"], "risky_spending": dict(seed["risky_spending"])}])
+
+    def get_profile(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            state = self.states[user_id]
+            risky_spending = state.risky_spending
+            return {
+                "discipline_score": state.discipline_score,
+                "compliance_days": state.compliance_days,
+                "top_risky_category": max(risky_spending, key=risky_spending.get) if risky_spending else "MISC",
+                "shortfall_frequency_30d": state.shortfall_frequency_30d,
+                "epoch": state.epoch,
+            }
+
+    def get_epoch(self, user_id: str) -> int:
+        with self._lock:
+            return self.states[user_id].epoch
+
+    def apply_compliance(self, outcomes: Iterable[ComplianceOutcome]) -> Dict[str, float]:
+        # No shortfall information: the outcome counts for discipline only, not for the shortfall window.
+        return self.apply_day(today_ordinal(), ((user_id, complied, None) for user_id, complied in outcomes))
+
+    def apply_day(self, day: int, outcomes: Iterable[DailyOutcome]) -> Dict[str, float]:
+        events = [{"type": EVENT_COMPLIANCE, "user": user_id, "day": day, "complied": bool(complied), "shortfall": had_shortfall}
+                  for user_id, complied, had_shortfall in outcomes]
+        with self._lock:
+            self._append_locked(events)
+            return {event["user"]: self.states[event["user"]].discipline_score for event in events}
+
+    def add_risky_spending(self, user_id: str, category: str, amount_cents: int):
+        check_spending_amount(amount_cents)
+        with self._lock:
+            self._append_locked([{"type": EVENT_SPEND, "user": user_id, "category": category, "amount_cents": amount_cents}])
+
+    def history(self, user_id: str) -> Iterator[Dict[str, Any]]:
+        """The user's logged events, oldest first (scans the log file)."""
+        with self._lock:
+            self._log.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                if event["user"] == user_id:
+                    yield event
+
+    def close(self):
+        with self._lock:
+            self._log.close()
@@ -1,7 +1,15 @@
-from typing import Dict, Any, List
+import itertools
+import os
+import threading
+import weakref
+from typing import Dict, Any, List, Iterable, Optional, Tuple
 from project.core.a2a_protocol import BehaviorFingerprint
-from collections import defaultdict
-from project.core.observability import log_event
+from collections import defaultdict, OrderedDict
+from project.core.observability import log_event, increment_counter, get_counters
+from project.core.cashflow import today_ordinal
+from project.memory.storage import MemoryBackend, InMemoryBackend, SQLiteMemoryBackend, ComplianceOutcome, DailyOutcome
+from project.memory.event_log import EventSourcedBackend
+from project.memory.transaction_history import TransactionHistory, get_default_history
 
 # --- FINAL: Global State for All Personas (Memory Simulation) ---
 USER_SIMULATED_HISTORY = {
@@ -47,8 +55,21 @@ USER_SIMULATED_HISTORY = {
     }
 }
 
-def identify_riskiest_category(user_id: str) -> str:
-    """Identifies the category with the highest simulated recent spending."""
+# Window of recorded transactions the fingerprint's risky category is taken from.
+RISKY_CATEGORY_WINDOW_DAYS = 90
+
+def identify_riskiest_category(user_id: str, transactions: Optional[TransactionHistory] = None, days: int = RISKY_CATEGORY_WINDOW_DAYS) -> str:
+    """
+    Identifies the category with the highest recent spending: from the user's last `days` days of
+    recorded transactions when a history is available (argument or NIVRA_TXN_HISTORY_DIR), else from
+    the simulated risky_spending profile.
+    """
+    transactions = transactions if transactions is not None else get_default_history()
+    if transactions is not None:
+        riskiest = transactions.riskiest_category(user_id, days)
+        if riskiest is not None:
+            return riskiest
+
     history = USER_SIMULATED_HISTORY.get(user_id, {})
     if not history or not history["risky_spending"]:
         return "MISC"
@@ -57,42 +78,168 @@ def identify_riskiest_category(user_id: str) -> str:
     return riskiest_cat
 
 
+# --- Storage Backend Selection ---
+# NIVRA_MEMORY_DB points every worker process at one shared SQLite file; NIVRA_MEMORY_LOG at a
+# single-writer compliance event log (memory/event_log.py); unset keeps the in-process dict.
+_default_backend: Optional[MemoryBackend] = None
+
+def get_default_backend() -> MemoryBackend:
+    global _default_backend
+    if _default_backend is None:
+        db_path = os.getenv("NIVRA_MEMORY_DB")
+        log_path = os.getenv("NIVRA_MEMORY_LOG")
+        if db_path:
+            _default_backend = SQLiteMemoryBackend(db_path, seed_profiles=USER_SIMULATED_HISTORY)
+        elif log_path:
+            _default_backend = EventSourcedBackend(log_path, seed_profiles=USER_SIMULATED_HISTORY)
+        else:
+            _default_backend = InMemoryBackend(USER_SIMULATED_HISTORY)
+    return _default_backend
+
+def set_default_backend(backend: MemoryBackend):
+    global _default_backend
+    _default_backend = backend
+
+
+# --- Fingerprint Cache ---
+class FingerprintCache:
+    """
+    Bounded LRU of computed fingerprints keyed by (backend, user), each tagged with the stamp it was built from
+    (the backend epoch, plus the user's transaction-history version and day when a history feeds the fingerprint).
+    Local writes invalidate entries directly; writes from other processes are caught by the stamp check.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[Tuple[int, ...], BehaviorFingerprint]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Never-reused token per backend instance (id() can be recycled after a backend is closed).
+        self._backend_tokens: "weakref.WeakKeyDictionary[MemoryBackend, int]" = weakref.WeakKeyDictionary()
+        self._next_token = itertools.count()
+
+    def _key(self, backend: MemoryBackend, user_id: str) -> Tuple[int, str]:
+        token = self._backend_tokens.get(backend)
+        if token is None:
+            token = self._backend_tokens.setdefault(backend, next(self._next_token))
+        return token, user_id
+
+    def get(self, backend: MemoryBackend, user_id: str, stamp: Tuple[int, ...]) -> Optional[BehaviorFingerprint]:
+        key = self._key(backend, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                increment_counter("fingerprint_cache.hit")
+                return entry[1]
+        increment_counter("fingerprint_cache.miss")
+        return None
+
+    def put(self, backend: MemoryBackend, user_id: str, stamp: Tuple[int, ...], fingerprint: BehaviorFingerprint):
+        key = self._key(backend, user_id)
+        with self._lock:
+            self._entries[key] = (stamp, fingerprint)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, backend: MemoryBackend, user_id: str):
+        with self._lock:
+            if self._entries.pop(self._key(backend, user_id), None) is not None:
+                increment_counter("fingerprint_cache.invalidation")
+
+    def stats(self) -> Dict[str, int]:
+        stats = get_counters("fingerprint_cache.")
+        with self._lock:
+            stats["fingerprint_cache.entries"] = len(self._entries)
+        return stats
+
+FINGERPRINT_CACHE = FingerprintCache()
+
+
 class SessionMemory:
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, backend: Optional[MemoryBackend] = None, transactions: Optional[TransactionHistory] = None):
         self.user_id = user_id
+        self.backend = backend if backend is not None else get_default_backend()
+        # Recorded expenses (SenseWorker.history); when present, the risky category comes from their 90-day window.
+        self.transactions = transactions if transactions is not None else get_default_history()
         # Set a reasonable default if the ID isn't found
-        if user_id not in USER_SIMULATED_HISTORY:
-            USER_SIMULATED_HISTORY[user_id] = {
-                "discipline_score": 0.6,
-                "compliance_days": 3,
-                "risky_spending": defaultdict(lambda: 0, {"FOOD": 3000}),
-            }
+        self.backend.ensure_user(user_id)
+        # Epoch of the last fingerprint handed out; compare with current_epoch() to detect staleness.
+        self.epoch: Optional[int] = None
+        self._stamp: Optional[Tuple[int, ...]] = None
+
+    def current_epoch(self) -> int:
+        return self.backend.get_epoch(self.user_id)
+
+    def _current_stamp(self) -> Tuple[int, ...]:
+        # History appends don't bump the backend epoch, and the 90-day window moves daily.
+        if self.transactions is None:
+            return (self.current_epoch(),)
+        return self.current_epoch(), self.transactions.user_version(self.user_id), today_ordinal()
+
+    def is_stale(self) -> bool:
+        """True when the user's memory or transaction history has been written since the last fingerprint was computed."""
+        return self._stamp is None or self._stamp != self._current_stamp()
 
     def compute_and_get_fingerprint(self) -> BehaviorFingerprint:
         """Calculates and returns the current state of the user's behavioral fingerprint."""
 
-        user_data = USER_SIMULATED_HISTORY[self.user_id]
+        stamp = self._current_stamp()
+        cached = FINGERPRINT_CACHE.get(self.backend, self.user_id, stamp)
+        if cached is not None:
+            self.epoch, self._stamp = stamp[0], stamp
+            return cached
+
+        user_data = self.backend.get_profile(self.user_id)
 
         discipline = min(0.95, max(0.1, user_data["discipline_score"]))
-        risky_category = identify_riskiest_category(self.user_id)
-        shortfall_freq = 0.05 if discipline < 0.5 else 0.01
+        risky_category = user_data["top_risky_category"]
+        if self.transactions is not None:
+            risky_category = self.transactions.riskiest_category(self.user_id, RISKY_CATEGORY_WINDOW_DAYS) or risky_category
+        shortfall_freq = user_data.get("shortfall_frequency_30d")
+        if shortfall_freq is None:
+            # No shortfall history in this backend (or for this user yet): estimate from discipline.
+            shortfall_freq = 0.05 if discipline < 0.5 else 0.01
 
-        return BehaviorFingerprint(
+        fingerprint = BehaviorFingerprint(
             discipline_score=discipline,
             shortfall_frequency_30d=shortfall_freq,
             recent_risky_category=risky_category,
             plan_follow_streak=user_data["compliance_days"]
         )
+        # The profile's own epoch: a write racing with the read above is picked up by the next stamp check.
+        self.epoch = user_data["epoch"]
+        self._stamp = (self.epoch,) + stamp[1:]
+        FINGERPRINT_CACHE.put(self.backend, self.user_id, self._stamp, fingerprint)
+        return fingerprint
 
     # Function to simulate compliance update
     def update_compliance(self, complied: bool, spend_limit_cents: int):
-        user_data = USER_SIMULATED_HISTORY[self.user_id]
+        scores = self.backend.apply_compliance([(self.user_id, complied)])
+        FINGERPRINT_CACHE.invalidate(self.backend, self.user_id)
 
-        if complied:
-            user_data["compliance_days"] += 1
-            user_data["discipline_score"] = min(0.95, user_data["discipline_score"] + 0.05)
-        else:
-            user_data["compliance_days"] = 0
-            user_data["discipline_score"] = max(0.1, user_data["discipline_score"] - 0.1)
+        log_event("SessionMemory", "ComplianceUpdate", {"user": self.user_id, "score": scores[self.user_id]})
+
+    def record_spending(self, category: str, amount_cents: int):
+        """Adds spend to a risky category; the backend keeps the user's top category current."""
+        self.backend.add_risky_spending(self.user_id, category, amount_cents)
+        FINGERPRINT_CACHE.invalidate(self.backend, self.user_id)
+
+
+def update_compliance_batch(outcomes: Iterable[ComplianceOutcome], backend: Optional[MemoryBackend] = None) -> Dict[str, float]:
+    """Applies a day's (user_id, complied) outcomes for many users in a single backend write."""
+    backend = backend if backend is not None else get_default_backend()
+    scores = backend.apply_compliance(outcomes)
+    for user_id in scores:
+        FINGERPRINT_CACHE.invalidate(backend, user_id)
+    log_event("SessionMemory", "ComplianceBatchUpdate", {"users": len(scores)})
+    return scores
 
-        log_event("SessionMemory", "ComplianceUpdate", {"user": self.user_id, "score": user_data["discipline_score"]})
+def apply_daily_outcomes(day: int, outcomes: Iterable[DailyOutcome], backend: Optional[MemoryBackend] = None) -> Dict[str, float]:
+    """Ingests one day's (user_id, complied, had_shortfall) outcomes for all users in a single backend call."""
+    backend = backend if backend is not None else get_default_backend()
+    scores = backend.apply_day(day, outcomes)
+    for user_id in scores:
+        FINGERPRINT_CACHE.invalidate(backend, user_id)
+    log_event("SessionMemory", "DailyOutcomesApplied", {"day": day, "users": len(scores)})
+    return scores
@@ -0,0 +1,260 @@
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# --- Compliance scoring rules (shared by every backend) ---
+COMPLIANCE_REWARD = 0.05
+NON_COMPLIANCE_PENALTY = 0.1
+DISCIPLINE_FLOOR = 0.1
+DISCIPLINE_CEILING = 0.95
+
+# Profile given to users the system has never seen before.
+DEFAULT_USER_PROFILE = {"discipline_score": 0.6, "compliance_days": 3, "risky_spending": {"FOOD": 3000}}
+
+# (user_id, complied) -- one day's outcome for one user
+ComplianceOutcome = Tuple[str, bool]
+# (user_id, complied, had_shortfall) -- as ComplianceOutcome, plus whether the day had a projected shortfall (None: unknown)
+DailyOutcome = Tuple[str, bool, Optional[bool]]
+
+
+def check_spending_amount(amount_cents: int):
+    """Risky spending only accumulates (backends keep the top category incrementally on that assumption)."""
+    if amount_cents <= 0:
+        raise ValueError(f"Risky spending must be positive, got {amount_cents} cents")
+
+
+class MemoryBackend(ABC):
+    """
+    Storage interface behind SessionMemory.
+    A profile is a dict with 'discipline_score', 'compliance_days', 'top_risky_category' and 'epoch'.
+    The epoch is a per-user counter bumped by every write, so readers can tell when cached state is stale.
+    """
+
+    @abstractmethod
+    def ensure_user(self, user_id: str):
+        ...
+
+    @abstractmethod
+    def get_profile(self, user_id: str) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def get_epoch(self, user_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def apply_compliance(self, outcomes: Iterable[ComplianceOutcome]) -> Dict[str, float]:
+        """Applies compliance outcomes in one batch; returns the new discipline score per user."""
+
+    def apply_day(self, day: int, outcomes: Iterable[DailyOutcome]) -> Dict[str, float]:
+        """
+        Bulk ingest of one day's outcomes for many users (day is a date ordinal).
+        Backends that do not track shortfall history only apply the compliance part.
+        """
+        return self.apply_compliance((user_id, complied) for user_id, complied, _ in outcomes)
+
+    @abstractmethod
+    def add_risky_spending(self, user_id: str, category: str, amount_cents: int):
+        """Adds a positive amount to the user's spend in category; raises KeyError for an unknown user, ValueError for amount_cents <= 0."""
+
+
+class InMemoryBackend(MemoryBackend):
+    """
+    Process-local backend over a dict shaped like USER_SIMULATED_HISTORY (the legacy behaviour).
+    Writes must go through the backend methods for the user's epoch to advance.
+    """
+
+    def __init__(self, history: Dict[str, Dict[str, Any]]):
+        self.history = history
+        # Kept outside the history dict so its legacy shape is untouched.
+        self._epochs: Dict[str, int] = defaultdict(int)
+
+    def ensure_user(self, user_id: str):
+        if user_id not in self.history:
+            self.history[user_id] = {
+                "discipline_score": DEFAULT_USER_PROFILE["discipline_score"],
+                "compliance_days": DEFAULT_USER_PROFILE["compliance_days"],
+                "risky_spending": defaultdict(lambda: 0, DEFAULT_USER_PROFILE["risky_spending"]),
+            }
+
+    def get_profile(self, user_id: str) -> Dict[str, Any]:
+        user_data = self.history[user_id]
+        risky_spending = user_data["risky_spending"]
+        return {
+            "discipline_score": user_data["discipline_score"],
+            "compliance_days": user_data["compliance_days"],
+            "top_risky_category": max(risky_spending, key=risky_spending.get) if risky_spending else "MISC",
+            "epoch": self._epochs[user_id],
+        }
+
+    def get_epoch(self, user_id: str) -> int:
+        return self._epochs[user_id]
+
+    def apply_compliance(self, outcomes: Iterable[ComplianceOutcome]) -> Dict[str, float]:
+        scores = {}
+        for user_id, complied in outcomes:
+            user_data = self.history[user_id]
+            if complied:
+                user_data["compliance_days"] += 1
+                user_data["discipline_score"] = min(DISCIPLINE_CEILING, user_data["discipline_score"] + COMPLIANCE_REWARD)
+            else:
+                user_data["compliance_days"] = 0
+                user_data["discipline_score"] = max(DISCIPLINE_FLOOR, user_data["discipline_score"] - NON_COMPLIANCE_PENALTY)
+            scores[user_id] = user_data["discipline_score"]
+            self._epochs[user_id] += 1
+        return scores
+
+    def add_risky_spending(self, user_id: str, category: str, amount_cents: int):
+        check_spending_amount(amount_cents)
+        self.history[user_id]["risky_spending"][category] += amount_cents
+        self._epochs[user_id] += 1
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """
+    Durable backend: one row per user in a SQLite database running in WAL mode, so several worker
+    processes can serve the same users concurrently. Nothing is held in Python between calls, which
+    keeps the per-process footprint bounded regardless of user count.
+    The riskiest category is kept in a 'top_risky_category' column maintained on every spending write.
+    """
+
+    def __init__(self, path: str, seed_profiles: Optional[Dict[str, Dict[str, Any]]] = None, busy_timeout_ms: int = 5000):
+        self.path = path
+        # Known personas (e.g. USER_SIMULATED_HISTORY) used to seed first-seen users.
+        self.seed_profiles = seed_profiles or {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                discipline_score REAL NOT NULL,
+                compliance_days INTEGER NOT NULL,
+                top_risky_category TEXT NOT NULL DEFAULT 'MISC',
+                top_risky_amount_cents INTEGER NOT NULL DEFAULT 0,
+                epoch INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS risky_spending (
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                amount_cents INTEGER NOT NULL,
+                PRIMARY KEY (user_id, category)
+            );
+            """
+        )
+        # Databases created before epochs existed get the column added in place.
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(users)")}
+        if "epoch" not in columns:
+            self._db.execute("ALTER TABLE users ADD COLUMN epoch INTEGER NOT NULL DEFAULT 0")
+
+    def ensure_user(self, user_id: str):
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone():
+                return
+            seed = self.seed_profiles.get(user_id, DEFAULT_USER_PROFILE)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO users (user_id, discipline_score, compliance_days) VALUES (?, ?, ?)",
+                    (user_id, seed["discipline_score"], seed["compliance_days"]),
+                ).rowcount
+                # Another process may have seeded the user between our SELECT and INSERT.
+                if inserted:
+                    for category, amount_cents in seed["risky_spending"].items():
+                        self._add_risky_spending_locked(user_id, category, amount_cents)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def get_profile(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT discipline_score, compliance_days, top_risky_category, epoch FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(user_id)
+        return {"discipline_score": row[0], "compliance_days": row[1], "top_risky_category": row[2], "epoch": row[3]}
+
+    def get_epoch(self, user_id: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT epoch FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            raise KeyError(user_id)
+        return row[0]
+
+    def apply_compliance(self, outcomes: Iterable[ComplianceOutcome]) -> Dict[str, float]:
+        params = [
+            (int(complied), int(complied), DISCIPLINE_CEILING, COMPLIANCE_REWARD, DISCIPLINE_FLOOR, NON_COMPLIANCE_PENALTY, user_id)
+            for user_id, complied in outcomes
+        ]
+        if not params:
+            return {}
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # The update is computed inside SQLite so concurrent writers never lose an increment.
+                self._db.executemany(
+                    "UPDATE users SET "
+                    "compliance_days = CASE WHEN ? THEN compliance_days + 1 ELSE 0 END, "
+                    "discipline_score = CASE WHEN ? THEN MIN(?, discipline_score + ?) ELSE MAX(?, discipline_score - ?) END, "
+                    "epoch = epoch + 1 "
+                    "WHERE user_id = ?",
+                    params,
+                )
+                user_ids = list({row[-1] for row in params})
+                scores = {}
+                for start in range(0, len(user_ids), 500):
+                    chunk = user_ids[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    scores.update(self._db.execute(
+                        f"SELECT user_id, discipline_score FROM users WHERE user_id IN ({placeholders})", chunk
+                    ).fetchall())
+                # Same contract as the other backends: an unknown user fails the whole batch (rolled back below).
+                missing = next((user_id for user_id in user_ids if user_id not in scores), None)
+                if missing is not None:
+                    raise KeyError(missing)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return scores
+
+    def add_risky_spending(self, user_id: str, category: str, amount_cents: int):
+        check_spending_amount(amount_cents)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._add_risky_spending_locked(user_id, category, amount_cents)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _add_risky_spending_locked(self, user_id: str, category: str, amount_cents: int):
+        # Checked first, so an unknown user never gets orphan risky_spending rows.
+        if not self._db.execute("UPDATE users SET epoch = epoch + 1 WHERE user_id = ?", (user_id,)).rowcount:
+            raise KeyError(user_id)
+        self._db.execute(
+            "INSERT INTO risky_spending (user_id, category, amount_cents) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, category) DO UPDATE SET amount_cents = amount_cents + excluded.amount_cents",
+            (user_id, category, amount_cents),
+        )
+        new_total = self._db.execute(
+            "SELECT amount_cents FROM risky_spending WHERE user_id = ? AND category = ?", (user_id, category)
+        ).fetchone()[0]
+        # Spending only grows, so the top category changes only when this category overtakes it.
+        self._db.execute(
+            "UPDATE users SET top_risky_category = ?, top_risky_amount_cents = ? "
+            "WHERE user_id = ? AND (top_risky_amount_cents < ? OR top_risky_category = ?)",
+            (category, new_total, user_id, new_total, category),
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
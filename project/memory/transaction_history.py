@@ -0,0 +1,229 @@
+"""
+On-disk transaction history for long-range behavior analysis.
+
+Expenses are appended as fixed-width records (user id, day, category id, amount) to 'transactions.bin' and
+read back through numpy.memmap, so aggregates slice the mapped file instead of loading Python objects.
+Every append is one contiguous run of a single user's records; 'runs.bin' indexes the runs per user
+(record offset, count, first/last day), so a user's 30/90-day window touches only that user's runs.
+User ids and category names are interned into small ints, kept in append-only 'users.txt' / 'categories.txt'.
+Re-sent days (replace_day) are appended as signed per-category corrections, so sums over a window stay exact.
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from project.core.cashflow import today_ordinal
+from project.core.expense_batch import ExpenseBatch
+
+# Category ids are as wide as user ids: categories.txt has no size limit, so ids past 65,535 must still fit.
+RECORD_DTYPE = np.dtype([("user", "<u4"), ("day", "<i4"), ("category", "<u4"), ("amount_cents", "<i8")])
+RUN_DTYPE = np.dtype([("user", "<u4"), ("offset", "<u8"), ("count", "<u4"), ("first_day", "<i4"), ("last_day", "<i4")])
+# Windows reported by aggregates().
+AGGREGATE_WINDOWS_DAYS = (30, 90)
+
+
+class _NameTable:
+    """Append-only name <-> id table persisted one name per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.names: List[str] = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.names = [line[:-1] for line in f if line.endswith("\n")] # an unterminated last line is a torn write
+        self.ids: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def intern_many(self, names: Sequence[str]) -> List[int]:
+        new = []
+        for name in names:
+            if name not in self.ids:
+                if "\n" in name:
+                    raise ValueError(f"Name contains a newline: {name!r}")
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+                new.append(name)
+        if new:
+            self._file.write("".join(name + "\n" for name in new))
+            self._file.flush()
+        return [self.ids[name] for name in names]
+
+    def close(self):
+        self._file.close()
+
+
+class TransactionHistory:
+    """
+    Append-only, memory-mapped expense history for many users (one writer process per directory).
+    Reads return numpy views of the mapped file; nothing is copied until a window is aggregated.
+    On open, records or index entries left behind by an interrupted append are discarded.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.users = _NameTable(os.path.join(directory, "users.txt"))
+        self.categories = _NameTable(os.path.join(directory, "categories.txt"))
+        self._data_path = os.path.join(directory, "transactions.bin")
+        self._runs_path = os.path.join(directory, "runs.bin")
+
+        runs = np.fromfile(self._runs_path, dtype=np.uint8) if os.path.exists(self._runs_path) else np.zeros(0, np.uint8)
+        whole = len(runs) // RUN_DTYPE.itemsize * RUN_DTYPE.itemsize
+        runs = runs[:whole].view(RUN_DTYPE)
+        self.records = int(runs["offset"][-1] + runs["count"][-1]) if len(runs) else 0
+        for path, size in ((self._runs_path, whole), (self._data_path, self.records * RECORD_DTYPE.itemsize)):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+        # Per-user offset index: user id -> [(offset, count, first_day, last_day), ...] in append order.
+        self.index: Dict[int, List[Tuple[int, int, int, int]]] = {}
+        for user, offset, count, first_day, last_day in runs.tolist():
+            self.index.setdefault(user, []).append((offset, count, first_day, last_day))
+
+        self._data = open(self._data_path, "ab")
+        self._runs = open(self._runs_path, "ab")
+        self._map: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self.records
+
+    def append(self, user_id: str, day: int, categories: Sequence[str], amounts_cents: Sequence[int]) -> int:
+        """Appends one user's expenses for a day as a single run; returns the number of records written."""
+        if not len(amounts_cents):
+            return 0
+        with self._lock:
+            return self._append_locked(user_id, day, categories, amounts_cents)
+
+    def _append_locked(self, user_id: str, day: int, categories: Sequence[str], amounts_cents: Sequence[int]) -> int:
+        user = self.users.intern_many([user_id])[0]
+        records = np.empty(len(amounts_cents), dtype=RECORD_DTYPE)
+        records["user"] = user
+        records["day"] = day
+        records["category"] = self.categories.intern_many(categories)
+        records["amount_cents"] = amounts_cents
+        run = (user, self.records, len(records), day, day)
+        # Data before index: a crash between the two leaves unindexed records, which open() discards.
+        self._data.write(records.tobytes())
+        self._data.flush()
+        self._runs.write(np.array([run], dtype=RUN_DTYPE).tobytes())
+        self._runs.flush()
+        self.index.setdefault(user, []).append(run[1:])
+        self.records += len(records)
+        return len(records)
+
+    def replace_day(self, user_id: str, day: int, totals_by_category: Dict[str, int]) -> int:
+        """
+        Makes the user's recorded spend on `day` equal totals_by_category (for callers that re-send a whole day,
+        so repeating them is not counted twice). The file stays append-only: only the per-category difference
+        from what is already recorded for the day is appended, as correction records that may be negative.
+        Returns the number of records written.
+        """
+        with self._lock:
+            user = self.users.ids.get(user_id)
+            recorded: Dict[str, int] = {}
+            if user is not None:
+                mapped = self._mapped()
+                names = self.categories.names
+                for offset, count, first_day, last_day in self.index.get(user, ()):
+                    if first_day <= day <= last_day:
+                        run = mapped[offset:offset + count]
+                        run = run[run["day"] == day]
+                        for category, amount in zip(run["category"].tolist(), run["amount_cents"].tolist()):
+                            recorded[names[category]] = recorded.get(names[category], 0) + amount
+            deltas = {category: amount - recorded.get(category, 0) for category, amount in totals_by_category.items()}
+            deltas.update((category, -amount) for category, amount in recorded.items() if category not in totals_by_category)
+            deltas = {category: delta for category, delta in deltas.items() if delta}
+            if not deltas:
+                return 0
+            return self._append_locked(user_id, day, list(deltas), list(deltas.values()))
+
+    def append_batch(self, user_id: str, day: int, batch: ExpenseBatch, start: int = 0) -> int:
+        """Appends the rows of an ExpenseBatch from `start` on (e.g. only those a stream added since the last append)."""
+        names = batch.categories.names
+        return self.append(user_id, day, [names[category_id] for category_id in batch.category_ids[start:]], batch.amounts[start:])
+
+    def _mapped(self) -> np.ndarray:
+        """The whole record file as a read-only structured memmap, remapped when appends have grown it."""
+        if self._map is None or len(self._map) < self.records:
+            self._map = np.memmap(self._data_path, dtype=RECORD_DTYPE, mode="r", shape=(self.records,)) if self.records else np.zeros(0, RECORD_DTYPE)
+        return self._map
+
+    def user_version(self, user_id: str) -> int:
+        """Number of runs appended for the user; changes whenever the user's history does (for cache stamps)."""
+        with self._lock:
+            user = self.users.ids.get(user_id)
+            return len(self.index.get(user, ())) if user is not None else 0
+
+    def user_runs(self, user_id: str, since_day: Optional[int] = None) -> List[np.ndarray]:
+        """Zero-copy views of the user's runs (oldest first), skipping runs that end before since_day."""
+        with self._lock:
+            user = self.users.ids.get(user_id)
+            runs = self.index.get(user, []) if user is not None else []
+            mapped = self._mapped()
+            return [mapped[offset:offset + count] for offset, count, _, last_day in runs if since_day is None or last_day >= since_day]
+
+    def user_records(self, user_id: str, since_day: Optional[int] = None) -> np.ndarray:
+        """
+        The user's records from runs ending on/after since_day, gathered from the mapped file in one
+        fancy-indexing call (only this user's rows are read; a loop over user_runs pays per-run overhead).
+        """
+        with self._lock:
+            user = self.users.ids.get(user_id)
+            runs = [(offset, count) for offset, count, _, last_day in self.index.get(user, ()) if since_day is None or last_day >= since_day] if user is not None else []
+            mapped = self._mapped()
+        if not runs:
+            return np.zeros(0, RECORD_DTYPE)
+        offsets, counts = np.array(runs, dtype=np.int64).T
+        # Row i of the result is offsets[run] + (i - first row of run).
+        rows = np.repeat(offsets - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        return mapped[rows]
+
+    def category_totals(self, user_id: str, days: int = 30, as_of: Optional[int] = None) -> Dict[str, int]:
+        """Spend per category over the `days` days ending at as_of (default today)."""
+        as_of = as_of if as_of is not None else today_ordinal()
+        since = as_of - days + 1
+        records = self.user_records(user_id, since)
+        records = records[(records["day"] >= since) & (records["day"] <= as_of)]
+        # float64 sums are exact for totals below 2**53 cents.
+        totals = np.bincount(records["category"], weights=records["amount_cents"], minlength=len(self.categories.names))
+        names = self.categories.names
+        return {names[i]: int(totals[i]) for i in np.flatnonzero(totals)}
+
+    def aggregates(self, user_id: str, as_of: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """category_totals for each of AGGREGATE_WINDOWS_DAYS, keyed '30d' / '90d'."""
+        return {f"{days}d": self.category_totals(user_id, days, as_of) for days in AGGREGATE_WINDOWS_DAYS}
+
+    def riskiest_category(self, user_id: str, days: int = 90, as_of: Optional[int] = None) -> Optional[str]:
+        totals = self.category_totals(user_id, days, as_of)
+        return max(totals, key=totals.get) if totals else None
+
+    def category_matrix(self, days: int = 30, as_of: Optional[int] = None) -> Tuple[List[str], List[str], np.ndarray]:
+        """(user ids, category names, [users, categories] spend) for every user, in one pass over the mapped day column."""
+        as_of = as_of if as_of is not None else today_ordinal()
+        with self._lock:
+            mapped = self._mapped()
+            users, categories = list(self.users.names), list(self.categories.names)
+        in_window = (mapped["day"] >= as_of - days + 1) & (mapped["day"] <= as_of)
+        matrix = np.zeros((len(users), len(categories)), dtype=np.int64)
+        np.add.at(matrix, (mapped["user"][in_window], mapped["category"][in_window]), mapped["amount_cents"][in_window])
+        return users, categories, matrix
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._runs.close()
+            self.users.close()
+            self.categories.close()
+            self._map = None
+
+
+# --- Default history ---
+# NIVRA_TXN_HISTORY_DIR enables persistent transaction history for SenseWorkers built without one.
+_default_history: Optional[TransactionHistory] = None
+
+def get_default_history() -> Optional[TransactionHistory]:
+    global _default_history
+    if _default_history is None and os.getenv("NIVRA_TXN_HISTORY_DIR"):
+        _default_history = TransactionHistory(os.environ["NIVRA_TXN_HISTORY_DIR"])
+    return _default_history
@@ -0,0 +1,116 @@
+import heapq
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+from project.core.a2a_protocol import PlannerRecommendation
+
+# Generally safe, low-effort gig offered when nothing persona-specific is verified.
+FALLBACK_GIG_NAME = "Online Survey/Data Annotation"
+# Last-resort fallback (including personas that opt out of FALLBACK_GIG_NAME) only if it is this safe.
+FALLBACK_MAX_RISK = 0.2
+# Verified-rec collections (catalog snapshots x risk levels) whose precomputed views are kept.
+MAX_CACHED_VIEWS = 16
+
+PersonaSpec = Tuple[Tuple[str, ...], Tuple[str, ...], bool] # (gig names, relevance tags, survey fallback)
+_DEFAULT_SPEC: PersonaSpec = ((), (), True)
+
+
+def _risk(rec: PlannerRecommendation) -> float:
+    return rec.risk_score
+
+def _identity(rec: PlannerRecommendation) -> tuple:
+    # Field-wise equality key (the model itself is unhashable because relevance_tags is a list).
+    return (rec.name, rec.type, rec.risk_score, tuple(rec.relevance_tags))
+
+
+class _RecsView:
+    """Precomputed name/tag lookups over one verified-rec collection, plus memoized per-persona selections."""
+
+    __slots__ = ("by_name", "by_tag", "fallback", "low_risk_fallback", "selections")
+
+    def __init__(self, recs: Sequence[PlannerRecommendation]):
+        by_name: Dict[str, List[PlannerRecommendation]] = {}
+        by_tag: Dict[str, List[PlannerRecommendation]] = {}
+        for rec in recs:
+            by_name.setdefault(rec.name, []).append(rec)
+            for tag in rec.relevance_tags:
+                by_tag.setdefault(tag, []).append(rec)
+        # Stable sorts: equal-risk gigs keep their order in the collection.
+        self.by_name = {name: sorted(group, key=_risk) for name, group in by_name.items()}
+        self.by_tag = {tag: sorted(group, key=_risk) for tag, group in by_tag.items()}
+        survey = by_name.get(FALLBACK_GIG_NAME, [])
+        self.fallback = survey[0] if survey else None
+        self.low_risk_fallback = next((rec for rec in survey if rec.risk_score < FALLBACK_MAX_RISK), None)
+        self.selections: Dict[PersonaSpec, Tuple[PlannerRecommendation, ...]] = {}
+
+    def select(self, spec: PersonaSpec) -> Tuple[PlannerRecommendation, ...]:
+        selection = self.selections.get(spec)
+        if selection is None:
+            names, tags, survey_fallback = spec
+            # Every list is already risk-sorted, so one merge yields the risk-ordered union; ties keep
+            # config order (named gigs first), matching the legacy stable sort.
+            lists = [self.by_name[name] for name in names if name in self.by_name]
+            lists += [self.by_tag[tag] for tag in tags if tag in self.by_tag]
+            merged: List[PlannerRecommendation] = []
+            seen = set()
+            for rec in heapq.merge(*lists, key=_risk):
+                key = _identity(rec)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(rec)
+            if not merged:
+                fallback = self.fallback if survey_fallback else None
+                if fallback is None:
+                    fallback = self.low_risk_fallback
+                if fallback is not None:
+                    merged.append(fallback)
+            selection = self.selections[spec] = tuple(merged)
+        return selection
+
+
+class PersonaIndex:
+    """
+    Persona -> preferred gigs index, built once from config.
+
+    Each persona lists gig names and/or relevance tags; selecting recommendations for a user is a dict
+    lookup into a view precomputed for the verified-rec collection, with the merge of its presorted
+    name/tag lists done once per persona and memoized. Verified recs handed out by the gig catalog are
+    shared tuples, so views are cached by collection identity; lists are indexed per call.
+    """
+
+    def __init__(self, preferences: Dict[str, Any]):
+        self.personas: Dict[str, PersonaSpec] = {}
+        for persona, entry in preferences.items():
+            if isinstance(entry, dict):
+                spec = (tuple(entry.get("gigs", ())), tuple(entry.get("tags", ())), bool(entry.get("survey_fallback", True)))
+            else:
+                spec = (tuple(entry), (), True) # plain list of gig names
+            self.personas[persona] = spec
+        self._views: "OrderedDict[int, Tuple[Sequence[PlannerRecommendation], _RecsView]]" = OrderedDict()
+
+    @classmethod
+    def from_file(cls, path: str) -> "PersonaIndex":
+        """Loads persona preferences from JSON: {persona: [gig names]} or {persona: {"gigs", "tags", "survey_fallback"}}."""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _view_for(self, recs: Sequence[PlannerRecommendation]) -> _RecsView:
+        if not isinstance(recs, tuple):
+            return _RecsView(recs) # mutable collection: never cache
+        cached = self._views.get(id(recs))
+        # The entry holds a reference to recs, so its id cannot be reused while cached.
+        if cached is not None and cached[0] is recs:
+            self._views.move_to_end(id(recs))
+            return cached[1]
+        view = _RecsView(recs)
+        self._views[id(recs)] = (recs, view)
+        while len(self._views) > MAX_CACHED_VIEWS:
+            self._views.popitem(last=False)
+        return view
+
+    def select(self, persona: str, recs: Sequence[PlannerRecommendation]) -> Tuple[PlannerRecommendation, ...]:
+        """Risk-sorted recommendations for a persona, falling back to the generic survey gig if none match."""
+        return self._view_for(recs).select(self.personas.get(persona, _DEFAULT_SPEC))
+
+    def __len__(self) -> int:
+        return len(self.personas)
@@ -1,33 +1,154 @@
-from typing import List, Dict, Any, Tuple
+import json
+import os
+import re
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, NamedTuple, Optional
 from project.core.a2a_protocol import ExpenseEvent
+from project.core.observability import increment_counter
+
+# Balances and limits are kept in this currency. Other currencies are converted with FX_RATES
+# (NIVRA_FX_RATES='{"INR": 0.012}' adds rates); amounts in a currency without a rate are skipped.
+BASE_CURRENCY = "USD"
+FX_RATES: Dict[str, float] = {BASE_CURRENCY: 1.0, **json.loads(os.getenv("NIVRA_FX_RATES", "{}"))}
+
+# --- Precompiled Parsing Patterns ---
+_CURRENCY_CODES = {"$": "USD", "USD": "USD", "€": "EUR", "EUR": "EUR", "£": "GBP", "GBP": "GBP", "₹": "INR", "INR": "INR", "RS": "INR", "RS.": "INR"}
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?"
+_CURRENCY = r"[$€£₹]|USD|EUR|GBP|INR|RS\.?"
+# Currency before the number ("$12.50", "INR 450") or after it ("12.50 USD")
+_AMOUNT_RE = re.compile(
+    rf"(?P<cur>{_CURRENCY})\s?(?P<num>{_NUMBER})|(?P<num2>{_NUMBER})\s?(?P<cur2>USD|EUR|GBP|INR)\b",
+    re.IGNORECASE,
+)
+# A bare number (no currency) only counts as an amount right after a debit keyword or on a TOTAL line.
+_BARE_AMOUNT_RE = re.compile(
+    rf"\b(?:debit(?:ed)?|purchase[d]?|spent|paid|withdrawn|charged|payment|total)\b(?:\s+(?:by|of|for|amount))?\s*:?\s*(?P<num>{_NUMBER})(?![\d,.]*\d)",
+    re.IGNORECASE,
+)
+_CREDIT_RE = re.compile(r"\b(?:credit(?:ed)?|received|deposit(?:ed)?|refund(?:ed)?|cashback)\b", re.IGNORECASE)
+# "Payment" is not a debit keyword: it names either side ("payment received"), so only a credit keyword decides.
+_DEBIT_RE = re.compile(r"\b(?:debit(?:ed)?|purchase[d]?|spent|paid|withdrawn|charged)\b", re.IGNORECASE)
+# Running balances quoted in bank SMS ("Avl Bal $1,234.00") are not transactions.
+_BALANCE_PREFIX_RE = re.compile(r"(?:bal(?:ance)?|avl|available)\W*$", re.IGNORECASE)
+_BALANCE_CLAUSE_RE = re.compile(r"\b(?:avl|available|bal(?:ance)?)\b.*$", re.IGNORECASE)
+_MERCHANT_RE = re.compile(
+    rf"\b(?:at|to|@)\s+(?P<merchant>[A-Za-z0-9&' -]{{2,40}}?)(?=\s+(?:on|for|ref|via|using|with)\b|\s*(?:{_CURRENCY})?\s*\d|[.,;:]|$)",
+    re.IGNORECASE,
+)
+# Without an "at/to <merchant>" clause, only upper-case words are taken as the merchant ("$12.50 STARBUCKS").
+_UPPER_WORD_RE = re.compile(r"\b[A-Z][A-Z0-9&']+\b")
+_FILLER_WORDS_RE = re.compile(r"\b(?:debit(?:ed)?|credit(?:ed)?|purchase[d]?|payment|txn|transaction|receipt|of|for|on|your|a|the)\b|[^A-Za-z0-9&' ]", re.IGNORECASE)
+_TOTAL_LINE_RE = re.compile(r"^\s*(?:grand\s+)?total\b", re.IGNORECASE)
+
+
+class ParsedTransaction(NamedTuple):
+    """One transaction pulled out of raw text, before it becomes an ExpenseEvent."""
+    amount_cents: int
+    currency: str
+    merchant: Optional[str]
+    direction: str # "debit" or "credit"
+
+
+def _to_cents(number: str) -> int:
+    whole, _, frac = number.replace(",", "").partition(".")
+    return int(whole) * 100 + int((frac + "00")[:2])
+
+def _find_amount(text: str) -> Optional[Tuple[int, str, int, int]]:
+    """First non-balance amount in text as (cents, currency, start, end); bare numbers are in BASE_CURRENCY."""
+    for found in _AMOUNT_RE.finditer(text):
+        if _BALANCE_PREFIX_RE.search(text, max(0, found.start() - 24), found.start()):
+            continue
+        number = found.group("num") or found.group("num2")
+        currency = _CURRENCY_CODES.get((found.group("cur") or found.group("cur2")).upper(), BASE_CURRENCY)
+        return _to_cents(number), currency, found.start(), found.end()
+    bare = _BARE_AMOUNT_RE.search(text)
+    if bare is not None:
+        return _to_cents(bare.group("num")), BASE_CURRENCY, bare.start("num"), bare.end("num")
+    return None
+
+def _clean_merchant(text: str) -> Optional[str]:
+    merchant = " ".join(_FILLER_WORDS_RE.sub(" ", text).split()).upper()
+    return merchant or None
+
+def _sms_merchant(line: str, amount_start: int, amount_end: int) -> Optional[str]:
+    """The "at/to <merchant>" clause anywhere in the line, else upper-case words after the amount."""
+    for found in _MERCHANT_RE.finditer(line):
+        if found.end("merchant") <= amount_start or found.start("merchant") >= amount_end:
+            return _clean_merchant(found.group("merchant"))
+    remainder = _BALANCE_CLAUSE_RE.sub("", line[amount_end:])
+    return _clean_merchant(" ".join(_UPPER_WORD_RE.findall(remainder)))
+
+def iter_sms_transactions(text: str) -> Iterator[ParsedTransaction]:
+    """Yields one transaction per SMS line that carries an amount."""
+    for line in text.splitlines():
+        found = _find_amount(line)
+        if found is None:
+            continue
+        amount_cents, currency, start, end = found
+        # Credits only count as such when no debit keyword precedes the credit keyword.
+        credit, debit = _CREDIT_RE.search(line), _DEBIT_RE.search(line)
+        direction = "credit" if credit and (not debit or credit.start() < debit.start()) else "debit"
+        merchant = _sms_merchant(line, start, end)
+        yield ParsedTransaction(amount_cents, currency, merchant, direction)
+
+def iter_receipt_transactions(ocr_text: str) -> Iterator[ParsedTransaction]:
+    """Receipt text: the TOTAL line when present, otherwise one transaction per priced line."""
+    lines = [line for line in ocr_text.splitlines() if line.strip()]
+    header = next((line for line in lines if _find_amount(line) is None), None)
+    total_lines = [line for line in lines if _TOTAL_LINE_RE.match(line)]
+    for line in total_lines[-1:] or lines:
+        found = _find_amount(line)
+        if found is None:
+            continue
+        amount_cents, currency, start, _ = found
+        merchant = _clean_merchant(header) if header else _clean_merchant(line[:start])
+        yield ParsedTransaction(amount_cents, currency, merchant, "debit")
+
+def base_amount_cents(txn: ParsedTransaction) -> Optional[int]:
+    """The transaction's amount in BASE_CURRENCY cents, or None when its currency has no known rate."""
+    rate = FX_RATES.get(txn.currency)
+    if rate is None:
+        increment_counter("parser.skipped_currency")
+        return None
+    return txn.amount_cents if rate == 1.0 else round(txn.amount_cents * rate)
+
+def _to_expenses(source: str, transactions: Iterable[ParsedTransaction]) -> Iterator[ExpenseEvent]:
+    """Debit transactions as base-currency ExpenseEvents (credits and unconvertible amounts are dropped)."""
+    for txn in transactions:
+        if txn.direction != "debit":
+            continue
+        amount_cents = base_amount_cents(txn)
+        if amount_cents:
+            # Plain construction: pydantic-core validation is cheaper than model_construct for flat models.
+            yield ExpenseEvent(source=source, amount_cents=amount_cents, category=txn.merchant or "MISC")
 
 def parse_sms_transaction(text: str) -> List[ExpenseEvent]:
-    """Simulates parsing financial transactions from SMS text."""
-    events = []
-    if "purchase" in text.lower():
-        events.append(ExpenseEvent(source="SMS", amount_cents=1500, category="FOOD"))
-    if "debit $500" in text.lower():
-        events.append(ExpenseEvent(source="SMS", amount_cents=50000, category="RENT"))
-    return events
+    """Parses debit transactions (amount, merchant) from bank SMS text."""
+    return list(_to_expenses("SMS", iter_sms_transactions(text)))
 
 def parse_scanner_ocr(ocr_text: str) -> List[ExpenseEvent]:
-    """Simulates parsing transactions from OCR/receipt text."""
-    events = []
-    if "GROCERY" in ocr_text.upper():
-        events.append(ExpenseEvent(source="Scanner", amount_cents=7500, category="GROCERIES"))
-    if "COFFEE" in ocr_text.upper():
-        events.append(ExpenseEvent(source="Scanner", amount_cents=450, category="FOOD"))
-    return events
+    """Parses the spend on an OCR'd receipt."""
+    return list(_to_expenses("Scanner", iter_receipt_transactions(ocr_text)))
 
-def normalize_manual_expenses(entries: List[Dict[str, Any]]) -> List[ExpenseEvent]:
-    """Normalizes manual expense entries into ExpenseEvent list."""
-    normalized = []
+def parse_many(texts: Iterable[str], source: str = "SMS") -> Iterator[ExpenseEvent]:
+    """
+    Bulk path: lazily yields debit ExpenseEvents for many SMS (source="SMS") or receipt (source="Scanner") texts,
+    without building an intermediate list per message.
+    """
+    iter_transactions = iter_receipt_transactions if source == "Scanner" else iter_sms_transactions
+    for text in texts:
+        yield from _to_expenses(source, iter_transactions(text))
+
+def iter_manual_expenses(entries: Iterable[Dict[str, Any]]) -> Iterator[Tuple[int, str]]:
+    """Yields (amount_cents, category) for each valid manual entry; malformed entries are skipped."""
     for entry in entries:
         try:
             amount_cents = int(float(entry.get("amount", 0)) * 100)
             category = str(entry.get("category", "MISC")).upper()
-            if amount_cents > 0:
-                normalized.append(ExpenseEvent(source="Manual", amount_cents=amount_cents, category=category))
         except:
             continue
-    return normalized
+        if amount_cents > 0:
+            yield amount_cents, category
+
+def normalize_manual_expenses(entries: List[Dict[str, Any]]) -> List[ExpenseEvent]:
+    """Normalizes manual expense entries into ExpenseEvent list."""
+    return [ExpenseEvent(source="Manual", amount_cents=amount_cents, category=category) for amount_cents, category in iter_manual_expenses(entries)]
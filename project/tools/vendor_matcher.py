@@ -0,0 +1,92 @@
+import csv
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Joins the texts searched in one call; it never occurs in an alias, so no match can span two texts.
+_TEXT_SEPARATOR = "\x00"
+
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    """Renders a character trie as a regex that matches the longest alias starting at a position."""
+    is_end = "" in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != ""]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # Greedy optional: a longer alias is tried before settling for the one ending here.
+    return "(?:" + body + ")?" if is_end else body
+
+
+class VendorMatcher:
+    """
+    Vendor-alias -> category lookup compiled once into a single trie-shaped regex.
+
+    Semantics match the legacy VENDOR_MAP loop exactly: among all aliases occurring anywhere in the
+    searched texts, the one listed first in the table wins. The regex reports the longest alias at each
+    position; each alias is precomputed with the best-ranked alias that is a prefix of it, so
+    shorter aliases hidden inside a longer match are never lost.
+    """
+
+    def __init__(self, vendor_map: Dict[str, str]):
+        self.size = 0
+        trie: Dict[str, dict] = {}
+        ranked: Dict[str, Tuple[int, str]] = {}
+        for alias, category in vendor_map.items():
+            alias = alias.strip().upper()
+            if not alias or _TEXT_SEPARATOR in alias or alias in ranked:
+                continue
+            ranked[alias] = (self.size, category)
+            self.size += 1
+            node = trie
+            for ch in alias:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+
+        # alias -> (rank, category) of the best alias that is a prefix of (or equal to) it
+        self._best_for: Dict[str, Tuple[int, str]] = {}
+        for alias, entry in ranked.items():
+            best = entry
+            for end in range(1, len(alias)):
+                prefix_entry = ranked.get(alias[:end])
+                if prefix_entry is not None and prefix_entry[0] < best[0]:
+                    best = prefix_entry
+            self._best_for[alias] = best
+
+        self._pattern = re.compile("(?=(" + _trie_pattern(trie) + "))") if trie else None
+
+    @classmethod
+    def from_file(cls, path: str) -> "VendorMatcher":
+        """Loads a merchant table: JSON object {alias: category} or CSV rows 'alias,category' (file order = priority)."""
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                return cls(json.load(f))
+
+        vendor_map: Dict[str, str] = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or not row[0].strip() or row[0].lstrip().startswith("#"):
+                    continue
+                if row[0].strip().lower() == "alias":
+                    continue # header row
+                vendor_map.setdefault(row[0].strip().upper(), row[1].strip().upper())
+        return cls(vendor_map)
+
+    def match(self, *texts: str) -> Optional[str]:
+        """Returns the category of the highest-priority alias found in any of the (upper-cased) texts."""
+        if self._pattern is None:
+            return None
+        best: Optional[Tuple[int, str]] = None
+        for found in self._pattern.finditer(_TEXT_SEPARATOR.join(texts)):
+            alias = found.group(1)
+            if not alias:
+                continue
+            entry = self._best_for[alias]
+            if best is None or entry[0] < best[0]:
+                best = entry
+                if best[0] == 0:
+                    break
+        return best[1] if best is not None else None
+
+    def match_many(self, texts: Iterable[str]) -> List[Optional[str]]:
+        return [self.match(text) for text in texts]